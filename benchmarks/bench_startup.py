@@ -0,0 +1,75 @@
+"""
+Startup time of firestore-loader and redis-loader.
+
+Each command line is run in a fresh interpreter a number of times and the
+median wall time is reported, together with heavy client libraries found in
+sys.modules at exit. None of them is expected to be imported by commands not
+touching a database, e.g. --help.
+
+    $ python benchmarks/bench_startup.py --runs 10
+    $ python benchmarks/bench_startup.py --runs 10 --threshold 0.3
+"""
+import statistics
+import subprocess
+import sys
+import timeit
+from typing import List, Tuple
+
+import click
+
+HEAVY_MODULES = ["grpc", "google.cloud.firestore", "google.cloud.storage", "redis"]
+
+SCRIPT = """
+import atexit, sys
+heavy = {heavy!r}
+atexit.register(lambda: print(*[m for m in heavy if m in sys.modules], file=sys.stderr))
+sys.argv[0] = {prog!r}
+from cloudpmc_proto_{backend}_loader import cli_main
+cli_main()
+"""
+
+COMMANDS = [
+    ("firestore", ["--help"]),
+    ("firestore", ["load", "--help"]),
+    ("redis", ["--help"]),
+    ("redis", ["load", "--help"]),
+]
+
+
+def run(backend: str, args: List[str]) -> Tuple[float, List[str]]:
+    script = SCRIPT.format(heavy=HEAVY_MODULES, prog=f"{backend}-loader", backend=backend)
+    starts = timeit.default_timer()
+    result = subprocess.run(
+        [sys.executable, "-c", script, *args], capture_output=True, text=True, check=True
+    )
+    elapsed = timeit.default_timer() - starts
+    return elapsed, result.stderr.split()
+
+
+@click.command()
+@click.option("--runs", type=int, default=5, show_default=True)
+@click.option(
+    "--threshold",
+    type=float,
+    default=None,
+    help="Fail if a median startup time in seconds is above it or heavy modules are imported.",
+)
+def main(runs: int, threshold: float) -> None:
+    failed = False
+    print(f"{'command':<30} {'median s':>9} {'min s':>7}  imported")
+    for backend, args in COMMANDS:
+        times, imported = [], []
+        for _ in range(runs):
+            elapsed, imported = run(backend, args)
+            times.append(elapsed)
+        median = statistics.median(times)
+        command = " ".join([f"{backend}-loader", *args])
+        print(f"{command:<30} {median:>9.3f} {min(times):>7.3f}  {' '.join(imported) or '-'}")
+        if threshold is not None and (median > threshold or imported):
+            failed = True
+    if failed:
+        sys.exit(f"startup regression: threshold {threshold}s")
+
+
+if __name__ == "__main__":
+    main()
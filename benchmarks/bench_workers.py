@@ -0,0 +1,87 @@
+"""
+Throughput of the load pipeline transform stage by number of worker processes.
+
+Synthetic article_instances documents are written into a temporary folder,
+then loaded through Pipeline with a write stage doing nothing, so that
+reading, parsing, b64 decoding and zstd compression are measured only.
+
+    $ python benchmarks/bench_workers.py --docs 20000 --workers 0,1,2,4,8
+"""
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+import click
+
+from cloudpmc_proto_firestore_loader import firestore
+from cloudpmc_proto_loader_core.pipeline import Pipeline
+
+
+def make_docs(dst: Path, docs: int, header_size: int) -> None:
+    words = ["article", "journal", "contrib", "surname", "given-names", "aff", "pub-date"]
+    for i in range(docs):
+        header = " ".join(f"<{w}>{random.randint(0, 10**6)}</{w}>" for w in words)
+        header = (header * (header_size // len(header) + 1))[:header_size]
+        doc = {
+            "_id": i,
+            "_collection": "article_instances",
+            "pmcid": f"PMC{i}",
+            "aiid": i,
+            "is_oa": bool(i % 2),
+            "header_xml": base64.b64encode(header.encode()).decode("ascii"),
+        }
+        (dst / f"{i}.json").write_text(json.dumps(doc))
+
+
+@contextmanager
+def quiet_stderr():
+    # every document is logged by the transform stage, also in worker processes
+    sys.stderr.flush()
+    saved = os.dup(2)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 2)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 2)
+        os.close(saved)
+
+
+@click.command()
+@click.option("--docs", type=int, default=10000, show_default=True)
+@click.option("--header-size", type=int, default=8192, show_default=True)
+@click.option("--workers", type=str, default="0,1,2,4,8", show_default=True)
+def main(docs: int, header_size: int, workers: str) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        make_docs(Path(tmp), docs, header_size)
+        paths = sorted(Path(tmp).glob("*.json"))
+
+        print(f"{'workers':>8} {'seconds':>9} {'docs/s':>10} {'speedup':>8}")
+        baseline = None
+        for n in [int(w) for w in workers.split(",")]:
+            pipeline = Pipeline(
+                partial(firestore.db.transform_document, None, None),
+                lambda batch: batch,
+                workers=n,
+                batch_size=500,
+            )
+            with quiet_stderr():
+                starts = timeit.default_timer()
+                errors = sum(item.error is not None for item in pipeline.run(paths))
+                elapsed = timeit.default_timer() - starts
+            assert errors == 0, f"{errors} error(s) encountered"
+
+            rate = docs / elapsed
+            baseline = baseline or rate
+            print(f"{n:>8} {elapsed:>9.3f} {rate:>10.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Speed of the zstd codec layer against the former implementation (BytesIO
+plus stream_writer/stream_reader of module-level contexts) by payload size,
+of batch APIs and of multi-threaded compression of large payloads.
+
+    $ python benchmarks/bench_zstd_codec.py --level 10 --threads 4
+"""
+import io
+import os
+import random
+import timeit
+from typing import Callable, List
+
+import click
+import zstandard
+
+from cloudpmc_proto_loader_core import zstd
+
+legacy_compressor = zstandard.ZstdCompressor(level=zstd.ZSTD_LEVEL)
+legacy_decompressor = zstandard.ZstdDecompressor()
+
+
+def legacy_compress(data_in: bytes) -> bytes:
+    data_out = io.BytesIO()
+    with legacy_compressor.stream_writer(data_out, closefd=False) as s_writer:
+        s_writer.write(data_in)
+    data_out.seek(0)
+    return data_out.read()
+
+
+def legacy_decompress(data: bytes) -> bytes:
+    with legacy_decompressor.stream_reader(io.BytesIO(data)) as s_reader:
+        return s_reader.read()
+
+
+def make_payloads(size: int, count: int) -> List[bytes]:
+    words = [b"<article-id>", b"<contrib>", b"<surname>", b"<aff>", b"</p>", b"PMC", b" "]
+    payloads = []
+    for _ in range(count):
+        chunks = [random.choice(words) + str(random.randint(0, 999)).encode() for _ in range(64)]
+        chunk = b"".join(chunks)
+        payloads.append((chunk * (size // len(chunk) + 1))[:size])
+    return payloads
+
+
+def mbs(func: Callable[[], object], size: int, repeat: int = 3) -> float:
+    return size / min(timeit.repeat(func, number=1, repeat=repeat)) / 2**20
+
+
+@click.command()
+@click.option("--level", type=int, default=zstd.ZSTD_LEVEL, show_default=True)
+@click.option("--threads", type=int, default=zstd.ZSTD_BATCH_THREADS, show_default=True)
+@click.option("--total", type=int, default=32, show_default=True, help="MiB per measurement.")
+def main(level: int, threads: int, total: int) -> None:
+    global legacy_compressor
+    legacy_compressor = zstandard.ZstdCompressor(level=level)
+    print(f"cpus={os.cpu_count()} level={level} threads={threads}, MB/s of uncompressed data")
+    print(f"{'payload':>9} {'codec':>8} {'compress':>9} {'decompress':>11}")
+
+    for size in [1024, 8 * 1024, 64 * 1024, 1024 * 1024]:
+        payloads = make_payloads(size, max(1, total * 2**20 // size))
+        nbytes = sum(map(len, payloads))
+        compressed = [legacy_compress(p) for p in payloads]
+        rows = [
+            (
+                "legacy",
+                lambda: [legacy_compress(p) for p in payloads],
+                lambda: [legacy_decompress(c) for c in compressed],
+            ),
+            (
+                "one-shot",
+                lambda: [zstd.compress(p, level=level) for p in payloads],
+                lambda: [zstd.decompress(c) for c in compressed],
+            ),
+            (
+                "batch",
+                lambda: zstd.compress_many(payloads, level=level, threads=threads),
+                lambda: zstd.decompress_many(compressed, threads=threads),
+            ),
+        ]
+        for name, compress, decompress in rows:
+            compress_mbs, decompress_mbs = mbs(compress, nbytes), mbs(decompress, nbytes)
+            print(f"{size:>9} {name:>8} {compress_mbs:>9.1f} {decompress_mbs:>11.1f}")
+
+    size = max(zstd.ZSTD_MT_THRESHOLD, total * 2**20)
+    (payload,) = make_payloads(size, 1)
+    saved, zstd.ZSTD_MT_THRESHOLD = zstd.ZSTD_MT_THRESHOLD, size + 1
+    single = mbs(lambda: zstd.compress(payload, level=level), size)
+    zstd.ZSTD_MT_THRESHOLD = saved
+    multi = mbs(lambda: zstd.compress(payload, level=level), size)
+    print(f"{size:>9} {'1 thread':>8} {single:>9.1f}")
+    print(f"{size:>9} {f'{zstd.ZSTD_THREADS} thr.':>8} {multi:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compression ratio and speed of header_xml fields with and without a trained
+zstd dictionary.
+
+Headers are sampled from a corpus (the same sources as of load command) or
+synthetic ones are generated, the dictionary is trained on a part of them
+and measured on the rest.
+
+    $ python benchmarks/bench_zstd_dict.py --docs 20000
+    $ python benchmarks/bench_zstd_dict.py --docs 20000 dump/ dump.ndjson.zst
+"""
+import random
+import timeit
+from typing import Callable, List, Optional
+
+import click
+
+from cloudpmc_proto_loader_core import zstd
+from cloudpmc_proto_loader_core.sources import iter_sources
+from cloudpmc_proto_loader_core.zstd_dict import sample_field
+
+
+def make_headers(docs: int) -> List[bytes]:
+    words = ["article-id", "journal-title", "contrib", "surname", "given-names", "aff"]
+    headers = []
+    for i in range(docs):
+        body = "".join(
+            f'<{w} id="{w}-{random.randint(0, 99)}">{random.randint(0, 10**6)}</{w}>'
+            for w in random.sample(words * 4, 16)
+        )
+        header = f'<front><article-meta pmcid="PMC{i}">{body}</article-meta></front>'
+        headers.append(header.encode())
+    return headers
+
+
+def measure(func: Callable[[bytes], bytes], data: List[bytes]) -> float:
+    starts = timeit.default_timer()
+    for d in data:
+        func(d)
+    return sum(map(len, data)) / (timeit.default_timer() - starts) / 2**20
+
+
+def report(name: str, headers: List[bytes], dictionary: Optional[object]) -> None:
+    compressed = [zstd.compress(h, dictionary) for h in headers]
+    ratio = sum(map(len, headers)) / sum(map(len, compressed))
+    dict_id = dictionary.dict_id() if dictionary is not None else None
+    compress_mbs = measure(lambda h: zstd.compress(h, dictionary), headers)
+    decompress_mbs = measure(lambda c: zstd.decompress(c, dict_id), compressed)
+    # decompression speed is relative to the size of decompressed data
+    decompress_mbs *= ratio
+    print(f"{name:>12} {ratio:>7.2f} {compress_mbs:>12.1f} {decompress_mbs:>14.1f}")
+
+
+@click.command()
+@click.option("--docs", type=int, default=10000, show_default=True)
+@click.option("--train", type=float, default=0.2, show_default=True, help="Part to train on.")
+@click.option("--dict-size", type=int, default=zstd.ZSTD_DICT_SIZE, show_default=True)
+@click.argument("json_files", nargs=-1)
+def main(docs: int, train: float, dict_size: int, json_files: List[str]) -> None:
+    if json_files:
+        headers = sample_field(iter_sources(json_files, None), "header_xml", docs)
+    else:
+        headers = make_headers(docs)
+    random.shuffle(headers)
+    split = max(1, int(len(headers) * train))
+    dictionary = zstd.train_dictionary(headers[:split], dict_size)
+    headers = headers[split:]
+
+    print(f"{len(headers)} headers, average size {sum(map(len, headers)) // len(headers)} bytes")
+    print(f"{'':>12} {'ratio':>7} {'compress MB/s':>12} {'decompress MB/s':>14}")
+    report("plain", headers, None)
+    report("dictionary", headers, dictionary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,31 @@
-from pathlib import Path
-from typing import List
+from contextlib import nullcontext
+from itertools import chain
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 
 import click
-from cloudpathlib import AnyPath
 
-from . import firestore
-from .helpers import (
+from cloudpmc_proto_loader_core.aio import aio_option, iter_async
+from cloudpmc_proto_loader_core.hash_index import open_hash_index
+from cloudpmc_proto_loader_core.helpers import (
     cli_try_except,
     docstring_with_params,
+    lazy_import,
     log_debug_doc_dict,
-    save_json_doc_dict,
 )
-from .logger import CONFIG, CONFIG_DEBUG, logger
-from .timing import Timer
+from cloudpmc_proto_loader_core.journal import Journal, journal_options, select_sources
+from cloudpmc_proto_loader_core.logger import CONFIG, CONFIG_DEBUG, logger
+from cloudpmc_proto_loader_core.pipeline import PIPELINE_OPTIONS, pipeline_options
+from cloudpmc_proto_loader_core.sinks import SINK_OPTIONS, open_sink, sink_options
+from cloudpmc_proto_loader_core.sources import iter_manifest
+from cloudpmc_proto_loader_core.timing import Timer, metrics
+from cloudpmc_proto_loader_core.tracing import tracer
+from cloudpmc_proto_loader_core.zstd_dict import (
+    train_dict,
+    zstd_compression,
+    zstd_options,
+)
+
+from . import settings
 
 ERROR_NO_DOC = 1
 ERROR_QUERY = 2
@@ -21,6 +34,12 @@ ERROR_LIST_COLLECTIONS = 4
 ERROR_GET = 5
 ERROR_LOAD_ENCOUNTERED = 6
 ERROR_DELETE = 7
+ERROR_EXPORT = 8
+
+
+# client libraries are imported by the first command using the database (or cloud storage)
+firestore = lazy_import("cloudpmc_proto_firestore_loader.firestore")
+cloudpathlib = lazy_import("cloudpathlib")
 
 
 @click.group()
@@ -32,13 +51,41 @@ ERROR_DELETE = 7
     default=False,
     help="Debug this application.",
 )
+@click.option(
+    "--metrics",
+    "report_metrics",
+    is_flag=True,
+    show_default=True,
+    default=False,
+    help="Report throughput and latency percentiles of operations at the end of the run.",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False),
+    help="Write metrics into this file, in Prometheus textfile format if it ends with .prom, "
+    "as JSON otherwise.",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False),
+    help="Record spans of operations of all threads and processes into this file, in Chrome "
+    "trace format (chrome://tracing, https://ui.perfetto.dev).",
+)
 @click.pass_context
-def cli_main(click_ctx, *args, debug=None) -> None:
+def cli_main(
+    click_ctx, *args, debug=None, report_metrics=False, metrics_file=None, trace=None
+) -> None:
     click_ctx.arg_debug = debug
     if debug:
         logger.configure(**CONFIG_DEBUG)
     else:
         logger.configure(**CONFIG)
+    if report_metrics or metrics_file:
+        metrics.enable()
+        click_ctx.call_on_close(lambda: metrics.report(metrics_file))
+    if trace:
+        tracer.enable()
+        click_ctx.call_on_close(lambda: tracer.write(trace))
 
 
 @cli_main.command()
@@ -62,10 +109,49 @@ def cli_main(click_ctx, *args, debug=None) -> None:
     default=False,
     help="Report and skip individual file loading error.",
 )
+@click.option(
+    "--batch-size",
+    "-b",
+    type=click.IntRange(1, settings.FS_MAX_BATCH_OPS),
+    show_default=True,
+    default=1,
+    help=(
+        "Number of documents written with a single batched write request, "
+        f"up to {settings.FS_MAX_BATCH_OPS}."
+    ),
+)
+@click.option(
+    "--batch-bytes",
+    type=click.IntRange(1, settings.FS_MAX_BATCH_BYTES),
+    show_default=True,
+    default=settings.FS_MAX_BATCH_BYTES,
+    help="Maximal estimated size in bytes of a single batched write request.",
+)
+@click.option(
+    "--manifest",
+    "-m",
+    type=str,
+    help='File with paths to load, one per line, "-" to read them from stdin.',
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    show_default=True,
+    default=False,
+    help="Write only new or changed documents according to --hash-index.",
+)
+@click.option(
+    "--hash-index",
+    type=click.Path(dir_okay=False),
+    help="Local index (SQLite database) of hashes of loaded documents.",
+)
+@journal_options
+@pipeline_options
+@aio_option
+@zstd_options
 @click.argument(
     "json_files",
     nargs=-1,
-    required=True,
 )
 @click.pass_context
 @cli_try_except(ERROR_LOAD)
@@ -90,6 +176,22 @@ def load(click_ctx, *args, **kwargs) -> None:
 
     Multiple files/paths are allowed in one run.
 
+    Paths may also be listed one per line in a manifest file (local or in
+    the cloud storage) given with --manifest option, or streamed into stdin
+    with "--manifest -". A directory or a cloud storage prefix
+    'gs://ncbi-research-pmc.appspot.com/dump/' is expanded into all files
+    of supported formats (see below) under it. Paths are listed lazily, loading starts right away.
+
+    Files with *.ndjson or *.jsonl suffix hold many documents, one JSON
+    document per line, each one with "_id" and "_collection" fields (unless
+    --doc-id or --collection option is given). They are read line by line,
+    however large they are.
+
+    Files compressed with gzip (*.gz) or zstd (*.zst) are decompressed on
+    the fly. Tar archives (*.tar, *.tar.gz, *.tgz, *.tar.zst, *.tzst) are
+    read as a stream, their *.json, *.ndjson and *.jsonl members are loaded
+    with no extraction on disk.
+
     By default the script picks an id of the document from a "_id" field
     of requested to be loaded json file. If it is not there, the base name
     of the document is used, if you want to force a specific document id
@@ -102,6 +204,33 @@ def load(click_ctx, *args, **kwargs) -> None:
     default, if it is not there or you want to force a document into specific
     collection you can specify one with --collection COLLECTION_VALUE option.
 
+    Files are read by --readers threads, transformed into documents by
+    --transformers threads and written into the database by --writers
+    threads concurrently. Up to --queue-size files (or documents), but no
+    more than --queue-bytes bytes of them, are waiting between these stages.
+    Parsing and transformation of files is CPU bound, use --workers option
+    to run it in a pool of processes on multiple cores.
+
+    With --incremental option only new or changed documents are written.
+    Hashes of documents (after decoding and compression) are compared with
+    the hashes recorded in a local index given with --hash-index option,
+    it is updated with hashes of written documents.
+
+    With --journal option every loaded file is recorded in a local checkpoint
+    journal, as well as every file failed to load. A load interrupted for
+    whatever reason can be resumed later with --resume option, files loaded
+    already are skipped then. Files failed to load can be loaded again on
+    their own with --retry-failed option.
+
+    Documents are written one by one, unless --batch-size option is greater
+    than 1, then up to --batch-size documents (but no more than --batch-bytes
+    bytes of them) are written with a single batched write request. Should
+    the batch fail, its documents are written one by one, so that errors
+    are reported for each individual document.
+
+    With --aio option batches are written with an asyncio client by a single
+    thread, up to --writers of them are in flight, e.g. --writers 200.
+
     Read an "Additional info" section in README.md file if you want to
     avoid confirming your access to Cloud API (Firestore) each time.
 
@@ -121,26 +250,67 @@ def load(click_ctx, *args, **kwargs) -> None:
     $ firestore-loader load --collection "collection_name" \\
         dump/13901.json dump/14901.json ...
 
+    Loading with batched writes of 200 documents:
+
+    \b
+    $ firestore-loader load --batch-size 200 dump/*.json
+
     """
     collection = kwargs.get("collection")
+    doc_id = kwargs.get("doc_id")
     skip_errors = kwargs.get("skip_errors")
+    journal = Journal(kwargs["journal"]) if kwargs.get("journal") else None
+    json_file_paths = select_sources(
+        journal,
+        kwargs.get("json_files"),
+        kwargs.get("manifest"),
+        kwargs["resume"],
+        kwargs["retry_failed"],
+    )
+
+    hash_index = open_hash_index(kwargs["incremental"], kwargs.get("hash_index"))
 
     errors_encountered = 0
-    for json_file in kwargs.get("json_files"):
-        try:
-            json_file_path = AnyPath(json_file)
-            doc_id = kwargs.get("doc_id")
-            logger.info(f"processing file - {json_file_path} with doc_id={doc_id}")
-            doc_dict, _ = firestore.db.upload_document(collection, doc_id, json_file_path)
-            log_debug_doc_dict(click_ctx, doc_dict)
-        except Exception as e:
+    skipped = 0
+    backend = firestore.adb if kwargs["aio"] else firestore.db
+    with Timer("load"), journal or nullcontext():
+        for item in backend.upload_documents(
+            collection,
+            doc_id,
+            json_file_paths,
+            batch_size=kwargs["batch_size"],
+            batch_bytes=kwargs["batch_bytes"],
+            with_hash=journal is not None,
+            hash_index=hash_index,
+            skip=journal.skip if kwargs["resume"] or kwargs["retry_failed"] else None,
+            compression=zstd_compression(kwargs),
+            debug=click_ctx.parent.arg_debug,
+            **{k: kwargs[k] for k in PIPELINE_OPTIONS},
+        ):
+            if journal is not None:
+                journal.record(item)
+
+            if item.skipped:
+                skipped += 1
+                continue
+
+            if item.error is None:
+                log_debug_doc_dict(click_ctx, item.doc_dict)
+                continue
+
             errors_encountered += 1
+            e = item.error
             if skip_errors:
                 logger.error(f"{e.__class__.__name__}: {e}")
                 continue
             else:
                 raise e
 
+    if hash_index is not None:
+        logger.info(f"{skipped} unchanged document(s) skipped, their writes avoided.")
+    if journal is not None:
+        journal.log_summary()
+
     if errors_encountered:
         logger.error(f"Total {errors_encountered} error(s) had been occured.")
         click_ctx.exit(ERROR_LOAD_ENCOUNTERED)
@@ -154,18 +324,31 @@ def load(click_ctx, *args, **kwargs) -> None:
     help="Firestore collection name.",
     required=True,
 )
+@sink_options
 @click.option(
-    "--dst",
-    "-t",
-    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
-    help="Destination folder for json files",
-    default="/tmp",
+    "--ids-file",
+    type=str,
+    help='File with document ids, one per line, "-" to read them from stdin.',
+)
+@click.option(
+    "--batch-size",
+    "-b",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.FS_GET_BATCH_SIZE,
+    help="Number of documents requested with a single request.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
     show_default=True,
+    default=1,
+    help="Number of requests run in parallel.",
 )
+@aio_option
 @click.argument(
     "doc_ids",
     nargs=-1,
-    required=True,
 )
 @click.pass_context
 @cli_try_except(ERROR_GET)
@@ -178,29 +361,60 @@ def get(click_ctx, *args, **kwargs) -> None:
     Get document from Firestore collection and save it locally to
     preferred location chosen with --dst option in JSON format.
 
+    Document ids may be listed one per line in a file given with --ids-file
+    option (or streamed into stdin with "--ids-file -") as well. Documents
+    are requested in batches of --batch-size ids, with up to --concurrency
+    requests in parallel (threads, or requests in flight of an asyncio
+    client with --aio option). Every missing document is reported, the
+    command exits with an error after all the documents are retrieved.
+
+    Documents are saved with --format option (the same for query command):
+    a json file per document in --dst folder (files), NDJSON into --output
+    file or stdout (ndjson), NDJSON files of --shard-docs documents in --dst
+    folder (shards) or a tar archive into --output file or stdout (tar).
+    Documents are written in background threads, so fetching does not wait
+    for the disk, --zstd option compresses ndjson, shards and tar output.
+
     EXAMPLES
 
     \b
     $ firestore-loader get --collection "collection_name"  13901 14901 ...
+    $ firestore-loader get --collection "collection_name" --ids-file ids.txt \\
+        --batch-size 200 --concurrency 8
+    $ firestore-loader get --collection "collection_name" --ids-file ids.txt \\
+        --format ndjson --zstd --output docs.ndjson.zst
+    $ firestore-loader get --collection "collection_name" --ids-file ids.txt \\
+        --aio --concurrency 200 --format ndjson --output docs.ndjson
     """
     collection = kwargs.get("collection")
-    dst: Path = kwargs.get("dst")
+    doc_ids = kwargs.get("doc_ids")
+    if kwargs.get("ids_file"):
+        doc_ids = chain(doc_ids, iter_manifest(kwargs["ids_file"]))
+    elif not doc_ids:
+        raise ValueError("DOC_IDS argument(s) or --ids-file option is required.")
+
+    logger.info(f"retrieving documents from collection={collection}")
+    missing = 0
+    backend = firestore.adb if kwargs["aio"] else firestore.db
+    docs = backend.get_documents(collection, doc_ids, kwargs["batch_size"], kwargs["concurrency"])
+    if kwargs["aio"]:
+        docs = iter_async(docs)
+    with Timer("get"), open_sink(collection, **{k: kwargs[k] for k in SINK_OPTIONS}) as sink:
+        for doc_id, doc_dict in docs:
+            if doc_dict is not None:
+                # log_debug_doc_dict(click_ctx, doc_dict)
+                sink.write(doc_id, doc_dict)
 
-    for doc_id in kwargs.get("doc_ids"):
-        info = f"retrieving  document from collection={collection} with doc_id={doc_id}"
-        logger.info(info)
+            else:
+                missing += 1
+                logger.error(
+                    f"No document with doc_id={doc_id} in collection={collection}, "
+                    f"check the collection name or doc_ids argument."
+                )
 
-        doc_dict = firestore.db.get_document(collection, doc_id)
-        if doc_dict is not None:
-            # log_debug_doc_dict(click_ctx, doc_dict)
-            save_json_doc_dict(click_ctx, doc_dict, doc_id, dst)
-
-        else:
-            logger.error(
-                f"No document with doc_id={doc_id} in collection={collection}, "
-                f"check the collection name or doc_ids argument."
-            )
-            click_ctx.exit(ERROR_NO_DOC)
+    if missing:
+        logger.error(f"Total {missing} document(s) had not been found.")
+        click_ctx.exit(ERROR_NO_DOC)
 
 
 @cli_main.command()
@@ -227,18 +441,30 @@ def get(click_ctx, *args, **kwargs) -> None:
         "You can specify the sort order for your data using this option."
     ),
 )
+@sink_options
 @click.option(
-    "--dst",
-    "-t",
-    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
-    help="Destination folder for json files",
-    default="/tmp",
+    "--all",
+    "all_",
+    is_flag=True,
     show_default=True,
+    default=False,
+    help="Fetch all matching documents in pages, ignoring --limit option.",
+)
+@click.option(
+    "--page-size",
+    type=click.IntRange(min=1),
+    help=f"Fetch documents in pages of this size  [default: {settings.FS_QUERY_PAGE_SIZE}]",
 )
+@click.option(
+    "--start-after",
+    type=str,
+    help="Token of a page (logged after every page) to resume the query after.",
+)
+@aio_option
 @click.argument("conditions", nargs=-1, required=True)
 @click.pass_context
 @cli_try_except(ERROR_QUERY)
-@docstring_with_params(ops=firestore.FS_DB_SUPPORTED_OPS)
+@docstring_with_params(ops=settings.FS_DB_SUPPORTED_OPS)
 def query(click_ctx, *args, **kwargs) -> None:
     """
     find document(s) in Firestore collection.
@@ -255,9 +481,17 @@ def query(click_ctx, *args, **kwargs) -> None:
     \b
     $ firestore-loader query --collection "collection_name" \\
         'pmcid == PMC13901' 'is_oa!=False' ...
+    $ firestore-loader query --collection "collection_name" --all \\
+        --orderby aiid --page-size 500 'is_oa == True'
 
     Notes:
 
+    With --all, --page-size or --start-after options documents are fetched
+    in pages, every page starts after the last document of the previous
+    one (by --orderby field and document id), so large result sets are
+    streamed with bounded memory. A token is logged after every page, pass
+    it with --start-after option to resume the query after that page.
+
     \b
     CONDITION consists of 3 components "FIELD OP VALUE":
         FIELD - field name
@@ -270,17 +504,24 @@ def query(click_ctx, *args, **kwargs) -> None:
     List of supported operators: {ops}
     """
     collection: str = kwargs["collection"]
-    limit: int = kwargs["limit"]
+    limit: Optional[int] = None if kwargs["all_"] else kwargs["limit"]
     order_by: str = kwargs["orderby"]
     conditions: List[str] = kwargs["conditions"]
-    dst: Path = kwargs["dst"]
-
-    with Timer("query() & fetch"):
+    page_size: Optional[int] = kwargs["page_size"]
+    if kwargs["all_"] and not page_size:
+        page_size = settings.FS_QUERY_PAGE_SIZE
+
+    backend = firestore.adb if kwargs["aio"] else firestore.db
+    docs = backend.query(collection, limit, order_by, conditions, page_size, kwargs["start_after"])
+    if kwargs["aio"]:
+        docs = iter_async(docs)
+    sink = open_sink(collection, **{k: kwargs[k] for k in SINK_OPTIONS})
+    with Timer("query() & fetch"), sink:
         found = 0
-        for doc_id, doc_dict in firestore.db.query(collection, limit, order_by, conditions):
+        for doc_id, doc_dict in docs:
             found += 1
             # log_debug_doc_dict(click_ctx, doc_dict)
-            save_json_doc_dict(click_ctx, doc_dict, doc_id, dst)
+            sink.write(doc_id, doc_dict)
 
         logger.info(f"Found {found} document(s) in collection={collection} with limit={limit}")
 
@@ -335,6 +576,30 @@ def list_collections(click_ctx, *args, **kwargs) -> None:
     default=False,
     help="Report and skip individual deletion error.",
 )
+@click.option(
+    "--batch-size",
+    "-b",
+    type=click.IntRange(min=1, max=settings.FS_MAX_BATCH_OPS),
+    show_default=True,
+    default=settings.FS_MAX_BATCH_OPS,
+    help='Number of documents deleted with a single batched write on "*".',
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.FS_DELETE_CONCURRENCY,
+    help='Number of batched writes committed in parallel on "*" (deletes with --aio).',
+)
+@click.option(
+    "--recursive",
+    "-r",
+    is_flag=True,
+    show_default=True,
+    default=False,
+    help='Delete documents of subcollections as well on "*".',
+)
+@aio_option
 @click.argument("doc_ids", nargs=-1, required=True)
 @click.pass_context
 @cli_try_except(ERROR_DELETE)
@@ -359,10 +624,20 @@ def delete(click_ctx, *args, **kwargs) -> None:
     $ firestore-loader delete --collection "collection_name" "*"
 
 
+    Delete all documents in a given collection and its subcollections:
+    \b
+    $ firestore-loader delete --collection "collection_name" --recursive "*"
+
+
     NOTES
 
     To delete all documents from a collection you should specify "*" as
-    `doc_id` argument. Use quotes to avoid shell expansion.
+    `doc_id` argument. Use quotes to avoid shell expansion. Documents are
+    deleted with batched writes of --batch-size documents, --concurrency
+    of them committed in parallel, the progress is logged periodically.
+    Subcollections are left intact unless --recursive option is given.
+    With --aio option listed documents are deleted with --concurrency
+    requests in flight as well.
 
     """
     errors_encountered = 0
@@ -372,20 +647,128 @@ def delete(click_ctx, *args, **kwargs) -> None:
     skip_errors = kwargs.get("skip_errors")
 
     with Timer("delete"):
-        for doc_id in doc_ids:
-            if doc_id == "*":
-                firestore.db.delete_all_docs(collection)
+        if kwargs["aio"]:
+            failed = iter_async(_adelete_docs(collection, doc_ids, kwargs))
+        else:
+            failed = _delete_docs(collection, doc_ids, kwargs)
+        for doc_id, e in failed:
+            errors_encountered += 1
+            if skip_errors:
+                logger.error(f"{e.__class__.__name__}: {e}")
+                continue
             else:
-                try:
-                    firestore.db.delete_doc(collection, doc_id)
-                except Exception as e:
-                    errors_encountered += 1
-                    if skip_errors:
-                        logger.error(f"{e.__class__.__name__}: {e}")
-                        continue
-                    else:
-                        raise e
+                raise e
 
     if errors_encountered:
         logger.error(f"Total {errors_encountered} error(s) had been occured.")
         click_ctx.exit(ERROR_LOAD_ENCOUNTERED)
+
+
+def _delete_docs(collection: str, doc_ids: List[str], kwargs) -> Iterator[Tuple[str, Exception]]:
+    # yields documents failed to be deleted
+    for doc_id in doc_ids:
+        if doc_id == "*":
+            firestore.db.delete_all_docs(
+                collection,
+                kwargs["batch_size"],
+                kwargs["concurrency"],
+                kwargs["recursive"],
+            )
+        else:
+            try:
+                firestore.db.delete_doc(collection, doc_id)
+            except Exception as e:
+                yield doc_id, e
+
+
+async def _adelete_docs(
+    collection: str, doc_ids: List[str], kwargs
+) -> AsyncIterator[Tuple[str, Exception]]:
+    # _delete_docs() with requests of the asyncio client
+    if "*" in doc_ids:
+        await firestore.adb.delete_all_docs(
+            collection,
+            kwargs["batch_size"],
+            kwargs["concurrency"],
+            kwargs["recursive"],
+        )
+    listed = [doc_id for doc_id in doc_ids if doc_id != "*"]
+    async for doc_id, e in firestore.adb.delete_docs(collection, listed, kwargs["concurrency"]):
+        if e is not None:
+            yield doc_id, e
+
+
+@cli_main.command()
+@click.option(
+    "--collection",
+    "-c",
+    type=str,
+    help="Firestore collection name.",
+    required=True,
+)
+@click.option(
+    "--dst",
+    "-t",
+    type=str,
+    help="Destination folder (local or gs://) of NDJSON files.",
+    required=True,
+)
+@click.option(
+    "--partitions",
+    "-p",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.FS_EXPORT_PARTITIONS,
+    help="Maximal number of partitions (NDJSON files) the collection is split into.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.FS_EXPORT_CONCURRENCY,
+    help="Number of partitions read in parallel.",
+)
+@click.option(
+    "--zstd",
+    "compress",
+    is_flag=True,
+    show_default=True,
+    default=False,
+    help="Compress NDJSON files with zstd.",
+)
+@click.pass_context
+@cli_try_except(ERROR_EXPORT)
+def export(click_ctx, *args, **kwargs) -> None:
+    """
+    export a collection into NDJSON files.
+
+    SYNOPSIS
+
+    Export all documents of a Firestore collection into NDJSON files, one
+    document per line. The collection is split into partitions with
+    partition queries, partitions are read in parallel and every one of
+    them is written into a file of its own (a shard), documents of a shard
+    are ordered by their id. Documents keep their `_id` and `_collection`,
+    so the files can be loaded back with load command. Bytes fields are
+    exported base64 encoded with `.b64` suffix of their names and are loaded
+    back as bytes, timestamps, references and geo points are loaded back as
+    strings and maps (lossy).
+
+    EXAMPLES
+
+    \b
+    $ firestore-loader export --collection "collection_name" --dst dump/
+    $ firestore-loader export --collection "collection_name" --zstd \\
+        --partitions 64 --concurrency 16 --dst gs://bucket/dump/
+    """
+    with Timer("export"):
+        firestore.db.export(
+            kwargs["collection"],
+            cloudpathlib.AnyPath(kwargs["dst"]),
+            kwargs["partitions"],
+            kwargs["concurrency"],
+            kwargs["compress"],
+        )
+
+
+cli_main.add_command(train_dict)
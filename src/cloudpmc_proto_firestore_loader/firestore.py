@@ -1,23 +1,69 @@
+import asyncio
+import base64
+import inspect
 import json
 import os
 import re
-from typing import Any, Dict, Generator, List, Optional, Tuple, Union
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from cloudpathlib import AnyPath
 from google.cloud import firestore
+from google.cloud.firestore_v1 import GeoPoint
 from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
 from google.cloud.firestore_v1.collection import CollectionReference
 from google.cloud.firestore_v1.document import DocumentReference
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.cloud.firestore_v1.types.write import WriteResult
+from google.oauth2 import service_account
 
-from .helpers import (
+from cloudpmc_proto_loader_core import zstd
+from cloudpmc_proto_loader_core.aio import achunks, at_loop_close, bounded_map
+from cloudpmc_proto_loader_core.hash_index import awrite_changed, write_changed
+from cloudpmc_proto_loader_core.helpers import (
+    LoadItem,
     b64_decode_zcompress_fields,
+    chunks,
     decode_b64_fields,
+    doc_hash,
+    doc_size,
+    encode_b64_fields,
+    parallel_map,
     simplest_type,
+    split_failed,
     zdecompress_b64_encode_fields,
 )
-from .logger import logger
-from .timing import Timer
+from cloudpmc_proto_loader_core.logger import logger
+from cloudpmc_proto_loader_core.pipeline import Pipeline
+from cloudpmc_proto_loader_core.sources import read_source, source_stem
+from cloudpmc_proto_loader_core.timing import Progress, Timer
+from cloudpmc_proto_loader_core.tracing import traced
+
+from .settings import (
+    FS_BULK_DELETE_OPS_PER_SECOND,
+    FS_DB_SUPPORTED_OPS,
+    FS_DELETE_CONCURRENCY,
+    FS_EXPORT_CONCURRENCY,
+    FS_EXPORT_PARTITIONS,
+    FS_GET_BATCH_SIZE,
+    FS_MAX_BATCH_BYTES,
+    FS_MAX_BATCH_OPS,
+    FS_QUERY_PAGE_SIZE,
+)
 
 # The `project` parameter is optional and represents which project the client
 # will act on behalf of. If not supplied, the client falls back to the default
@@ -32,108 +78,288 @@ from .timing import Timer
 # credentials = AnonymousCredentials()
 # client_db = Client(project="my-project", credentials=credentials)
 #
-# ==== Access through ENV to ncbi-research-pmc project's Firestore
+# ==== Access with the service account of ncbi-research-pmc project's Firestore
 
 GA_CREDENTIALS = AnyPath("/").home() / ".service-account.json"
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(GA_CREDENTIALS)
-os.environ["no_proxy"] = "localhost,127.0.0.1/8"
-
-# Firestore supported conditional operators to query
-FS_DB_SUPPORTED_OPS = [
-    "<",
-    "<=",
-    "==",
-    ">=",
-    ">",
-    "!=",
-    # https://github.com/googleapis/python-firestore/blob/main/google/cloud/firestore_v1/base_query.py#L73,L76
-    "array_contains",
-    "array_contains_any",
-    "in",
-    "not-in",
-]
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    """
+    Arguments of a new client: the service account of GA_CREDENTIALS file
+    and its project, the default credentials of the environment when there
+    is no such file.
+    """
+    os.environ["no_proxy"] = "localhost,127.0.0.1/8"
+    if not GA_CREDENTIALS.exists():
+        return {}
+    credentials = service_account.Credentials.from_service_account_file(str(GA_CREDENTIALS))
+    return {"project": credentials.project_id, "credentials": credentials}
 
 
 class _FirestoreDB:
     def __init__(self):
         self._db = None
 
+    def __reduce__(self):
+        # pickled as a reference to the module level `db` singleton, so that
+        # every process (e.g. a pipeline worker) uses a client of its own
+        return "db"
+
+    def reset(self) -> None:
+        """
+        Forget the client, a new one is created on the next use.
+        """
+        self._db = None
+
     @property
     def db(self):
         if self._db is None:
-            self._db = firestore.Client()
+            self._db = firestore.Client(**_client_kwargs())
         return self._db
 
+    @traced
+    def prepare_document(
+        self,
+        collection: str,
+        doc_id: str,
+        doc_dict: Dict[str, Any],
+        json_file_path: AnyPath,
+        compression: zstd.Compression = zstd.Compression(),
+    ) -> Tuple[str, str, Dict[str, Any]]:
+        # decode fields with .b64 suffix in the name of properties
+        decode_b64_fields(doc_dict)
+
+        _doc_id = doc_id or doc_dict.get("_id") or source_stem(json_file_path)
+        if not _doc_id:
+            raise ValueError(
+                f"Document id is required. `_id` is expected in {json_file_path} "
+                "or with --doc-id option in command line."
+            )
+        elif isinstance(_doc_id, float):
+            _doc_id = int(_doc_id)
+
+        _doc_id = str(_doc_id)
+
+        _collection = collection or doc_dict.get("_collection")
+        if not _collection:
+            raise ValueError(
+                f"Collection name is required. `_collection` is expected in {json_file_path} "
+                "or with --collection option in command line."
+            )
+
+        # decode header_xml for article_instances collection
+        if _collection == "article_instances" and "header_xml" in doc_dict:
+            b64_decode_zcompress_fields(doc_dict, ["header_xml"], compression)
+        logger.info(
+            f"document with doc_id={_doc_id} is being loaded "
+            f"into into collection={_collection}"
+        )
+
+        # remove unwanted fields:
+        doc_dict.pop("_id", None)
+        doc_dict.pop("_collection", None)
+
+        return _collection, _doc_id, doc_dict
+
     @Timer()
     def upload_document(
         self, collection: str, doc_id: str, json_file_path: AnyPath
     ) -> Tuple[Dict[str, Any], Optional[WriteResult]]:
         with json_file_path.open() as fd:
             doc_dict = json.load(fd)
-            # decode fields with .b64 suffix in the name of properties
-            decode_b64_fields(doc_dict)
-
-            _doc_id = doc_id or doc_dict.get("_id") or json_file_path.stem
-            if not _doc_id:
-                raise ValueError(
-                    f"Document id is required. `_id` is expected in {json_file_path} "
-                    "or with --doc-id option in command line."
-                )
-            elif isinstance(_doc_id, float):
-                _doc_id = int(_doc_id)
-
-            _doc_id = str(_doc_id)
-
-            _collection = collection or doc_dict.get("_collection")
-            if not _collection:
-                raise ValueError(
-                    f"Collection name is required. `_collection` is expected in {json_file_path} "
-                    "or with --collection option in command line."
-                )
-
-            # decode header_xml for article_instances collection
-            if _collection == "article_instances" and "header_xml" in doc_dict:
-                b64_decode_zcompress_fields(doc_dict, ["header_xml"])
-            logger.info(
-                f"document with doc_id={_doc_id} is being loaded "
-                f"into into collection={_collection}"
-            )
 
-            # remove unwanted fields:
-            doc_dict.pop("_id", None)
-            doc_dict.pop("_collection", None)
+        _collection, _doc_id, doc_dict = self.prepare_document(
+            collection, doc_id, doc_dict, json_file_path
+        )
+
+        # load the document into database
+        write_result = self.db.collection(_collection).document(_doc_id).set(doc_dict)
+        return doc_dict, write_result
+
+    def upload_documents(
+        self,
+        collection: str,
+        doc_id: str,
+        json_file_paths: Iterable[AnyPath],
+        batch_size: int = FS_MAX_BATCH_OPS,
+        batch_bytes: int = FS_MAX_BATCH_BYTES,
+        with_hash: bool = False,
+        hash_index=None,
+        skip: Optional[Callable[[Any], bool]] = None,
+        write_batch: Optional[Callable[[List[LoadItem]], Any]] = None,
+        compression: zstd.Compression = zstd.Compression(),
+        **pipeline_kwargs,
+    ) -> Generator[LoadItem, None, None]:
+        """
+        Load documents with WriteBatch commits of up to `batch_size` documents
+        (capped at FS_MAX_BATCH_OPS) and up to `batch_bytes` bytes each.
+        Files are read, transformed and written concurrently by Pipeline
+        configured with `pipeline_kwargs`. Every document is yielded back
+        as LoadItem with `error` set when it could not be loaded and with
+        `hash` of the document set, if requested with `with_hash`.
+
+        With `hash_index` only new and changed documents are written,
+        see write_changed(). Records of files holding many documents are
+        not loaded when `skip` tells so, see read_source(). Batches are
+        written with `write_batch` when given (a coroutine function of
+        the asyncio client) instead of write_batch() of this class.
+        Fields are compressed according to `compression`.
+        """
+        batch_size = max(1, min(batch_size, FS_MAX_BATCH_OPS))
+        write_batch = write_batch or self.write_batch
+        if hash_index is not None:
+            with_hash = True
+            changed = awrite_changed if inspect.iscoroutinefunction(write_batch) else write_changed
+            write_batch = partial(changed, write_batch, hash_index)
+
+        pipeline = Pipeline(
+            partial(
+                self.transform_document,
+                collection,
+                doc_id,
+                with_hash=with_hash,
+                compression=compression,
+            ),
+            write_batch,
+            read=partial(read_source, skip=skip),
+            batch_size=batch_size,
+            batch_bytes=batch_bytes,
+            **pipeline_kwargs,
+        )
+        yield from pipeline.run(json_file_paths)
+
+    def transform_document(
+        self,
+        collection: str,
+        doc_id: str,
+        item: LoadItem,
+        with_hash: bool = False,
+        compression: zstd.Compression = zstd.Compression(),
+    ) -> LoadItem:
+        with Timer(metric="parse", nbytes=len(item.data)):
+            doc_dict = json.loads(item.data)
+        _collection, _doc_id, doc_dict = self.prepare_document(
+            collection, doc_id, doc_dict, item.source, compression
+        )
+        size = doc_size(doc_dict) + len(_collection) + len(_doc_id)
+        _hash = doc_hash(doc_dict) if with_hash else None
+        return LoadItem(item.source, _collection, _doc_id, doc_dict, size, hash=_hash)
+
+    def write_batch(self, items: List[LoadItem]) -> Generator[LoadItem, None, None]:
+        """
+        Write documents of `items` with a single WriteBatch commit. A batch
+        is committed atomically, so in case of failure its documents are
+        written one by one to find out which of them have failed.
+        """
+        failed, pending = split_failed(items)
+        yield from failed
+
+        if len(pending) > 1:
+            batch = self._set_batch(self.db, pending)
+            try:
+                with Timer(f"commit batch of {len(pending)} document(s)"):
+                    batch.commit()
+            except Exception as e:
+                self._batch_failed(pending, e)
+            else:
+                yield from pending
+                return
+
+        for item in pending:
+            try:
+                self.db.collection(item.collection).document(item.doc_id).set(item.doc_dict)
+                yield item
+            except Exception as e:
+                yield item._replace(error=e)
 
-            # load the document into database
-            write_result = self.db.collection(_collection).document(_doc_id).set(doc_dict)
-            return doc_dict, write_result
+    @staticmethod
+    def _set_batch(client, items: List[LoadItem]):
+        batch = client.batch()
+        for item in items:
+            batch.set(client.collection(item.collection).document(item.doc_id), item.doc_dict)
+        return batch
+
+    @staticmethod
+    def _batch_failed(items: List[LoadItem], e: Exception) -> None:
+        logger.warning(
+            f"batch of {len(items)} document(s) failed to commit "
+            f"({e.__class__.__name__}: {e}), writing documents one by one."
+        )
 
     @Timer()
     def get_document(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
         doc_ref: DocumentReference = self.db.collection(collection).document(doc_id)
         doc: DocumentSnapshot = doc_ref.get()
-        doc_dict = None
-        if doc.exists:
-            doc_dict = doc.to_dict()
-            zdecompress_b64_encode_fields(doc_dict, ["header_xml_zstd"])
+        return self._decoded(doc) if doc.exists else None
+
+    def get_documents(
+        self,
+        collection: str,
+        doc_ids: Iterable[str],
+        batch_size: int = FS_GET_BATCH_SIZE,
+        concurrency: int = 1,
+    ) -> Generator[Tuple[str, Optional[Dict[str, Any]]], None, None]:
+        """
+        Get documents with a single `get_all` request for every `batch_size`
+        of `doc_ids`, up to `concurrency` requests are run in parallel.
+        Yields (doc_id, doc_dict) in the order of `doc_ids`, doc_dict is None
+        for a missing document.
+        """
+        coll_ref: CollectionReference = self.db.collection(collection)
 
-        return doc_dict
+        def get_batch(batch_ids: List[str]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+            found = {}
+            with Timer(
+                f"get_all() of {len(batch_ids)} document(s)", metric="get", items=len(batch_ids)
+            ):
+                for doc in self.db.get_all([coll_ref.document(i) for i in batch_ids]):
+                    if doc.exists:
+                        found[doc.id] = self._decoded(doc)
+            return [(doc_id, found.get(doc_id)) for doc_id in batch_ids]
+
+        batches = (list(batch) for batch in chunks(doc_ids, max(1, batch_size)))
+        for results in parallel_map(get_batch, batches, concurrency):
+            yield from results
 
     def get_collections(self) -> Generator[CollectionReference, None, None]:
         for c in self.db.collections():
             yield c
 
     def query(
-        self, collection: str, limit: int, order_by: str, conditions: List[str]
+        self,
+        collection: str,
+        limit: Optional[int],
+        order_by: str,
+        conditions: List[str],
+        page_size: Optional[int] = None,
+        start_after: Optional[str] = None,
     ) -> Generator[Tuple[str, Dict[str, Any]], None, None]:
-        query: CollectionReference = self.db.collection(collection)
-        logger.debug(f"collection={collection}")
+        """
+        Query documents of `collection` matching `conditions`, up to `limit`
+        of them (all if None). With `page_size` or `start_after` documents
+        are fetched in pages, see _query_pages().
+        """
+        query = self._filtered_query(self.db, collection, order_by, conditions)
+        if page_size or start_after:
+            yield from self._query_pages(
+                query, limit, order_by, page_size or FS_QUERY_PAGE_SIZE, start_after
+            )
+            return
 
         if limit:
             query = query.limit(limit)
             logger.debug(f"limit={limit}")
 
+        for doc in query.stream():
+            yield doc.id, self._decoded(doc)
+
+    @classmethod
+    def _filtered_query(cls, client, collection: str, order_by: str, conditions: List[str]):
+        query: CollectionReference = client.collection(collection)
+        logger.debug(f"collection={collection}")
+
         for condition in conditions:
-            field, op, value = self._parse_condition(condition)
+            field, op, value = cls._parse_condition(condition)
             query = query.where(field, op, value)
             logger.debug(f"condition {field} {op} {value}")
             logger.debug(f"type(value)={type(value)}")
@@ -142,32 +368,182 @@ class _FirestoreDB:
             query = query.order_by(order_by)
             logger.debug(f"order_by=<{order_by}>")
 
-        for doc in query.stream():
-            doc_dict = doc.to_dict()
-            zdecompress_b64_encode_fields(doc_dict, ["header_xml_zstd"])
-            yield doc.id, doc_dict
+        return query
+
+    @staticmethod
+    def _decoded(doc: DocumentSnapshot) -> Dict[str, Any]:
+        doc_dict = doc.to_dict()
+        zdecompress_b64_encode_fields(doc_dict, ["header_xml_zstd"])
+        return doc_dict
+
+    def _query_pages(
+        self,
+        query,
+        limit: Optional[int],
+        order_by: str,
+        page_size: int,
+        start_after: Optional[str],
+    ) -> Generator[Tuple[str, Dict[str, Any]], None, None]:
+        """
+        Fetch documents of `query` in pages of `page_size` documents, every
+        page starts after the last document of the previous one (a cursor on
+        `order_by` field and document id), so earlier pages are not read
+        again and only a page is held at a time. The cursor is logged as
+        a token after every page, the query can be resumed after the page
+        with the token as `start_after`.
+        """
+        pages = _QueryPages(query, limit, order_by, page_size, start_after)
+        page = pages.next_page()
+        while page is not None:
+            for doc in page.stream():
+                yield pages.fetched(doc)
+            page = pages.next_page()
+
+    @staticmethod
+    def _encode_cursor(cursor: List[Any]) -> str:
+        def default(value):
+            if isinstance(value, datetime):
+                return {"$datetime": value.isoformat()}
+            raise TypeError(f"{value.__class__.__name__} value can not be a cursor.")
+
+        return base64.urlsafe_b64encode(json.dumps(cursor, default=default).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(token: str) -> List[Any]:
+        def object_hook(value):
+            if "$datetime" in value:
+                return datetime.fromisoformat(value["$datetime"])
+            return value
+
+        try:
+            return json.loads(base64.urlsafe_b64decode(token), object_hook=object_hook)
+        except ValueError:
+            raise ValueError(f"page token `{token}` is not valid.")
+
+    def export(
+        self,
+        collection: str,
+        dst: AnyPath,
+        partitions: int = FS_EXPORT_PARTITIONS,
+        concurrency: int = FS_EXPORT_CONCURRENCY,
+        compress: bool = False,
+    ) -> int:
+        """
+        Export documents of `collection` into NDJSON files in `dst` folder,
+        one file (shard) per partition of the collection, up to `partitions`
+        of them (see CollectionGroup.get_partitions()), `concurrency` of them
+        read in parallel. Documents of a shard are ordered by their id,
+        every line holds a document with its `_id` and `_collection`, so
+        shards can be loaded back with load command. Shards are compressed
+        with zstd when `compress`. Returns the number of exported documents.
+
+        Bytes fields are exported base64 encoded with ".b64" suffix of their
+        names and are loaded back as bytes. Values of other types JSON has no
+        notion of are loaded back as strings or maps: timestamps as ISO 8601
+        strings, references as paths of documents, geo points as maps of
+        latitude and longitude, bytes inside arrays as base64 strings.
+        """
+        suffix = ".ndjson.zst" if compress else ".ndjson"
+        progress = Progress(f"collection '{collection}': exported")
+
+        def export_partition(shard: Tuple[int, Any]) -> Tuple[AnyPath, int]:
+            index, partition = shard
+            path = dst / f"{collection}-{index:05d}{suffix}"
+            docs = 0
+            with path.open("wb") as fd:
+                with zstd.stream_writer(fd) if compress else nullcontext(fd) as out:
+                    for doc in partition.query().stream():
+                        # partitions of a collection group hold subcollections of the same id
+                        if doc.reference.parent.path != collection:
+                            continue
+                        line = self._export_line(collection, doc)
+                        out.write(line)
+                        docs += 1
+                        progress.add(1, len(line))
+            logger.debug(f"{docs} document(s) were written into {path} file.")
+            return path, docs
+
+        dst.mkdir(parents=True, exist_ok=True)
+        with Timer("get_partitions()"):
+            shards = list(
+                enumerate(self.db.collection_group(collection).get_partitions(partitions))
+            )
+        logger.info(f"collection '{collection}' is split into {len(shards)} partition(s).")
+        for path, docs in parallel_map(export_partition, shards, concurrency):
+            logger.info(f"{docs} document(s) were written into {path} file.")
+
+        return progress.done()
+
+    @staticmethod
+    def _export_line(collection: str, doc: DocumentSnapshot) -> bytes:
+        doc_dict = _FirestoreDB._decoded(doc)
+        encode_b64_fields(doc_dict)
+        doc_dict.update({"_id": doc.id, "_collection": collection})
+        line = json.dumps(doc_dict, ensure_ascii=False, sort_keys=True, default=_export_default)
+        return line.encode() + b"\n"
 
     def delete_doc(self, collection: str, doc_id: str) -> bool:
         self.db.collection(collection).document(doc_id).delete()
         logger.info(f"{doc_id} was requested to be deleted")
 
-    def delete_all_docs(self, collection: str, batch_size: int = 100) -> int:
+    def delete_all_docs(
+        self,
+        collection: str,
+        batch_size: int = FS_MAX_BATCH_OPS,
+        concurrency: int = FS_DELETE_CONCURRENCY,
+        recursive: bool = False,
+    ) -> int:
+        """
+        Delete all documents of `collection` with batched writes of up to
+        `batch_size` deletes, `concurrency` batches are committed in parallel
+        while the ids of documents are streamed by a keys-only query.
+        When `recursive`, documents of subcollections are deleted as well
+        (with a BulkWriter driven by Client.recursive_delete()).
+        """
+        if recursive:
+            return self._delete_recursively(collection)
+
         coll_ref: CollectionReference = self.db.collection(collection)
+        progress = Progress(f"collection '{collection}': deleted")
 
-        deleted = 0
-        for doc_ref in coll_ref.list_documents(page_size=batch_size):
-            doc_ref.delete()
-            deleted += 1
-            if deleted % batch_size == 0:
-                logger.info(f"{'='*32} deleted={deleted}")
-        else:
-            # no more docs
+        def delete_batch(doc_refs: List[DocumentReference]) -> int:
+            self._delete_batch(self.db, doc_refs).commit()
+            return len(doc_refs)
+
+        doc_refs = (doc.reference for doc in coll_ref.select([]).stream())
+        batches = (list(batch) for batch in chunks(doc_refs, max(1, batch_size)))
+        for deleted in parallel_map(delete_batch, batches, concurrency):
+            progress.add(deleted)
+
+        return self._deleted(collection, progress)
+
+    @staticmethod
+    def _delete_batch(client, doc_refs: List[DocumentReference]):
+        batch = client.batch()
+        for doc_ref in doc_refs:
+            batch.delete(doc_ref)
+        return batch
+
+    @staticmethod
+    def _deleted(collection: str, progress: Progress) -> int:
+        if not progress.count:
             logger.warning(f"collection '{collection}' is empty or does not exist.")
+            return 0
+
+        return progress.done()
 
-        if deleted:
-            logger.info(f"deleted {deleted} document(s)")
+    def _delete_recursively(self, collection: str) -> int:
+        progress = Progress(f"collection '{collection}' (recursively): deleted")
+        bulk_writer = self.db.bulk_writer(
+            BulkWriterOptions(
+                initial_ops_per_second=FS_BULK_DELETE_OPS_PER_SECOND,
+                max_ops_per_second=FS_BULK_DELETE_OPS_PER_SECOND,
+            )
+        )
+        bulk_writer.on_write_result(lambda *args: progress.add())
+        self.db.recursive_delete(self.db.collection(collection), bulk_writer=bulk_writer)
 
-        return deleted
+        return self._deleted(collection, progress)
 
     @staticmethod
     def _parse_condition(condition: str) -> Tuple[str, str, Union[str, int, float]]:
@@ -192,6 +568,278 @@ class _FirestoreDB:
         return (field, op, value)
 
 
-db = _FirestoreDB()
+class _QueryPages:
+    """
+    Pages of `page_size` documents of a query read by query() of either
+    client, every page starts after the last document fetched
+    from the previous one (a cursor on `order_by` field and document id).
+    """
+
+    def __init__(
+        self,
+        query,
+        limit: Optional[int],
+        order_by: str,
+        page_size: int,
+        start_after: Optional[str],
+    ):
+        self._query = query.order_by(FieldPath.document_id())
+        self._order_by = order_by
+        self._page_size = page_size
+        self._cursor = _FirestoreDB._decode_cursor(start_after) if start_after else None
+        self._remaining = limit or None
+        self._size = None
+        self._fetched = 0
+
+    def next_page(self):
+        """
+        Query of the next page, None when all the documents were fetched.
+        """
+        if self._size is not None:
+            if self._fetched < self._size:
+                return None
+            if self._remaining is not None:
+                self._remaining -= self._fetched
+            self._log_page()
+
+        if self._remaining is not None and self._remaining <= 0:
+            return None
+        self._size = self._page_size
+        if self._remaining is not None:
+            self._size = min(self._size, self._remaining)
+        self._fetched = 0
+
+        page = self._query.limit(self._size)
+        return page if self._cursor is None else page.start_after(self._cursor)
+
+    def _log_page(self) -> None:
+        # the token is only a hint to resume the query, the cursor of the next
+        # page is kept as it is, whether it can be encoded or not
+        try:
+            token = _FirestoreDB._encode_cursor(self._cursor)
+        except TypeError as e:
+            logger.warning(f"page of {self._fetched} document(s), no next page token: {e}")
+        else:
+            logger.info(f"page of {self._fetched} document(s), next page token: {token}")
+
+    def fetched(self, doc: DocumentSnapshot) -> Tuple[str, Dict[str, Any]]:
+        """
+        Move the cursor after `doc` of the current page, return its id and
+        decoded content.
+        """
+        self._fetched += 1
+        self._cursor = ([doc.get(self._order_by)] if self._order_by else []) + [doc.id]
+        return doc.id, _FirestoreDB._decoded(doc)
+
+
+class _AsyncFirestoreDB:
+    """
+    Load, get, query and delete documents with Firestore AsyncClient, all
+    the requests are sent from a single thread running an event loop, up
+    to `concurrency` (or `writers` of the load pipeline) of them in flight.
+    Documents are prepared and decoded by `firestore_db`, recursive deletes
+    are run by it in a thread.
+    """
+
+    def __init__(self, firestore_db: _FirestoreDB):
+        self._firestore_db = firestore_db
+        self._db = None
+        self._loop = None
+
+    def __reduce__(self):
+        return "adb"
+
+    def reset(self) -> None:
+        self._db = None
+        self._loop = None
+
+    @property
+    def db(self):
+        # a client is bound to the event loop it is created in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._db, self._loop = firestore.AsyncClient(**_client_kwargs()), loop
+            at_loop_close(self._forget)
+        return self._db
+
+    async def _forget(self) -> None:
+        self.reset()
+
+    def upload_documents(
+        self, collection: str, doc_id: str, json_file_paths: Iterable[AnyPath], **kwargs
+    ) -> Generator[LoadItem, None, None]:
+        """
+        upload_documents() of _FirestoreDB writing batches with write_batch()
+        of the asyncio client.
+        """
+        return self._firestore_db.upload_documents(
+            collection, doc_id, json_file_paths, write_batch=self.write_batch, **kwargs
+        )
+
+    async def write_batch(self, items: List[LoadItem]) -> List[LoadItem]:
+        """
+        write_batch() of _FirestoreDB awaiting the requests.
+        """
+        results, pending = split_failed(items)
+
+        if len(pending) > 1:
+            batch = _FirestoreDB._set_batch(self.db, pending)
+            try:
+                with Timer(f"commit batch of {len(pending)} document(s)"):
+                    await batch.commit()
+            except Exception as e:
+                _FirestoreDB._batch_failed(pending, e)
+            else:
+                return results + pending
+
+        for item in pending:
+            try:
+                await self.db.collection(item.collection).document(item.doc_id).set(item.doc_dict)
+                results.append(item)
+            except Exception as e:
+                results.append(item._replace(error=e))
+        return results
+
+    async def get_documents(
+        self,
+        collection: str,
+        doc_ids: Iterable[str],
+        batch_size: int = FS_GET_BATCH_SIZE,
+        concurrency: int = 1,
+    ) -> AsyncGenerator[Tuple[str, Optional[Dict[str, Any]]], None]:
+        """
+        get_documents() of _FirestoreDB with up to `concurrency` `get_all`
+        requests in flight.
+        """
+        coll_ref = self.db.collection(collection)
+
+        async def get_batch(batch_ids: List[str]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+            found = {}
+            with Timer(
+                f"get_all() of {len(batch_ids)} document(s)", metric="get", items=len(batch_ids)
+            ):
+                async for doc in self.db.get_all([coll_ref.document(i) for i in batch_ids]):
+                    if doc.exists:
+                        found[doc.id] = _FirestoreDB._decoded(doc)
+            return [(doc_id, found.get(doc_id)) for doc_id in batch_ids]
+
+        batches = (list(batch) for batch in chunks(doc_ids, max(1, batch_size)))
+        async for results in bounded_map(get_batch, batches, concurrency):
+            for result in results:
+                yield result
+
+    async def query(
+        self,
+        collection: str,
+        limit: Optional[int],
+        order_by: str,
+        conditions: List[str],
+        page_size: Optional[int] = None,
+        start_after: Optional[str] = None,
+    ) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        """
+        query() of _FirestoreDB streaming documents asynchronously.
+        """
+        query = _FirestoreDB._filtered_query(self.db, collection, order_by, conditions)
+        if page_size or start_after:
+            pages = _QueryPages(
+                query, limit, order_by, page_size or FS_QUERY_PAGE_SIZE, start_after
+            )
+            page = pages.next_page()
+            while page is not None:
+                async for doc in page.stream():
+                    yield pages.fetched(doc)
+                page = pages.next_page()
+            return
+
+        if limit:
+            query = query.limit(limit)
+            logger.debug(f"limit={limit}")
+
+        async for doc in query.stream():
+            yield doc.id, _FirestoreDB._decoded(doc)
+
+    async def delete_docs(
+        self, collection: str, doc_ids: Iterable[str], concurrency: int = 1
+    ) -> AsyncGenerator[Tuple[str, Optional[Exception]], None]:
+        """
+        Delete documents of `doc_ids` with up to `concurrency` requests in
+        flight, yields (doc_id, error) in the order of `doc_ids`, error is
+        None for a deleted document.
+        """
+        coll_ref = self.db.collection(collection)
+
+        async def delete(doc_id: str) -> Tuple[str, Optional[Exception]]:
+            try:
+                await coll_ref.document(doc_id).delete()
+            except Exception as e:
+                return doc_id, e
+            logger.info(f"{doc_id} was requested to be deleted")
+            return doc_id, None
+
+        async for result in bounded_map(delete, doc_ids, concurrency):
+            yield result
+
+    async def delete_all_docs(
+        self,
+        collection: str,
+        batch_size: int = FS_MAX_BATCH_OPS,
+        concurrency: int = FS_DELETE_CONCURRENCY,
+        recursive: bool = False,
+    ) -> int:
+        """
+        delete_all_docs() of _FirestoreDB with up to `concurrency` batched
+        writes in flight. A recursive delete is run by _FirestoreDB in
+        a thread.
+        """
+        if recursive:
+            return await asyncio.to_thread(
+                self._firestore_db.delete_all_docs, collection, recursive=True
+            )
+
+        coll_ref = self.db.collection(collection)
+        progress = Progress(f"collection '{collection}': deleted")
+
+        async def delete_batch(doc_refs: List[Any]) -> int:
+            await _FirestoreDB._delete_batch(self.db, doc_refs).commit()
+            return len(doc_refs)
+
+        doc_refs = (doc.reference async for doc in coll_ref.select([]).stream())
+        batches = achunks(doc_refs, max(1, batch_size))
+        async for deleted in bounded_map(delete_batch, batches, concurrency):
+            progress.add(deleted)
+
+        return _FirestoreDB._deleted(collection, progress)
 
-__all__ = ["db", "FS_DB_SUPPORTED_OPS"]
+
+def _export_default(v: Any) -> Any:
+    if isinstance(v, (bytes, bytearray)):
+        return base64.b64encode(v).decode("ascii")
+    if isinstance(v, datetime):
+        return v.isoformat()
+    if isinstance(v, DocumentReference):
+        return v.path
+    if isinstance(v, GeoPoint):
+        return {"latitude": v.latitude, "longitude": v.longitude}
+    raise TypeError(f"Object of type {v.__class__.__name__} is not JSON serializable")
+
+
+db = _FirestoreDB()
+adb = _AsyncFirestoreDB(db)
+
+# a client created before fork is not usable in the child process
+os.register_at_fork(after_in_child=db.reset)
+os.register_at_fork(after_in_child=adb.reset)
+
+__all__ = [
+    "adb",
+    "db",
+    "FS_DB_SUPPORTED_OPS",
+    "FS_DELETE_CONCURRENCY",
+    "FS_EXPORT_CONCURRENCY",
+    "FS_EXPORT_PARTITIONS",
+    "FS_GET_BATCH_SIZE",
+    "FS_MAX_BATCH_OPS",
+    "FS_MAX_BATCH_BYTES",
+    "FS_QUERY_PAGE_SIZE",
+]
@@ -0,0 +1,50 @@
+# Firestore supported conditional operators to query
+FS_DB_SUPPORTED_OPS = [
+    "<",
+    "<=",
+    "==",
+    ">=",
+    ">",
+    "!=",
+    # https://github.com/googleapis/python-firestore/blob/main/google/cloud/firestore_v1/base_query.py#L73,L76
+    "array_contains",
+    "array_contains_any",
+    "in",
+    "not-in",
+]
+
+# Firestore limits for a single commit request (batched write): at most 500
+# writes and at most 10 MiB of payload, some room is left for the overhead.
+FS_MAX_BATCH_OPS = 500
+FS_MAX_BATCH_BYTES = 9 * 1024 * 1024
+
+# number of batches of deletes committed in parallel by delete_all_docs()
+FS_DELETE_CONCURRENCY = 8
+
+# rate limit of the BulkWriter deleting collections recursively, the default
+# one (500 ops/s ramping up by 50% every 5 minutes) is meant for new traffic
+# and keeps a bulk delete of a large collection going for hours
+FS_BULK_DELETE_OPS_PER_SECOND = 10000
+
+# number of documents fetched with a single query of a paginated query
+FS_QUERY_PAGE_SIZE = 1000
+
+# number of partitions (shards) a collection is split into by export() and
+# number of them read in parallel
+FS_EXPORT_PARTITIONS = 16
+FS_EXPORT_CONCURRENCY = 8
+
+# number of documents requested with a single get_all (BatchGetDocuments) request
+FS_GET_BATCH_SIZE = 100
+
+__all__ = [
+    "FS_BULK_DELETE_OPS_PER_SECOND",
+    "FS_DB_SUPPORTED_OPS",
+    "FS_DELETE_CONCURRENCY",
+    "FS_EXPORT_CONCURRENCY",
+    "FS_EXPORT_PARTITIONS",
+    "FS_GET_BATCH_SIZE",
+    "FS_MAX_BATCH_BYTES",
+    "FS_MAX_BATCH_OPS",
+    "FS_QUERY_PAGE_SIZE",
+]
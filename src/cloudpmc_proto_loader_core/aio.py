@@ -0,0 +1,163 @@
+import asyncio
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Union,
+)
+
+import click
+
+from .logger import logger
+
+_END = object()
+
+_LOOP_CLOSERS = {}
+
+
+def at_loop_close(close: Callable[[], Awaitable[Any]]) -> None:
+    """
+    Await `close` before the running event loop (one of run_async() or
+    iter_async()) is closed, e.g. to close a client bound to the loop.
+    """
+    _LOOP_CLOSERS.setdefault(asyncio.get_running_loop(), []).append(close)
+
+
+async def _close_loop_resources() -> None:
+    for close in _LOOP_CLOSERS.pop(asyncio.get_running_loop(), []):
+        try:
+            await close()
+        except Exception as e:
+            logger.debug(f"closing failed ({e.__class__.__name__}: {e})")
+
+
+async def _main(awaitable: Awaitable[Any]) -> Any:
+    try:
+        return await awaitable
+    finally:
+        await _close_loop_resources()
+
+
+def run_async(awaitable: Awaitable[Any]) -> Any:
+    """
+    Run `awaitable` on an event loop of its own and return its result.
+    """
+    return asyncio.run(_main(awaitable))
+
+
+def iter_async(aiterable: AsyncIterable[Any]) -> Iterator[Any]:
+    """
+    iter_async() iterates `aiterable` from synchronous code, it is driven
+    on an event loop of its own item by item, so that items are consumed
+    (e.g. written into a sink) as soon as they come.
+    """
+    loop = asyncio.new_event_loop()
+    iterator = aiterable.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        try:
+            if hasattr(iterator, "aclose"):
+                loop.run_until_complete(iterator.aclose())
+            loop.run_until_complete(_close_loop_resources())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+
+
+async def iter_in_thread(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    """
+    Iterate a blocking `iterable` (a queue, a file or stdin) in a thread,
+    so that the event loop is not blocked waiting for its items.
+    """
+    iterator = iter(iterable)
+    while True:
+        item = await asyncio.to_thread(next, iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+async def achunks(aiterable: AsyncIterable[Any], size: int) -> AsyncIterator[List[Any]]:
+    """
+    Split `aiterable` into lists of up to `size` items.
+    """
+    chunk = []
+    async for item in aiterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def bounded_map(
+    func: Callable[[Any], Awaitable[Any]],
+    iterable: Union[Iterable[Any], AsyncIterable[Any]],
+    concurrency: int,
+) -> AsyncIterator[Any]:
+    """
+    bounded_map() awaits `func` for items of `iterable` with up to
+    `concurrency` calls in flight and yields results in the order of items,
+    the asyncio counterpart of parallel_map(). The iterable is consumed
+    lazily (a blocking one in a thread, see iter_in_thread()), no more than
+    2 * `concurrency` items are held. Calls still in flight are cancelled
+    when the iteration fails or is stopped early.
+    """
+    if not hasattr(iterable, "__aiter__"):
+        iterable = iter_in_thread(iterable)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def call(item: Any) -> Any:
+        async with semaphore:
+            return await func(item)
+
+    pending = deque()
+    try:
+        async for item in iterable:
+            pending.append(asyncio.ensure_future(call(item)))
+            if len(pending) >= 2 * concurrency:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def aio_option(func):
+    """
+    The decorator function to add --aio option to a cli command.
+    """
+    return click.option(
+        "--aio",
+        is_flag=True,
+        show_default=True,
+        default=False,
+        help=(
+            "Send requests with an asyncio client from a single thread, up to --concurrency "
+            "(--writers for load) of them in flight."
+        ),
+    )(func)
+
+
+__all__ = [
+    "achunks",
+    "aio_option",
+    "at_loop_close",
+    "bounded_map",
+    "iter_async",
+    "iter_in_thread",
+    "run_async",
+]
@@ -0,0 +1,140 @@
+import asyncio
+import inspect
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Generator, Iterable, List, Optional, Tuple
+
+from .helpers import LoadItem, split_failed
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    collection TEXT,
+    doc_id TEXT,
+    hash TEXT,
+    PRIMARY KEY (collection, doc_id)
+);
+"""
+
+
+class LocalHashIndex:
+    """
+    Local index (SQLite database) of content hashes of documents written
+    into a database by previous loads.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def get_hashes(self, items: List[LoadItem]) -> List[Optional[str]]:
+        hashes = []
+        with self._lock:
+            for item in items:
+                row = self._conn.execute(
+                    "SELECT hash FROM hashes WHERE collection = ? AND doc_id = ?",
+                    (item.collection, item.doc_id),
+                ).fetchone()
+                hashes.append(row[0] if row else None)
+        return hashes
+
+    def set_hashes(self, items: List[LoadItem]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)",
+                [(item.collection, item.doc_id, item.hash) for item in items],
+            )
+            self._conn.commit()
+
+
+def open_hash_index(incremental: bool, path: Optional[str], default=None):
+    """
+    Return the hash index of an incremental load: the local one at `path`,
+    if given, or the `default` one, None when the load is not incremental.
+    """
+    if not incremental:
+        return None
+    if path:
+        return LocalHashIndex(path)
+    if default is None:
+        raise ValueError("--incremental option requires --hash-index option.")
+    return default
+
+
+def _split_unchanged(
+    items: List[LoadItem], known_hashes: List[Optional[str]]
+) -> Tuple[List[LoadItem], List[LoadItem]]:
+    # items left unchanged (to be skipped) and the changed ones
+    unchanged, changed = [], []
+    for item, known_hash in zip(items, known_hashes):
+        if known_hash is not None and known_hash == item.hash:
+            unchanged.append(item._replace(skipped=True))
+        else:
+            changed.append(item)
+    return unchanged, changed
+
+
+def write_changed(
+    write_batch: Callable[[List[LoadItem]], Iterable[LoadItem]],
+    hash_index,
+    items: List[LoadItem],
+) -> Generator[LoadItem, None, None]:
+    """
+    Write with `write_batch` only new documents of `items` and the ones
+    whose hash differs from the one recorded in `hash_index`, documents
+    left unchanged are yielded back with `skipped` set.
+    """
+    failed, pending = split_failed(items)
+    unchanged, changed = _split_unchanged(pending, hash_index.get_hashes(pending))
+    yield from failed + unchanged
+
+    if changed:
+        written = list(write_batch(changed))
+        hash_index.set_hashes([item for item in written if item.error is None])
+        yield from written
+
+
+async def _acall(func: Callable[..., Any], *args) -> Any:
+    # methods of an asyncio hash index are awaited, the blocking ones run in a thread
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+async def awrite_changed(
+    write_batch: Callable[[List[LoadItem]], Awaitable[List[LoadItem]]],
+    hash_index,
+    items: List[LoadItem],
+) -> List[LoadItem]:
+    """
+    write_changed() with a coroutine function `write_batch`. Methods of
+    `hash_index` are awaited when they are coroutine functions (e.g. of
+    an index kept in the database itself), or are run in a thread.
+    """
+    failed, pending = split_failed(items)
+    unchanged, changed = _split_unchanged(pending, await _acall(hash_index.get_hashes, pending))
+    done = failed + unchanged
+
+    if changed:
+        written = await write_batch(changed)
+        await _acall(hash_index.set_hashes, [item for item in written if item.error is None])
+        done.extend(written)
+    return done
+
+
+__all__ = ["LocalHashIndex", "awrite_changed", "open_hash_index", "write_changed"]
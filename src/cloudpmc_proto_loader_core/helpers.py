@@ -0,0 +1,327 @@
+import base64
+import copy
+import hashlib
+import importlib.util
+import json
+import pprint
+import re
+import sys
+from ast import literal_eval
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from itertools import chain, islice
+from types import ModuleType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import zstd
+from .logger import logger
+from .tracing import traced
+
+pprinter = pprint.PrettyPrinter(indent=4, depth=2, width=100)
+
+
+def bytes_to_str(v):
+    return "".join([f"\\x{{{x:02x}}}" if not (32 < x < 128) else chr(x) for x in v])
+
+
+ELLIPSIS_STR = " ..."
+
+
+def deep_truncate(d: Dict[str, Any], max_size=56) -> Dict[str, Any]:
+    """
+    deep_truncate() helper function iterates over all elements
+    of dictionary and truncate values to requested size
+    """
+    if isinstance(d, dict):
+        for k, v in d.items():
+            if isinstance(v, dict):
+                d.update({k: deep_truncate(v)})
+            elif isinstance(v, bytes):
+                new_v = bytes_to_str(v)
+                if len(new_v) > max_size:
+                    new_v = new_v[:max_size] + ELLIPSIS_STR
+                d.update({k: new_v})
+            elif isinstance(v, str) and len(v) > max_size:
+                d.update({k: v[:max_size] + ELLIPSIS_STR})
+
+    return d
+
+
+# suffix of the name of a base64 encoded bytes field
+B64_SUFFIX = ".b64"
+
+
+@traced
+def decode_b64_fields(d: Dict[str, Any]) -> None:
+    """
+    decode_b64_fields() decodes fields with name suffix ".b64" into bytes
+    and renames the field to the same name with no suffix.
+    """
+    if isinstance(d, dict):
+        # fields are renamed, iterate over a copy of the keys
+        for k in list(d.keys()):
+            if isinstance(k, str) and k.endswith(B64_SUFFIX) and isinstance(d[k], str):
+                v = d.pop(k)
+                new_k = k[: -len(B64_SUFFIX)]
+                new_v = base64.b64decode(v)
+                d.update({new_k: new_v})
+            elif isinstance(d[k], dict):
+                decode_b64_fields(d[k])
+
+
+def encode_b64_fields(d: Dict[str, Any]) -> None:
+    """
+    encode_b64_fields() is the counterpart of decode_b64_fields(), it
+    encodes bytes fields into base64 and renames the field to the same
+    name with ".b64" suffix.
+    """
+    for k in list(d.keys()):
+        if isinstance(d[k], (bytes, bytearray)):
+            d[k + B64_SUFFIX] = base64.b64encode(d.pop(k)).decode("ascii")
+        elif isinstance(d[k], dict):
+            encode_b64_fields(d[k])
+
+
+# suffix of the field with the id of the zstd dictionary a field is compressed with
+ZSTD_DICT_SUFFIX = "_dict"
+
+B64_RE = re.compile("^(?:[A-Za-z0-9+/]{4})*(?:[A-Za-z0-9+/]{3}=|[A-Za-z0-9+/]{2}==)?$")
+
+
+@traced
+def b64_decode_zcompress_fields(
+    d: Dict[str, Any], fields: List[str], compression: zstd.Compression = zstd.Compression()
+) -> None:
+    dictionary = compression.dictionary
+    for f in fields:
+        v = d.pop(f)
+        if v is not None:
+            if B64_RE.match(v):
+                v = base64.b64decode(v)
+            else:
+                v = v.encode()
+            v_zstd = zstd.compress(v, dictionary, compression.level)
+            f_zstd = f + "_zstd"
+            d.update({f_zstd: v_zstd})
+            if dictionary is not None:
+                # the version of the dictionary the field is compressed with
+                d.update({f_zstd + ZSTD_DICT_SUFFIX: dictionary.dict_id()})
+
+
+@traced
+def zdecompress_b64_encode_fields(d: Dict[str, Any], fields: List[str]) -> None:
+    for f in fields:
+        if f.endswith("_zstd"):
+            v = d.pop(f, None)
+            dict_id = d.pop(f + ZSTD_DICT_SUFFIX, None)
+            if v is not None:
+                v = zstd.decompress(v, dict_id)
+                d[f.strip("_zstd")] = base64.b64encode(v).decode("ascii")
+
+
+@traced
+def b64_decode_zdecompress_fields(d: Dict[str, Any], fields: List[str]) -> None:
+    for f in fields:
+        if f.endswith("_zstd"):
+            v = d.pop(f, None)
+            dict_id = d.pop(f + ZSTD_DICT_SUFFIX, None)
+            if v is not None:
+                v = base64.b64decode(v) if B64_RE.match(v) else v.encode()
+                v = zstd.decompress(v, dict_id)
+                d[f.strip("_zstd")] = v.decode("utf-8")
+
+
+def simplest_type(s: str) -> Union[str, int, float]:
+    """
+    Infer the value as python object. It is also support
+    certain strings as booleans.
+    """
+    try:
+        if s.lower() in ["y", "yes", "true", "on"]:
+            s = "True"
+        elif s.lower() in ["n", "no", "false", "off"]:
+            s = "False"
+        elif s.lower() in ["none", "null"]:
+            s = "None"
+        return literal_eval(s)
+    except Exception:
+        return s
+
+
+def docstring_with_params(*args, **kwargs):
+    """
+    The decorator function to supply arguments to docstring in any
+    object, before it would be used as o.__doc__ anywhere.
+    """
+
+    def decorated(o):
+        o.__doc__ = o.__doc__.format(*args, **kwargs)
+        return o
+
+    return decorated
+
+
+def cli_try_except(error_code):
+    """
+    The decorator function to decorate cli commands with try except block.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def decorated(click_ctx, *args, **kwargs):
+            try:
+                return func(click_ctx, *args, **kwargs)
+            except Exception as e:
+                if click_ctx.parent.arg_debug:
+                    logger.exception(e)
+                logger.error(f"{e.__class__.__name__}: {e}")
+                click_ctx.exit(error_code)
+
+        return decorated
+
+    return decorator
+
+
+def log_debug_doc_dict(click_ctx, doc_dict: Dict[str, Any]) -> None:
+    if click_ctx.parent.arg_debug:
+        doc_for_display = deep_truncate(copy.deepcopy(doc_dict), 64)
+        logger.debug("\n{}", pprinter.pformat(doc_for_display))
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    lazy_import() returns module `name`, which is executed on the first
+    access to its attributes, so that heavy dependencies (clients of
+    databases) are not imported by commands not using them (e.g. --help).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def chunks(iterable: Iterator[Any], size: int) -> Iterator[chain]:
+    iterator = iter(iterable)
+    for first in iterator:
+        yield chain([first], islice(iterator, size - 1))
+
+
+def parallel_map(
+    func: Callable[[Any], Any], iterable: Iterable[Any], concurrency: int
+) -> Iterator[Any]:
+    """
+    parallel_map() calls `func` for items of `iterable` in `concurrency`
+    threads and yields results in the order of items. The iterable is
+    consumed lazily, no more than 2 * `concurrency` items are in flight.
+    """
+    if concurrency <= 1:
+        yield from map(func, iterable)
+        return
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        pending = deque()
+        for item in iterable:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class LoadItem(NamedTuple):
+    """
+    A document on its way into a database: where it came from, where it
+    goes to and the error encountered on the way, if any. The raw content
+    of the source is kept in `data` until the document is parsed.
+    """
+
+    source: Any
+    collection: Optional[str] = None
+    doc_id: Optional[str] = None
+    doc_dict: Optional[Dict[str, Any]] = None
+    size: int = 0
+    error: Optional[Exception] = None
+    data: Optional[bytes] = None
+    hash: Optional[str] = None
+    skipped: bool = False
+
+
+def split_failed(items: List[LoadItem]) -> Tuple[List[LoadItem], List[LoadItem]]:
+    """
+    Split `items` of a batch into the ones which have already failed and
+    the ones pending to be written.
+    """
+    failed = [item for item in items if item.error is not None]
+    return failed, [item for item in items if item.error is None]
+
+
+def doc_size(v: Any) -> int:
+    """
+    doc_size() estimates the storage size of a document (or of its value)
+    following the Firestore storage size rules, close enough to keep batched
+    write requests under the size limits of the backends.
+    """
+    if isinstance(v, dict):
+        return sum(len(str(k).encode()) + 1 + doc_size(x) for k, x in v.items()) + 32
+    elif isinstance(v, (list, tuple)):
+        return sum(doc_size(x) for x in v)
+    elif isinstance(v, str):
+        return len(v.encode()) + 1
+    elif isinstance(v, (bytes, bytearray)):
+        return len(v)
+    elif v is None or isinstance(v, bool):
+        return 1
+    return 8
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (bytes, bytearray)):
+        return base64.b64encode(v).decode("ascii")
+    raise TypeError(f"Object of type {v.__class__.__name__} is not JSON serializable")
+
+
+@traced
+def doc_hash(doc_dict: Dict[str, Any]) -> str:
+    """
+    doc_hash() returns a digest of the document content, which does not
+    depend on the order of its fields.
+    """
+    content = json.dumps(doc_dict, sort_keys=True, separators=(",", ":"), default=_json_default)
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def batched(
+    iterable: Iterable[Any], max_items: int, max_bytes: int, size: Callable[[Any], int]
+) -> Iterator[List[Any]]:
+    """
+    batched() groups items into lists holding at most `max_items` items
+    and at most `max_bytes` bytes according to `size`. An item bigger than
+    `max_bytes` is placed into a batch of its own.
+    """
+    batch, batch_bytes = [], 0
+    for item in iterable:
+        item_bytes = size(item)
+        if batch and (len(batch) >= max_items or batch_bytes + item_bytes > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(item)
+        batch_bytes += item_bytes
+    if batch:
+        yield batch
@@ -0,0 +1,197 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Iterable, Iterator, List, Optional
+
+import click
+
+from .helpers import LoadItem, lazy_import
+from .logger import logger
+from .sources import iter_sources, source_file
+
+cloudpathlib = lazy_import("cloudpathlib")
+
+JOURNAL_COMMIT_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS loaded (
+    source TEXT PRIMARY KEY,
+    collection TEXT,
+    doc_id TEXT,
+    hash TEXT,
+    loaded_at REAL
+);
+CREATE TABLE IF NOT EXISTS failed (
+    source TEXT PRIMARY KEY,
+    path TEXT,
+    error TEXT,
+    failed_at REAL
+);
+"""
+
+
+class Journal:
+    """
+    Local checkpoint journal of a load (SQLite database). It records every
+    loaded source (a file or a record of a file) with its collection, doc_id
+    and content hash and keeps a dead-letter list of sources failed to load,
+    so that an interrupted load can be resumed and failed sources can be
+    retried on their own.
+
+    Records are committed every `commit_every` items and on close(), so
+    a crash loses at most that many records and their sources are loaded
+    again on resume.
+    """
+
+    def __init__(self, path: str, commit_every: int = JOURNAL_COMMIT_EVERY):
+        self._path = path
+        self._commit_every = max(1, commit_every)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.loaded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def is_loaded(self, source: Any) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM loaded WHERE source = ?", (str(source),)
+            ).fetchone()
+        return row is not None
+
+    def skip(self, source: Any) -> bool:
+        """
+        Tell whether `source` is to be skipped as loaded already.
+        """
+        if self.is_loaded(source):
+            self.skipped += 1
+            logger.debug(f"skipping already loaded {source}")
+            return True
+        return False
+
+    def skip_loaded(self, sources: Iterable[Any]) -> Iterator[Any]:
+        """
+        Yield `sources` not loaded yet according to the journal.
+        """
+        for source in sources:
+            if not self.skip(source):
+                yield source
+
+    def failed_sources(self) -> List["cloudpathlib.AnyPath"]:
+        """
+        Return the dead-letter list of files failed to load (or holding
+        records or members failed to load).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM failed GROUP BY path ORDER BY MIN(failed_at)"
+            ).fetchall()
+        return [cloudpathlib.AnyPath(path) for path, in rows]
+
+    def record(self, item: LoadItem) -> None:
+        source = str(item.source)
+        path = str(source_file(item.source))
+        with self._lock:
+            if item.error is None:
+                self.loaded += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO loaded VALUES (?, ?, ?, ?, ?)",
+                    (source, item.collection, item.doc_id, item.hash, time.time()),
+                )
+                # the record is no longer failed, neither is its file as a whole
+                self._conn.execute("DELETE FROM failed WHERE source IN (?, ?)", (source, path))
+            else:
+                self.failed += 1
+                error = f"{item.error.__class__.__name__}: {item.error}"
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO failed VALUES (?, ?, ?, ?)",
+                    (source, path, error, time.time()),
+                )
+
+            self._pending += 1
+            if self._pending >= self._commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def log_summary(self) -> None:
+        logger.info(
+            f"journal {self._path}: {self.loaded} loaded, {self.failed} failed, "
+            f"{self.skipped} skipped as already loaded."
+        )
+
+
+def select_sources(
+    journal: Optional[Journal],
+    json_files: Iterable[str],
+    manifest: Optional[str],
+    resume: bool,
+    retry_failed: bool,
+) -> Iterable["cloudpathlib.AnyPath"]:
+    """
+    Select sources to be loaded: the ones given in command line (see
+    iter_sources()) or the ones failed to load according to `journal`,
+    skipping those already loaded on `resume`.
+    """
+    if (resume or retry_failed) and journal is None:
+        raise ValueError("--resume and --retry-failed options require --journal option.")
+
+    if retry_failed:
+        sources = journal.failed_sources()
+    elif json_files or manifest:
+        sources = iter_sources(json_files, manifest)
+    else:
+        raise ValueError("JSON_FILES argument(s) or --manifest option is required.")
+
+    if resume:
+        sources = journal.skip_loaded(sources)
+
+    return sources
+
+
+def journal_options(func):
+    """
+    The decorator function to add checkpoint journal options to a cli command.
+    """
+    options = [
+        click.option(
+            "--journal",
+            type=click.Path(dir_okay=False),
+            help="Checkpoint journal (SQLite database) recording loaded and failed files.",
+        ),
+        click.option(
+            "--resume",
+            is_flag=True,
+            show_default=True,
+            default=False,
+            help="Skip files recorded as loaded in --journal.",
+        ),
+        click.option(
+            "--retry-failed",
+            is_flag=True,
+            show_default=True,
+            default=False,
+            help="Load only files recorded as failed in --journal.",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+__all__ = ["Journal", "journal_options", "select_sources"]
@@ -0,0 +1,377 @@
+import inspect
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Generator, Iterable, Iterator, List, Optional
+
+import click
+
+from .aio import bounded_map, run_async
+from .helpers import LoadItem, batched
+from .logger import CONFIG, CONFIG_DEBUG, logger
+from .sources import read_source
+from .timing import Timer, timed_iter
+from .tracing import call_traced, init_process, tracer
+
+PIPELINE_READERS = 4
+PIPELINE_TRANSFORMERS = 1
+PIPELINE_WRITERS = 1
+PIPELINE_WORKERS = 0
+PIPELINE_QUEUE_SIZE = 1000
+PIPELINE_QUEUE_BYTES = 256 * 1024 * 1024
+
+_DONE = object()
+
+
+class PipelineClosed(Exception):
+    pass
+
+
+class BoundedQueue:
+    """
+    FIFO queue bounded by the number of items and by their total size
+    in bytes, `put()` blocks until both bounds allow the item in.
+    An item bigger than `max_bytes` is let in when the queue is empty.
+    """
+
+    def __init__(self, max_items: int, max_bytes: Optional[int] = None):
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._items = deque()
+        self._bytes = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _is_full(self, size: int) -> bool:
+        if not self._items:
+            return False
+        if len(self._items) >= self._max_items:
+            return True
+        return self._max_bytes is not None and self._bytes + size > self._max_bytes
+
+    def put(self, item: Any, size: int = 0) -> None:
+        with self._cond:
+            while not self._closed and self._is_full(size):
+                self._cond.wait()
+            if self._closed:
+                raise PipelineClosed()
+            self._items.append((item, size))
+            self._bytes += size
+            self._cond.notify_all()
+
+    def get(self) -> Any:
+        with self._cond:
+            while not self._closed and not self._items:
+                self._cond.wait()
+            if self._closed:
+                raise PipelineClosed()
+            item, size = self._items.popleft()
+            self._bytes -= size
+            self._cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def _item_size(item: LoadItem) -> int:
+    return item.size
+
+
+def _init_worker(debug: bool, trace_origin: Optional[float]) -> None:
+    logger.configure(**(CONFIG_DEBUG if debug else CONFIG))
+    init_process(trace_origin)
+
+
+def _transform_in_pool(pool: ProcessPoolExecutor, transform, item: LoadItem) -> LoadItem:
+    # raw content is sent to a worker process and the transformed document
+    # comes back, keep only one of them in memory of the parent process
+    if not tracer.enabled:
+        future = pool.submit(transform, item)
+        del item
+        return future.result()
+
+    # spans recorded by the worker come back along with the document
+    future = pool.submit(call_traced, transform, item)
+    del item
+    result, events = future.result()
+    tracer.extend(events)
+    return result
+
+
+class Pipeline:
+    """
+    Staged load pipeline: sources are read by `readers` I/O threads
+    (`read` may yield several items for a source holding many documents),
+    the raw content is turned into documents by `transformers` threads
+    calling `transform` and documents are written in batches by `writers`
+    threads calling `write_batch`.
+
+    Stages are connected with queues bounded both by the number of items
+    and by their size in bytes, so a slow stage holds back the ones
+    in front of it and memory usage stays bounded.
+
+    With `workers` greater than 0 the CPU bound `transform` is run in a pool
+    of `workers` processes, transformer threads then only pass items to and
+    from the pool. `transform` has to be picklable in that case.
+
+    When `write_batch` is a coroutine function, batches are written by
+    a single thread running an event loop, up to `writers` of them are
+    in flight at a time.
+    """
+
+    def __init__(
+        self,
+        transform: Callable[[LoadItem], LoadItem],
+        write_batch: Callable[[List[LoadItem]], Iterable[LoadItem]],
+        read: Callable[[LoadItem], Iterable[LoadItem]] = read_source,
+        readers: int = PIPELINE_READERS,
+        transformers: int = PIPELINE_TRANSFORMERS,
+        writers: int = PIPELINE_WRITERS,
+        workers: int = PIPELINE_WORKERS,
+        batch_size: int = 1,
+        batch_bytes: int = PIPELINE_QUEUE_BYTES,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        queue_bytes: int = PIPELINE_QUEUE_BYTES,
+        debug: bool = False,
+    ):
+        self._read = read
+        self._transform = transform
+        self._write_batch = write_batch
+        self._readers = max(1, readers)
+        self._transformers = max(1, transformers)
+        self._writers = max(1, writers)
+        self._workers = max(0, workers)
+        self._batch_size = max(1, batch_size)
+        self._batch_bytes = batch_bytes
+        self._queue_size = max(1, queue_size)
+        self._queue_bytes = queue_bytes
+        self._debug = debug
+        self._queues = []
+        self._errors = []
+
+    def run(self, sources: Iterable[Any]) -> Generator[LoadItem, None, None]:
+        """
+        Push `sources` through the pipeline, yield every processed item
+        as soon as it leaves the writer stage.
+        """
+        source_q = BoundedQueue(self._queue_size)
+        read_q = BoundedQueue(self._queue_size, self._queue_bytes)
+        transform_q = BoundedQueue(self._queue_size, self._queue_bytes)
+        result_q = BoundedQueue(self._queue_size, self._queue_bytes)
+        self._queues = [source_q, read_q, transform_q, result_q]
+        self._errors = []
+
+        pool = None
+        transform = self._transform
+        transformers = self._transformers
+        if self._workers:
+            # "spawn" start method, so that no client (gRPC channel, connection
+            # pool) of the parent process is ever inherited by a worker
+            pool = ProcessPoolExecutor(
+                self._workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._debug, tracer.origin if tracer.enabled else None),
+            )
+            transform = partial(_transform_in_pool, pool, self._transform)
+            # an item per worker is being transformed and another one is waiting
+            transformers = max(transformers, 2 * self._workers)
+
+        writers, write = self._writers, self._write
+        if inspect.iscoroutinefunction(self._write_batch):
+            writers, write = 1, self._write_async
+
+        self._start_stage("feed", 1, self._feed, (sources, source_q), source_q, self._readers)
+        self._start_stage(
+            "read",
+            self._readers,
+            self._flat_map,
+            (self._read, source_q, read_q),
+            read_q,
+            transformers,
+        )
+        self._start_stage(
+            "transform",
+            transformers,
+            self._map,
+            (transform, read_q, transform_q),
+            transform_q,
+            writers,
+        )
+        self._start_stage("write", writers, write, (transform_q, result_q), result_q, 1)
+
+        try:
+            while True:
+                item = result_q.get()
+                if item is _DONE:
+                    break
+                yield item
+        except PipelineClosed:
+            raise self._errors[0]
+        finally:
+            self._close()
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _start_stage(self, name, workers, target, args, out_q, downstream_workers) -> None:
+        threads = [
+            threading.Thread(
+                target=self._guard, args=(target, *args), name=f"{name}-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for t in threads:
+            t.start()
+
+        def close_stage():
+            for t in threads:
+                t.join()
+            try:
+                for _ in range(downstream_workers):
+                    out_q.put(_DONE)
+            except PipelineClosed:
+                pass
+
+        threading.Thread(target=close_stage, name=f"{name}-closer", daemon=True).start()
+
+    def _guard(self, target, *args) -> None:
+        try:
+            target(*args)
+        except PipelineClosed:
+            pass
+        except Exception as e:
+            logger.error(f"pipeline {threading.current_thread().name} failed")
+            self._errors.append(e)
+            self._close()
+
+    def _close(self) -> None:
+        for q in self._queues:
+            q.close()
+
+    @staticmethod
+    def _feed(sources: Iterable[Any], out_q: BoundedQueue) -> None:
+        for source in sources:
+            out_q.put(LoadItem(source))
+
+    @staticmethod
+    def _iter_queue(in_q: BoundedQueue) -> Iterator[Any]:
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def _flat_map(self, func, in_q: BoundedQueue, out_q: BoundedQueue) -> None:
+        for item in self._iter_queue(in_q):
+            if item.error is not None:
+                out_q.put(item, item.size)
+                continue
+            try:
+                for result in timed_iter(func(item), "read", size=_item_size):
+                    out_q.put(result, result.size)
+            except PipelineClosed:
+                raise
+            except Exception as e:
+                out_q.put(item._replace(data=None, size=0, error=e))
+
+    def _map(self, func, in_q: BoundedQueue, out_q: BoundedQueue) -> None:
+        for item in self._iter_queue(in_q):
+            if item.error is None:
+                try:
+                    with Timer(metric="transform", nbytes=item.size, args={"source": item.source}):
+                        item = func(item)
+                except Exception as e:
+                    item = item._replace(data=None, size=0, error=e)
+            out_q.put(item, item.size)
+
+    def _write(self, in_q: BoundedQueue, out_q: BoundedQueue) -> None:
+        items = self._iter_queue(in_q)
+        for batch in batched(items, self._batch_size, self._batch_bytes, lambda i: i.size):
+            try:
+                with Timer(metric="write", items=len(batch), nbytes=sum(i.size for i in batch)):
+                    results = list(self._write_batch(batch))
+            except Exception as e:
+                results = [item._replace(error=item.error or e) for item in batch]
+            for item in results:
+                out_q.put(item, item.size)
+
+    def _write_async(self, in_q: BoundedQueue, out_q: BoundedQueue) -> None:
+        run_async(self._awrite(in_q, out_q))
+
+    async def _awrite(self, in_q: BoundedQueue, out_q: BoundedQueue) -> None:
+        items = self._iter_queue(in_q)
+        batches = batched(items, self._batch_size, self._batch_bytes, lambda i: i.size)
+        async for results in bounded_map(self._awrite_batch, batches, self._writers):
+            for item in results:
+                out_q.put(item, item.size)
+
+    async def _awrite_batch(self, batch: List[LoadItem]) -> List[LoadItem]:
+        try:
+            with Timer(metric="write", items=len(batch), nbytes=sum(i.size for i in batch)):
+                return await self._write_batch(batch)
+        except Exception as e:
+            return [item._replace(error=item.error or e) for item in batch]
+
+
+def pipeline_options(func):
+    """
+    The decorator function to add options tuning the load pipeline
+    to a cli command.
+    """
+    options = [
+        click.option(
+            "--readers",
+            type=click.IntRange(min=1),
+            show_default=True,
+            default=PIPELINE_READERS,
+            help="Number of threads reading files.",
+        ),
+        click.option(
+            "--transformers",
+            type=click.IntRange(min=1),
+            show_default=True,
+            default=PIPELINE_TRANSFORMERS,
+            help="Number of threads transforming files into documents.",
+        ),
+        click.option(
+            "--writers",
+            type=click.IntRange(min=1),
+            show_default=True,
+            default=PIPELINE_WRITERS,
+            help="Number of threads writing into database (batches in flight with --aio).",
+        ),
+        click.option(
+            "--workers",
+            type=click.IntRange(min=0),
+            show_default=True,
+            default=PIPELINE_WORKERS,
+            help="Number of processes transforming files into documents, 0 to use threads.",
+        ),
+        click.option(
+            "--queue-size",
+            type=click.IntRange(min=1),
+            show_default=True,
+            default=PIPELINE_QUEUE_SIZE,
+            help="Maximal number of items waiting between pipeline stages.",
+        ),
+        click.option(
+            "--queue-bytes",
+            type=click.IntRange(min=1),
+            show_default=True,
+            default=PIPELINE_QUEUE_BYTES,
+            help="Maximal size in bytes of items waiting between pipeline stages.",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+PIPELINE_OPTIONS = ["readers", "transformers", "writers", "workers", "queue_size", "queue_bytes"]
+
+__all__ = ["BoundedQueue", "Pipeline", "PIPELINE_OPTIONS", "pipeline_options"]
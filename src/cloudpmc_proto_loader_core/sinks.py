@@ -0,0 +1,343 @@
+import abc
+import base64
+import io
+import json
+import re
+import sys
+import tarfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from typing import IO, Any, Dict, Optional
+
+import click
+
+from . import zstd
+from .helpers import lazy_import
+from .logger import logger
+from .timing import Progress, Timer
+
+cloudpathlib = lazy_import("cloudpathlib")
+
+SINK_FORMATS = ["files", "ndjson", "shards", "tar"]
+
+# number of threads writing json files of "files" format
+SINK_WRITERS = 8
+
+# maximal number of documents waiting to be written
+SINK_QUEUE_SIZE = 1000
+
+# number of documents of a shard of "shards" format
+SINK_SHARD_DOCS = 100000
+
+
+class Sink(abc.ABC):
+    """
+    Output of documents found by get, query and mquery commands. Documents
+    are encoded and written by `writers` background threads, up to
+    `queue_size` of them wait to be written, so that fetching documents
+    does not wait for the disk unless writers fall behind. An error of
+    a writer is raised by the following write() or by close(). Compressed
+    output is written with zstd `level`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        writers: int = 1,
+        queue_size: int = SINK_QUEUE_SIZE,
+        level: int = zstd.ZSTD_LEVEL,
+    ):
+        self._level = level
+        self._pool = ThreadPoolExecutor(writers, thread_name_prefix="sink")
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._error: Optional[BaseException] = None
+        self._stack = ExitStack()
+        self.progress = Progress(f"{name}: written")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def write(self, doc_id: str, doc_dict: Dict[str, Any]) -> None:
+        self._raise_error()
+        self._slots.acquire()
+        future = self._pool.submit(self._write_doc, doc_id, doc_dict)
+        future.add_done_callback(self._written)
+
+    def close(self) -> None:
+        self._pool.shutdown()
+        self._stack.close()
+        self._raise_error()
+        self.progress.done()
+
+    def _write_doc(self, doc_id: str, doc_dict: Dict[str, Any]) -> None:
+        with Timer(metric="output") as timer:
+            timer.nbytes = self._write(doc_id, doc_dict)
+        self.progress.add(1, timer.nbytes)
+
+    @abc.abstractmethod
+    def _write(self, doc_id: str, doc_dict: Dict[str, Any]) -> int:
+        """
+        Write the document, return the number of written bytes.
+        """
+
+    def _written(self, future: Future) -> None:
+        self._slots.release()
+        if future.exception() is not None and self._error is None:
+            self._error = future.exception()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _open(self, output: str, compress: bool) -> IO[bytes]:
+        # "-" is stdout, it is flushed on close() but left open
+        if output == "-":
+            fd = sys.stdout.buffer
+            self._stack.callback(fd.flush)
+        else:
+            fd = self._stack.enter_context(cloudpathlib.AnyPath(output).open("wb"))
+        if compress:
+            fd = self._stack.enter_context(zstd.stream_writer(fd, False, self._level))
+        return fd
+
+
+class FilesSink(Sink):
+    """
+    Documents are written into `dst` folder, a json file per document.
+    """
+
+    def __init__(self, name: str, dst: "cloudpathlib.AnyPath", writers: int = SINK_WRITERS):
+        super().__init__(name, writers)
+        self._dst = dst
+        self._dst.mkdir(parents=True, exist_ok=True)
+
+    def _write(self, doc_id: str, doc_dict: Dict[str, Any]) -> int:
+        json_path = self._dst / f"{doc_id}.json"
+        data = json.dumps(
+            doc_dict, ensure_ascii=False, indent=4, sort_keys=True, default=_json_default
+        ).encode()
+        json_path.write_bytes(data)
+        logger.debug(f"document with doc_id={doc_id} was written into {json_path} file.")
+        return len(data)
+
+
+class NdjsonSink(Sink):
+    """
+    Documents are written into `output` file (stdout if "-") as compact
+    NDJSON, a document with its `_id` per line.
+    """
+
+    def __init__(
+        self, name: str, output: str, compress: bool = False, level: int = zstd.ZSTD_LEVEL
+    ):
+        super().__init__(name, level=level)
+        self._fd = self._open(output, compress)
+
+    def _write(self, doc_id: str, doc_dict: Dict[str, Any]) -> int:
+        line = _ndjson_line(doc_id, doc_dict)
+        self._fd.write(line)
+        return len(line)
+
+
+class ShardedSink(Sink):
+    """
+    Documents are written into `dst` folder as NDJSON files (shards) of
+    `shard_docs` documents, "<prefix>-00000.ndjson[.zst]" and so on.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dst: "cloudpathlib.AnyPath",
+        prefix: str,
+        shard_docs: int = SINK_SHARD_DOCS,
+        compress: bool = False,
+        level: int = zstd.ZSTD_LEVEL,
+    ):
+        super().__init__(name, level=level)
+        self._dst = dst
+        self._dst.mkdir(parents=True, exist_ok=True)
+        self._prefix = re.sub(r"[^\w.-]", "_", prefix)
+        self._shard_docs = shard_docs
+        self._compress = compress
+        self._shards = 0
+        self._docs = 0
+        self._shard: Optional[ExitStack] = None
+        self._stack.callback(self._close_shard)
+
+    def _write(self, doc_id: str, doc_dict: Dict[str, Any]) -> int:
+        if self._shard is None or self._docs >= self._shard_docs:
+            self._open_shard()
+        line = _ndjson_line(doc_id, doc_dict)
+        self._fd.write(line)
+        self._docs += 1
+        return len(line)
+
+    def _open_shard(self) -> None:
+        self._close_shard()
+        suffix = ".ndjson.zst" if self._compress else ".ndjson"
+        self._path = self._dst / f"{self._prefix}-{self._shards:05d}{suffix}"
+        self._shard = ExitStack()
+        self._fd = self._shard.enter_context(self._path.open("wb"))
+        if self._compress:
+            self._fd = self._shard.enter_context(zstd.stream_writer(self._fd, False, self._level))
+        self._shards += 1
+        self._docs = 0
+
+    def _close_shard(self) -> None:
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+            logger.info(f"{self._docs} document(s) were written into {self._path} file.")
+
+
+class TarSink(Sink):
+    """
+    Documents are written into `output` tar archive (stdout if "-"),
+    a "<doc_id>.json" member per document.
+    """
+
+    def __init__(
+        self, name: str, output: str, compress: bool = False, level: int = zstd.ZSTD_LEVEL
+    ):
+        super().__init__(name, level=level)
+        fd = self._open(output, compress)
+        self._tar = self._stack.enter_context(tarfile.open(fileobj=fd, mode="w|"))
+
+    def _write(self, doc_id: str, doc_dict: Dict[str, Any]) -> int:
+        data = json.dumps(
+            doc_dict, ensure_ascii=False, sort_keys=True, default=_json_default
+        ).encode()
+        info = tarfile.TarInfo(f"{doc_id}.json")
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+        return len(data)
+
+
+def open_sink(
+    name: str,
+    fmt: str = "files",
+    dst: str = "/tmp",
+    output: str = "-",
+    compress: bool = False,
+    shard_docs: int = SINK_SHARD_DOCS,
+    writers: int = SINK_WRITERS,
+    level: int = zstd.ZSTD_LEVEL,
+) -> Sink:
+    """
+    Open a sink of `fmt` format (see SINK_FORMATS) for documents of `name`
+    collection (or index), compressed with zstd `level` when `compress`,
+    see sink_options() for the other arguments.
+    """
+    if fmt == "files":
+        if compress:
+            raise ValueError("--zstd option is not supported by files format.")
+        return FilesSink(name, cloudpathlib.AnyPath(dst), writers)
+    elif fmt == "ndjson":
+        return NdjsonSink(name, output, compress, level)
+    elif fmt == "shards":
+        return ShardedSink(name, cloudpathlib.AnyPath(dst), name, shard_docs, compress, level)
+    elif fmt == "tar":
+        return TarSink(name, output, compress, level)
+    raise ValueError(f"Unknown output format {fmt}, the following are supported {SINK_FORMATS}")
+
+
+def sink_options(func):
+    """
+    The decorator function to add output options to a cli command.
+    """
+    options = [
+        click.option(
+            "--format",
+            "fmt",
+            type=click.Choice(SINK_FORMATS),
+            show_default=True,
+            default="files",
+            help=(
+                "Output format: a json file per document (files), NDJSON file (ndjson), "
+                "NDJSON files of --shard-docs documents (shards) or tar archive (tar)."
+            ),
+        ),
+        click.option(
+            "--dst",
+            "-t",
+            type=str,
+            help="Destination folder (local or gs://) for files and shards formats.",
+            default="/tmp",
+            show_default=True,
+        ),
+        click.option(
+            "--output",
+            "-o",
+            type=str,
+            help='Output file (local or gs://) for ndjson and tar formats, "-" for stdout.',
+            default="-",
+            show_default=True,
+        ),
+        click.option(
+            "--zstd",
+            "compress",
+            is_flag=True,
+            show_default=True,
+            default=False,
+            help="Compress ndjson, shards and tar output with zstd.",
+        ),
+        click.option(
+            "--shard-docs",
+            type=click.IntRange(min=1),
+            show_default=True,
+            default=SINK_SHARD_DOCS,
+            help="Number of documents of a shard of shards format.",
+        ),
+        click.option(
+            "--writers",
+            type=click.IntRange(min=1),
+            show_default=True,
+            default=SINK_WRITERS,
+            help="Number of threads writing json files of files format.",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def _ndjson_line(doc_id: str, doc_dict: Dict[str, Any]) -> bytes:
+    line = json.dumps(
+        {"_id": doc_id, **doc_dict},
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=_json_default,
+    )
+    return line.encode() + b"\n"
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (bytes, bytearray)):
+        return base64.b64encode(v).decode("ascii")
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return str(v)
+
+
+SINK_OPTIONS = ["fmt", "dst", "output", "compress", "shard_docs", "writers"]
+
+__all__ = [
+    "FilesSink",
+    "NdjsonSink",
+    "ShardedSink",
+    "Sink",
+    "SINK_FORMATS",
+    "SINK_OPTIONS",
+    "TarSink",
+    "open_sink",
+    "sink_options",
+]
@@ -0,0 +1,315 @@
+import gzip
+import os
+import sys
+import tarfile
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from typing import IO, Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+from . import zstd
+from .helpers import LoadItem, lazy_import
+from .logger import logger
+
+# cloudpathlib imports the clients of cloud storages, it is imported on first use
+cloudpathlib = lazy_import("cloudpathlib")
+
+# suffixes of files holding many documents, one JSON document per line
+RECORDS_SUFFIXES = [".ndjson", ".jsonl"]
+
+# suffixes of files holding documents
+DOCUMENT_SUFFIXES = [".json"] + RECORDS_SUFFIXES
+
+# suffixes of tar archives, with files holding documents as their members
+ARCHIVE_SUFFIXES = [".tar", ".tgz", ".tzst"]
+
+# suffixes of compressed files and archives, decompressed on the fly
+GZIP_SUFFIXES = [".gz", ".tgz"]
+ZSTD_SUFFIXES = [".zst", ".tzst"]
+
+# suffixes of files picked up when a directory or a cloud storage prefix is expanded
+SOURCE_SUFFIXES = [
+    suffix + compression
+    for suffix in DOCUMENT_SUFFIXES + [".tar"]
+    for compression in ["", ".gz", ".zst"]
+] + [".tgz", ".tzst"]
+
+
+def _strip_compression(name: str) -> str:
+    for suffix in [".gz", ".zst"]:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+class SourceRecord(NamedTuple):
+    """
+    A document at `line` of a file holding one document per line.
+    """
+
+    path: Any
+    line: int
+
+    def __str__(self) -> str:
+        return f"{self.path}#{self.line}"
+
+    @property
+    def stem(self) -> str:
+        # a record is identified by its `_id` field only
+        return ""
+
+
+class SourceMember(NamedTuple):
+    """
+    A file `name` inside of a tar archive at `path`.
+    """
+
+    path: Any
+    name: str
+
+    def __str__(self) -> str:
+        return f"{self.path}/{self.name}"
+
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.name).stem
+
+
+def source_stem(source: Any) -> str:
+    """
+    Return stem of the file name of `source` with no compression suffix,
+    it is used as document id, when a document has none.
+    """
+    if isinstance(source, (SourceRecord, SourceMember)):
+        return source.stem
+    return PurePosixPath(_strip_compression(source.name)).stem
+
+
+def source_file(source: Any) -> Any:
+    """
+    Return path of the file (or of the archive) `source` comes from.
+    """
+    while isinstance(source, (SourceRecord, SourceMember)):
+        source = source.path
+    return source
+
+
+def _walk_local(path: str) -> Iterator[str]:
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield from _walk_local(entry.path)
+            else:
+                yield entry.path
+
+
+_STORAGE_CLIENT = None
+
+
+def _storage_client():
+    """
+    Cloud Storage client listing and reading gs:// sources, the one of
+    cloudpathlib lists a whole "directory" before it returns and downloads
+    a file into its local cache before it is opened.
+    """
+    global _STORAGE_CLIENT
+    if _STORAGE_CLIENT is None:
+        from google.cloud import storage
+
+        _STORAGE_CLIENT = storage.Client()
+    return _STORAGE_CLIENT
+
+
+def _reset_storage_client() -> None:
+    global _STORAGE_CLIENT
+    _STORAGE_CLIENT = None
+
+
+# a client created before fork is not usable in the child process
+os.register_at_fork(after_in_child=_reset_storage_client)
+
+
+def _walk_gs(path: "cloudpathlib.GSPath") -> Iterator["cloudpathlib.GSPath"]:
+    # blobs are listed page by page as they are consumed
+    prefix = f"{path.blob.rstrip('/')}/" if path.blob else None
+    for blob in _storage_client().list_blobs(path.bucket, prefix=prefix):
+        if not blob.name.endswith("/"):
+            yield cloudpathlib.GSPath(f"gs://{path.bucket}/{blob.name}", client=path.client)
+
+
+def _walk(path: "cloudpathlib.AnyPath") -> Iterator["cloudpathlib.AnyPath"]:
+    if isinstance(path, cloudpathlib.GSPath):
+        yield from _walk_gs(path)
+    elif isinstance(path, cloudpathlib.CloudPath):
+        yield from (child for child in path.rglob("*") if child.is_file())
+    else:
+        for child in _walk_local(str(path)):
+            yield cloudpathlib.AnyPath(child)
+
+
+def is_source(path: "cloudpathlib.AnyPath") -> bool:
+    return any(str(path).endswith(suffix) for suffix in SOURCE_SUFFIXES)
+
+
+def is_records(path: Any) -> bool:
+    name = _strip_compression(str(path))
+    return any(name.endswith(suffix) for suffix in RECORDS_SUFFIXES)
+
+
+def is_archive(path: Any) -> bool:
+    name = _strip_compression(str(path))
+    return any(name.endswith(suffix) for suffix in ARCHIVE_SUFFIXES)
+
+
+def open_binary(path: "cloudpathlib.AnyPath") -> IO[bytes]:
+    """
+    Open `path` for reading in binary mode, cloud storage objects are
+    streamed instead of being downloaded into the local cache first.
+    """
+    if isinstance(path, cloudpathlib.GSPath):
+        return _storage_client().bucket(path.bucket).blob(path.blob).open("rb")
+    return path.open("rb")
+
+
+@contextmanager
+def open_decompressed(path: "cloudpathlib.AnyPath") -> Iterator[IO[bytes]]:
+    """
+    Open `path` for reading in binary mode, decompressing gzip and zstd
+    compressed files on the fly.
+    """
+    name = str(path)
+    with open_binary(path) as fd:
+        if any(name.endswith(suffix) for suffix in GZIP_SUFFIXES):
+            with gzip.GzipFile(fileobj=fd) as gz_fd:
+                yield gz_fd
+        elif any(name.endswith(suffix) for suffix in ZSTD_SUFFIXES):
+            with zstd.stream_reader(fd) as zstd_fd:
+                yield zstd_fd
+        else:
+            yield fd
+
+
+def _read_stream(
+    source: Any, fd: IO[bytes], skip: Optional[Callable[[Any], bool]]
+) -> Iterator[LoadItem]:
+    if not is_records(source):
+        if skip is None or not skip(source):
+            data = fd.read()
+            yield LoadItem(source, data=data, size=len(data))
+        return
+
+    for line_no, line in enumerate(fd, 1):
+        if not line.strip():
+            continue
+        record = SourceRecord(source, line_no)
+        if skip is not None and skip(record):
+            continue
+        yield LoadItem(record, data=line, size=len(line))
+
+
+def _read_archive(
+    path: "cloudpathlib.AnyPath", fd: IO[bytes], skip: Optional[Callable[[Any], bool]]
+) -> Iterator[LoadItem]:
+    # archive is read as a stream, members are never extracted on disk
+    with tarfile.open(fileobj=fd, mode="r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            if not any(member.name.endswith(suffix) for suffix in DOCUMENT_SUFFIXES):
+                logger.debug(f"skipping {path}/{member.name}")
+                continue
+            with tar.extractfile(member) as member_fd:
+                yield from _read_stream(SourceMember(path, member.name), member_fd, skip)
+
+
+def read_source(
+    item: LoadItem, skip: Optional[Callable[[Any], bool]] = None
+) -> Iterator[LoadItem]:
+    """
+    Read raw content of the file referred by `item.source`. Compressed
+    files are decompressed, tar archives and files with one document per
+    line are streamed member by member and line by line, an item is
+    yielded for each of their documents not skipped according to `skip`.
+    """
+    logger.info(f"processing file - {item.source}")
+    path = item.source
+    with open_decompressed(path) as fd:
+        if str(path).endswith(".json"):
+            data = fd.read()
+            yield item._replace(data=data, size=len(data))
+        elif is_archive(path):
+            yield from _read_archive(path, fd, skip)
+        else:
+            # the file itself is not to be skipped, it was checked before reading
+            yield from _read_stream(path, fd, skip if is_records(path) else None)
+
+
+def expand_source(source: str) -> Iterator["cloudpathlib.AnyPath"]:
+    """
+    Yield `source` path, or all files with one of SOURCE_SUFFIXES found
+    under it when `source` is a directory or a cloud storage prefix.
+    """
+    path = cloudpathlib.AnyPath(source)
+    # avoid a round trip to cloud storage for every single file
+    if source.endswith("/") or (not is_source(path) and path.is_dir()):
+        logger.debug(f"expanding {source}")
+        for child in _walk(path):
+            if is_source(child):
+                yield child
+    else:
+        yield path
+
+
+def iter_manifest(manifest: str) -> Iterator[str]:
+    """
+    Yield paths listed one per line in `manifest` file or in stdin for "-",
+    empty lines and lines starting with "#" are skipped.
+    """
+    if manifest == "-":
+        yield from _iter_lines(sys.stdin)
+    else:
+        with cloudpathlib.AnyPath(manifest).open() as lines:
+            yield from _iter_lines(lines)
+
+
+def _iter_lines(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def iter_sources(
+    json_files: Iterable[str], manifest: Optional[str] = None
+) -> Iterator["cloudpathlib.AnyPath"]:
+    """
+    Lazily yield paths of files to be loaded: `json_files` followed by
+    paths listed in `manifest`, directories and cloud storage prefixes
+    are expanded into files they contain.
+    """
+    for json_file in json_files:
+        yield from expand_source(json_file)
+
+    if manifest:
+        for json_file in iter_manifest(manifest):
+            yield from expand_source(json_file)
+
+
+__all__ = [
+    "ARCHIVE_SUFFIXES",
+    "DOCUMENT_SUFFIXES",
+    "RECORDS_SUFFIXES",
+    "SOURCE_SUFFIXES",
+    "SourceMember",
+    "SourceRecord",
+    "expand_source",
+    "is_archive",
+    "is_records",
+    "is_source",
+    "iter_manifest",
+    "iter_sources",
+    "open_binary",
+    "open_decompressed",
+    "read_source",
+    "source_file",
+    "source_stem",
+]
@@ -0,0 +1,339 @@
+import inspect
+import json
+import reprlib
+import threading
+import timeit
+from bisect import bisect_left
+from contextlib import ContextDecorator
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .logger import logger
+from .tracing import tracer
+
+# upper bounds (seconds) of latency histogram buckets, growing by 2**(1/4)
+# from 1 microsecond up to about 4 minutes
+METRICS_BUCKETS = [1e-6 * 2 ** (i / 4) for i in range(112)]
+
+METRICS_PERCENTILES = [0.5, 0.95, 0.99]
+
+# prefix of metric names in Prometheus textfile format
+METRICS_PREFIX = "cloudpmc_loader"
+
+
+class _OpMetrics:
+    """
+    Counters and latency histogram of an operation.
+    """
+
+    __slots__ = ["calls", "items", "bytes", "seconds", "buckets"]
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(METRICS_BUCKETS) + 1)
+
+    def observe(self, seconds: float, items: int, nbytes: int) -> None:
+        self.calls += 1
+        self.items += items
+        self.bytes += nbytes
+        self.seconds += seconds
+        self.buckets[bisect_left(METRICS_BUCKETS, seconds)] += 1
+
+    def percentile(self, q: float) -> float:
+        # the upper bound of the bucket holding the percentile (at most
+        # 19% above the exact value)
+        rank, seen = q * self.calls, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return METRICS_BUCKETS[min(i, len(METRICS_BUCKETS) - 1)]
+        return 0.0
+
+
+class Metrics:
+    """
+    Registry of per-operation metrics (read, parse, transform, compress,
+    write, ...) recorded by Timer(metric=...): number of calls, of items and
+    of bytes, total time and latency histogram of every operation.
+
+    Metrics are disabled by default, nothing is recorded then. Worker
+    processes of the load pipeline do not record metrics, the transform
+    stage is measured by the parent process only.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._ops: Dict[str, _OpMetrics] = {}
+        self._starts = timeit.default_timer()
+
+    def enable(self) -> None:
+        with self._lock:
+            self._ops = {}
+            self._starts = timeit.default_timer()
+            self.enabled = True
+
+    def observe(self, op: str, seconds: float, items: int = 1, nbytes: int = 0) -> None:
+        with self._lock:
+            metrics = self._ops.get(op)
+            if metrics is None:
+                metrics = self._ops[op] = _OpMetrics()
+            metrics.observe(seconds, items, nbytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return metrics of all operations, rates are per second of the run.
+        """
+        with self._lock:
+            elapsed = timeit.default_timer() - self._starts
+            ops = {}
+            for op, m in sorted(self._ops.items()):
+                ops[op] = {
+                    "calls": m.calls,
+                    "items": m.items,
+                    "bytes": m.bytes,
+                    "seconds": m.seconds,
+                    "items_per_second": m.items / elapsed if elapsed > 0 else 0.0,
+                    "bytes_per_second": m.bytes / elapsed if elapsed > 0 else 0.0,
+                }
+                for q in METRICS_PERCENTILES:
+                    ops[op][f"p{q * 100:g}"] = m.percentile(q)
+            return {"elapsed": elapsed, "ops": ops}
+
+    def log_summary(self) -> None:
+        snapshot = self.snapshot()
+        logger.info(f"metrics of {snapshot['elapsed']:.3f} sec run:")
+        for op, m in snapshot["ops"].items():
+            rate = f"{m['items_per_second']:.0f} items/s"
+            if m["bytes"]:
+                rate += f", {m['bytes_per_second'] / 2**20:.1f} MiB/s"
+            latency = " ".join(
+                f"p{q * 100:g}={m[f'p{q * 100:g}'] * 1000:.3f}ms" for q in METRICS_PERCENTILES
+            )
+            logger.info(
+                f"{op}: {m['calls']} call(s), {m['items']} item(s), "
+                f"{m['seconds']:.3f} sec ({rate}), {latency}"
+            )
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self) -> str:
+        """
+        Return metrics in Prometheus text format (for node exporter textfile
+        collector), histogram buckets are reported at powers of 2 seconds.
+        """
+        with self._lock:
+            ops = sorted(
+                (op, m.calls, m.items, m.bytes, m.seconds, list(m.buckets))
+                for op, m in self._ops.items()
+            )
+
+        name = f"{METRICS_PREFIX}_op_seconds"
+        lines = [f"# HELP {name} Latency of operations.", f"# TYPE {name} histogram"]
+        for op, calls, _, _, seconds, buckets in ops:
+            seen = 0
+            for i, n in enumerate(buckets[:-1]):
+                seen += n
+                if i % 4 == 0:
+                    lines.append(f'{name}_bucket{{op="{op}",le="{METRICS_BUCKETS[i]:g}"}} {seen}')
+            lines.append(f'{name}_bucket{{op="{op}",le="+Inf"}} {calls}')
+            lines.append(f'{name}_sum{{op="{op}"}} {seconds}')
+            lines.append(f'{name}_count{{op="{op}"}} {calls}')
+        for counter, index, description in [
+            ("items", 2, "Items processed by operations."),
+            ("bytes", 3, "Bytes processed by operations."),
+        ]:
+            name = f"{METRICS_PREFIX}_op_{counter}_total"
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{op="{op[0]}"}} {op[index]}' for op in ops]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """
+        Write metrics into `path` file, in Prometheus text format if its
+        suffix is .prom, as JSON otherwise.
+        """
+        path = Path(path)
+        text = self.to_prometheus() if path.suffix == ".prom" else self.to_json()
+        # written aside and renamed, so that a collector never reads a partial file
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(text)
+        tmp_path.replace(path)
+        logger.info(f"metrics were written into {path} file.")
+
+    def report(self, path: Optional[str] = None) -> None:
+        """
+        Log the summary of metrics and write them into `path`, if given.
+        """
+        if self.enabled:
+            self.log_summary()
+            if path:
+                self.write(path)
+
+
+metrics = Metrics()
+
+
+class Timer(ContextDecorator):
+    """
+    Measure time of a block (or of every call of the decorated function),
+    log it at debug level and record it as `metric` operation of `items`
+    items and `nbytes` bytes (they may be set on the timer in the block),
+    when metrics are enabled, and as a span with `args`, when tracing is
+    enabled. A timer without a name is not logged. Arguments of a decorated
+    function are formatted only when the line is logged.
+    """
+
+    def __init__(
+        self,
+        name=None,
+        metric: Optional[str] = None,
+        items: int = 1,
+        nbytes: int = 0,
+        args: Optional[Dict[str, Any]] = None,
+    ):
+        self._name = name or ""
+        self._metric = metric
+        self._args = args
+        self._starts = None
+        self.items = items
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self._starts = timeit.default_timer()
+        return self
+
+    def __exit__(self, *args):
+        if self._name or metrics.enabled or tracer.enabled:
+            signature = self._name and (lambda: self._name)
+            self._record(self._starts, self._name, signature, self.items, self.nbytes)
+        return False
+
+    def __call__(self, func):
+        # decorated calls may run in many threads at once, they keep their
+        # state in locals of _decorated()
+        name = self._name or func.__name__ or ""
+        defaults = _default_args(func)
+
+        @wraps(func)
+        def _decorated(*args, **kwds):
+            starts = timeit.default_timer()
+            try:
+                return func(*args, **kwds)
+            finally:
+                self._record(starts, name, lambda: _signature(name, defaults, args, kwds), 1, 0)
+
+        return _decorated
+
+    def _record(
+        self,
+        starts: float,
+        name: str,
+        signature: Optional[Callable[[], str]],
+        items: int,
+        nbytes: int,
+    ) -> None:
+        ends = timeit.default_timer()
+        elapsed = ends - starts
+        if self._metric is not None and metrics.enabled:
+            metrics.observe(self._metric, elapsed, items, nbytes)
+        if tracer.enabled:
+            args = self._args
+            if items != 1 or nbytes:
+                args = dict(args or {}, items=items, bytes=nbytes)
+            tracer.complete(name or self._metric, starts, ends, self._metric or "", args)
+        if signature:
+            logger.opt(lazy=True).debug(
+                "{} completes in {} sec", signature, lambda: f"{elapsed:.6f}"
+            )
+
+
+def timed_iter(
+    iterable: Iterable[Any], metric: str, size: Optional[Callable[[Any], int]] = None
+) -> Iterator[Any]:
+    """
+    Yield items of `iterable`, the time spent on producing every item is
+    recorded as `metric` operation (with `size` of the item in bytes) and
+    as a span.
+    """
+    if not metrics.enabled and not tracer.enabled:
+        yield from iterable
+        return
+
+    iterator = iter(iterable)
+    while True:
+        starts = timeit.default_timer()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        ends = timeit.default_timer()
+        nbytes = size(item) if size else 0
+        if metrics.enabled:
+            metrics.observe(metric, ends - starts, 1, nbytes)
+        if tracer.enabled:
+            tracer.complete(metric, starts, ends, metric, {"bytes": nbytes} if nbytes else None)
+        yield item
+
+
+def _default_args(func) -> Dict[str, Any]:
+    signature = inspect.signature(func)
+    return {
+        k: v.default
+        for k, v in signature.parameters.items()
+        if v.default is not inspect.Parameter.empty
+    }
+
+
+def _signature(name: str, defaults: Dict[str, Any], args: tuple, kwds: Dict[str, Any]) -> str:
+    arguments: List[str] = [reprlib.repr(v) for v in args]
+    arguments += [f"{k}={reprlib.repr(v)}" for k, v in {**defaults, **kwds}.items()]
+    return f"{name}({', '.join(arguments)})"
+
+
+class Progress:
+    """
+    Thread-safe counter of processed items (documents, keys, ...) and
+    optionally of their bytes, which logs their number and rate every
+    `every` items and on done().
+    """
+
+    def __init__(self, name: str, unit: str = "docs", every: int = 10000):
+        self._name = name
+        self._unit = unit
+        self._every = max(1, every)
+        self._lock = threading.Lock()
+        self._starts = timeit.default_timer()
+        self._reported = 0
+        self.count = 0
+        self.bytes = 0
+
+    def add(self, n: int = 1, nbytes: int = 0) -> None:
+        with self._lock:
+            self.count += n
+            self.bytes += nbytes
+            if self.count - self._reported >= self._every:
+                self._reported = self.count
+                self._log()
+
+    def done(self) -> int:
+        with self._lock:
+            self._log()
+            return self.count
+
+    @property
+    def rate(self) -> float:
+        elapsed = timeit.default_timer() - self._starts
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def _log(self) -> None:
+        elapsed = timeit.default_timer() - self._starts
+        rate = f"{self.rate:.0f} {self._unit}/s"
+        if self.bytes:
+            rate += f", {self.bytes / 2**20 / elapsed if elapsed > 0 else 0.0:.1f} MiB/s"
+        logger.info(f"{self._name} {self.count} {self._unit} ({rate})")
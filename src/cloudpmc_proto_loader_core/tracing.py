@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import timeit
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .logger import logger
+
+# maximal number of recorded trace events, later ones are dropped
+TRACE_MAX_EVENTS = 2_000_000
+
+
+class Tracer:
+    """
+    Recorder of spans (Chrome trace "complete" events) of all threads of
+    the process, written as a trace file viewable with chrome://tracing or
+    https://ui.perfetto.dev. Timestamps are relative to `origin` (a value
+    of timeit.default_timer(), which is the same clock in all processes),
+    so that spans recorded by worker processes line up with the ones of
+    the parent process.
+
+    Tracing is disabled by default, nothing is recorded then.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.origin = 0.0
+        self.dropped = 0
+        self._events: List[Dict[str, Any]] = []
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def enable(self, origin: Optional[float] = None, process_name: str = "main") -> None:
+        with self._lock:
+            self.origin = timeit.default_timer() if origin is None else origin
+            self.dropped = 0
+            self._events = []
+            self._threads = set()
+            self._metadata("process_name", process_name, tid=0)
+            self.enabled = True
+
+    def complete(
+        self,
+        name: str,
+        starts: float,
+        ends: float,
+        cat: str = "",
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Record a span of the current thread from `starts` to `ends`.
+        """
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            with self._lock:
+                self._threads.add(tid)
+                self._metadata("thread_name", threading.current_thread().name, tid)
+        if len(self._events) >= TRACE_MAX_EVENTS:
+            self.dropped += 1
+            return
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (starts - self.origin) * 1e6,
+            "dur": (ends - starts) * 1e6,
+            "pid": os.getpid(),
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        self._events.append(event)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def extend(self, events: List[Dict[str, Any]]) -> None:
+        """
+        Add `events` recorded by another process.
+        """
+        self._events.extend(events[: max(0, TRACE_MAX_EVENTS - len(self._events))])
+
+    def write(self, path: str) -> None:
+        events = self.drain()
+        with open(path, "w", encoding="utf-8") as fd:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fd, default=str)
+        logger.info(f"{len(events)} trace event(s) were written into {path} file.")
+        if self.dropped:
+            logger.warning(f"{self.dropped} trace event(s) over {TRACE_MAX_EVENTS} were dropped.")
+
+    def _metadata(self, name: str, value: str, tid: int) -> None:
+        self._events.append(
+            {"name": name, "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": value}}
+        )
+
+
+tracer = Tracer()
+
+
+def traced(func: Callable) -> Callable:
+    """
+    The decorator function to record calls of `func` as spans, when
+    tracing is enabled.
+    """
+    name = func.__qualname__
+
+    @wraps(func)
+    def _traced(*args, **kwds):
+        if not tracer.enabled:
+            return func(*args, **kwds)
+        starts = timeit.default_timer()
+        try:
+            return func(*args, **kwds)
+        finally:
+            tracer.complete(name, starts, timeit.default_timer(), func.__module__)
+
+    return _traced
+
+
+def init_process(origin: Optional[float]) -> None:
+    """
+    Enable tracing in a worker process, if `origin` of the parent tracer
+    is given.
+    """
+    if origin is not None:
+        tracer.enable(origin, f"worker-{os.getpid()}")
+
+
+def call_traced(func: Callable, *args) -> Tuple[Any, List[Dict[str, Any]]]:
+    """
+    Call `func` (in a worker process) and return its result along with
+    the events recorded meanwhile, to be added to the parent tracer.
+    """
+    result = func(*args)
+    return result, tracer.drain()
+
+
+__all__ = ["Tracer", "call_traced", "init_process", "traced", "tracer"]
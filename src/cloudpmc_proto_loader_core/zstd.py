@@ -0,0 +1,204 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import IO, Dict, List, NamedTuple, Optional
+
+import zstandard
+
+from .timing import Timer
+
+# default compression level
+ZSTD_LEVEL = 10
+
+# payloads of this size and larger are compressed by zstd in ZSTD_THREADS
+# threads of its own (the frame format is the same)
+ZSTD_MT_THRESHOLD = 4 * 1024 * 1024
+ZSTD_THREADS = int(os.environ.get("ZSTD_THREADS", os.cpu_count() or 1))
+
+# number of threads of compress_many() and decompress_many()
+ZSTD_BATCH_THREADS = min(4, os.cpu_count() or 1)
+
+# folder with dictionaries ("<dict_id>.zdict" files) documents compressed
+# with dictionaries are decompressed with
+ZSTD_DICT_DIR = os.environ.get("ZSTD_DICT_DIR", os.path.expanduser("~/.cache/cloudpmc/zstd-dicts"))
+
+# default size of trained dictionaries, the one of zstd CLI
+ZSTD_DICT_SIZE = 112640
+
+_lock = threading.Lock()
+_dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+_dictionary_files: Dict[str, zstandard.ZstdCompressionDict] = {}
+
+# compression contexts are not safe to be shared by threads, every thread
+# has contexts of its own, reused by calls made in the thread
+_local = threading.local()
+
+
+class Compression(NamedTuple):
+    """
+    Compression of fields: zstd `level` and the dictionary (a file created
+    with train-dict command) at `dict_path`, if any. It is sent to worker
+    processes along with the transform of documents.
+    """
+
+    level: int = ZSTD_LEVEL
+    dict_path: Optional[str] = None
+
+    @property
+    def dictionary(self) -> Optional[zstandard.ZstdCompressionDict]:
+        return load_dictionary(self.dict_path) if self.dict_path else None
+
+
+def compress(
+    data_in: bytes,
+    dictionary: Optional[zstandard.ZstdCompressionDict] = None,
+    level: int = ZSTD_LEVEL,
+) -> bytes:
+    threads = ZSTD_THREADS if ZSTD_THREADS > 1 and len(data_in) >= ZSTD_MT_THRESHOLD else 0
+    with Timer(metric="compress", nbytes=len(data_in)):
+        return _compressor(level, dictionary, threads).compress(data_in)
+
+
+def decompress(data: bytes, dict_id: Optional[int] = None) -> bytes:
+    """
+    Decompress `data` with the dictionary `dict_id`, if given, or the one
+    recorded in the zstd frame header, if any.
+    """
+    params = zstandard.get_frame_parameters(data)
+    decompressor = _decompressor(params.dict_id if dict_id is None else dict_id)
+    with Timer(metric="decompress", nbytes=len(data)):
+        if params.content_size == zstandard.CONTENTSIZE_UNKNOWN:
+            # frames written by stream writers (older documents) do not record their size
+            return decompressor.decompressobj().decompress(data)
+        return decompressor.decompress(data)
+
+
+def compress_many(
+    buffers: List[bytes],
+    dictionary: Optional[zstandard.ZstdCompressionDict] = None,
+    level: int = ZSTD_LEVEL,
+    threads: int = ZSTD_BATCH_THREADS,
+) -> List[bytes]:
+    """
+    Compress `buffers` in `threads` threads (zstd releases the GIL).
+    """
+    return _map(partial(compress, dictionary=dictionary, level=level), buffers, threads=threads)
+
+
+def decompress_many(
+    buffers: List[bytes],
+    dict_ids: Optional[List[Optional[int]]] = None,
+    threads: int = ZSTD_BATCH_THREADS,
+) -> List[bytes]:
+    """
+    Decompress `buffers` (with dictionaries `dict_ids`, see decompress())
+    in `threads` threads.
+    """
+    return _map(decompress, buffers, dict_ids or [None] * len(buffers), threads=threads)
+
+
+def stream_writer(fd: IO[bytes], closefd: bool = True, level: int = ZSTD_LEVEL) -> IO[bytes]:
+    # a compressor of its own, so that streams may be written by many threads
+    compressor = zstandard.ZstdCompressor(level=level)
+    return compressor.stream_writer(fd, closefd=closefd)
+
+
+def stream_reader(fd: IO[bytes]) -> IO[bytes]:
+    # a decompressor of its own, so that streams may be read by many threads,
+    # buffered to be iterated line by line
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(fd))
+
+
+def read_dictionary(path: str) -> zstandard.ZstdCompressionDict:
+    dictionary = zstandard.ZstdCompressionDict(Path(path).read_bytes())
+    if not dictionary.dict_id():
+        raise ValueError(f"{path} is not a zstd dictionary.")
+    return dictionary
+
+
+def load_dictionary(path: str) -> zstandard.ZstdCompressionDict:
+    """
+    Return the dictionary at `path`, read once per process.
+    """
+    path = str(path)
+    if path not in _dictionary_files:
+        dictionary = read_dictionary(path)
+        with _lock:
+            _dictionaries.setdefault(dictionary.dict_id(), dictionary)
+            _dictionary_files[path] = dictionary
+    return _dictionary_files[path]
+
+
+def get_dictionary(dict_id: int) -> zstandard.ZstdCompressionDict:
+    """
+    Return the dictionary `dict_id` from ZSTD_DICT_DIR folder (or the one
+    loaded or compressed with already).
+    """
+    if dict_id not in _dictionaries:
+        path = Path(ZSTD_DICT_DIR) / f"{dict_id}.zdict"
+        if not path.exists():
+            raise ValueError(f"zstd dictionary {dict_id} is not found in {ZSTD_DICT_DIR}.")
+        dictionary = read_dictionary(path)
+        with _lock:
+            _dictionaries[dict_id] = dictionary
+    return _dictionaries[dict_id]
+
+
+def train_dictionary(
+    samples: List[bytes], dict_size: int = ZSTD_DICT_SIZE, dict_id: int = 0
+) -> zstandard.ZstdCompressionDict:
+    """
+    Train a dictionary of `dict_size` bytes on `samples`, its id (version)
+    is `dict_id` or a random one, if 0.
+    """
+    return zstandard.train_dictionary(
+        dict_size, samples, dict_id=dict_id, level=ZSTD_LEVEL, threads=-1
+    )
+
+
+def save_dictionary(dictionary: zstandard.ZstdCompressionDict, path: Optional[str] = None) -> Path:
+    path = Path(path or Path(ZSTD_DICT_DIR) / f"{dictionary.dict_id()}.zdict")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(dictionary.as_bytes())
+    return path
+
+
+def _map(func, *iterables, threads: int) -> List[bytes]:
+    if threads <= 1 or len(iterables[0]) < 2:
+        return list(map(func, *iterables))
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(func, *iterables))
+
+
+def _compressor(
+    level: int, dictionary: Optional[zstandard.ZstdCompressionDict], threads: int
+) -> zstandard.ZstdCompressor:
+    dict_id = dictionary.dict_id() if dictionary is not None else 0
+    try:
+        compressors = _local.compressors
+    except AttributeError:
+        compressors = _local.compressors = {}
+    key = (level, dict_id, threads)
+    if key not in compressors:
+        if dictionary is not None:
+            # data compressed with a dictionary can be decompressed with it as well
+            with _lock:
+                _dictionaries.setdefault(dict_id, dictionary)
+        compressors[key] = zstandard.ZstdCompressor(
+            level=level, dict_data=dictionary, threads=threads
+        )
+    return compressors[key]
+
+
+def _decompressor(dict_id: int) -> zstandard.ZstdDecompressor:
+    try:
+        decompressors = _local.decompressors
+    except AttributeError:
+        decompressors = _local.decompressors = {}
+    if dict_id not in decompressors:
+        dictionary = get_dictionary(dict_id) if dict_id else None
+        decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return decompressors[dict_id]
@@ -0,0 +1,180 @@
+import base64
+import json
+import random
+from typing import Iterable, List, Optional
+
+import click
+
+from . import zstd
+from .helpers import B64_RE, LoadItem, cli_try_except, lazy_import
+from .logger import logger
+from .sources import iter_sources, read_source
+from .timing import Timer
+
+cloudpathlib = lazy_import("cloudpathlib")
+
+ERROR_TRAIN_DICT = 10
+
+# number of field values sampled to train a dictionary on
+ZSTD_DICT_SAMPLES = 10000
+
+
+def sample_field(
+    sources: Iterable["cloudpathlib.AnyPath"],
+    field: str,
+    samples: int = ZSTD_DICT_SAMPLES,
+    seed=None,
+) -> List[bytes]:
+    """
+    Sample (reservoir sampling) up to `samples` values of `field` of
+    documents read from `sources`, base64 encoded values are decoded.
+    """
+    rnd = random.Random(seed)
+    sampled: List[bytes] = []
+    seen = 0
+    for source in sources:
+        for item in read_source(LoadItem(source)):
+            value = json.loads(item.data).get(field)
+            if not value:
+                continue
+            seen += 1
+            if len(sampled) < samples:
+                sampled.append(value)
+            elif (i := rnd.randrange(seen)) < samples:
+                sampled[i] = value
+
+    return [base64.b64decode(v) if B64_RE.match(v) else v.encode() for v in sampled]
+
+
+def _load_dictionary(click_ctx, param, value: Optional[str]) -> Optional[str]:
+    if value:
+        try:
+            dictionary = zstd.load_dictionary(value)
+        except Exception as e:
+            raise click.BadParameter(str(e), click_ctx, param)
+        logger.info(f"fields are compressed with zstd dictionary {dictionary.dict_id()}.")
+    return value
+
+
+def zstd_options(func):
+    """
+    The decorator function to add zstd compression options to a cli command.
+    """
+    options = [
+        click.option(
+            "--zstd-dict",
+            type=click.Path(exists=True, dir_okay=False),
+            callback=_load_dictionary,
+            help="zstd dictionary (see train-dict command) to compress header_xml with.",
+        ),
+        click.option(
+            "--zstd-level",
+            type=click.IntRange(min=-7, max=22),
+            show_default=True,
+            default=zstd.ZSTD_LEVEL,
+            help="zstd compression level of header_xml.",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def zstd_compression(kwargs) -> zstd.Compression:
+    """
+    Return compression of fields given with zstd_options() of a cli command.
+    """
+    return zstd.Compression(kwargs["zstd_level"], kwargs.get("zstd_dict"))
+
+
+@click.command()
+@click.option(
+    "--manifest",
+    "-m",
+    type=str,
+    help='File with paths of the corpus, one per line, "-" to read them from stdin.',
+)
+@click.option(
+    "--field",
+    "-f",
+    type=str,
+    show_default=True,
+    default="header_xml",
+    help="Field of documents the dictionary is trained for.",
+)
+@click.option(
+    "--samples",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=ZSTD_DICT_SAMPLES,
+    help="Number of documents sampled from the corpus.",
+)
+@click.option(
+    "--dict-size",
+    type=click.IntRange(min=256),
+    show_default=True,
+    default=zstd.ZSTD_DICT_SIZE,
+    help="Size of the dictionary in bytes.",
+)
+@click.option(
+    "--dict-id",
+    type=click.IntRange(min=1, max=2**31 - 1),
+    help="Id (version) of the dictionary, a random one by default.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False),
+    help="Dictionary file, <dict_id>.zdict in ZSTD_DICT_DIR folder by default.",
+)
+@click.argument(
+    "json_files",
+    nargs=-1,
+)
+@click.pass_context
+@cli_try_except(ERROR_TRAIN_DICT)
+def train_dict(click_ctx, *args, **kwargs) -> None:
+    """
+    train zstd dictionary on a corpus of documents.
+
+    SYNOPSIS
+
+    Train zstd dictionary for a field of documents (header_xml by default)
+    on a sample of documents of JSON_FILES (the same sources as of load
+    command). Documents are loaded with the dictionary given with
+    --zstd-dict option of load command, the id (version) of the dictionary
+    is recorded next to the compressed field. Documents are decompressed
+    with dictionaries found in ZSTD_DICT_DIR folder by their id.
+
+    EXAMPLES
+
+    \b
+    $ firestore-loader train-dict --samples 20000 --dict-id 2 dump/
+    $ firestore-loader load --zstd-dict ~/.cache/cloudpmc/zstd-dicts/2.zdict dump/
+    """
+    json_files = kwargs.get("json_files")
+    manifest: Optional[str] = kwargs.get("manifest")
+    if not json_files and not manifest:
+        raise ValueError("JSON_FILES argument(s) or --manifest option is required.")
+
+    with Timer("sample"):
+        samples = sample_field(
+            iter_sources(json_files, manifest), kwargs["field"], kwargs["samples"]
+        )
+    if not samples:
+        raise ValueError(f"No documents with {kwargs['field']} field were found.")
+
+    with Timer("train dictionary"):
+        dictionary = zstd.train_dictionary(
+            samples, kwargs["dict_size"], kwargs.get("dict_id") or 0
+        )
+    path = zstd.save_dictionary(dictionary, kwargs.get("output"))
+
+    ratio = sum(map(len, samples)) / sum(len(zstd.compress(s, dictionary)) for s in samples)
+    logger.info(
+        f"dictionary {dictionary.dict_id()} trained on {len(samples)} sample(s) "
+        f"was written into {path} file, compression ratio of samples is {ratio:.2f}."
+    )
+
+
+__all__ = ["sample_field", "train_dict", "zstd_compression", "zstd_options"]
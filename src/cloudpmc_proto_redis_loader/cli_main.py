@@ -1,17 +1,33 @@
-from pathlib import Path
-from typing import List
+from contextlib import nullcontext
+from itertools import chain
+from typing import AsyncIterator, Iterator, List, Tuple
 
 import click
-from cloudpathlib import AnyPath
 
-from cloudpmc_proto_firestore_loader.helpers import (
+from cloudpmc_proto_loader_core.aio import aio_option, iter_async
+from cloudpmc_proto_loader_core.hash_index import open_hash_index
+from cloudpmc_proto_loader_core.helpers import (
     cli_try_except,
+    lazy_import,
     log_debug_doc_dict,
-    save_json_doc_dict,
 )
-from cloudpmc_proto_firestore_loader.logger import CONFIG, CONFIG_DEBUG, logger
-from cloudpmc_proto_firestore_loader.timing import Timer
-from cloudpmc_proto_redis_loader import redis
+from cloudpmc_proto_loader_core.journal import (
+    Journal,
+    journal_options,
+    select_sources,
+)
+from cloudpmc_proto_loader_core.logger import CONFIG, CONFIG_DEBUG, logger
+from cloudpmc_proto_loader_core.pipeline import PIPELINE_OPTIONS, pipeline_options
+from cloudpmc_proto_loader_core.sinks import SINK_OPTIONS, open_sink, sink_options
+from cloudpmc_proto_loader_core.sources import iter_manifest
+from cloudpmc_proto_loader_core.timing import Timer, metrics
+from cloudpmc_proto_loader_core.tracing import tracer
+from cloudpmc_proto_loader_core.zstd_dict import (
+    train_dict,
+    zstd_compression,
+    zstd_options,
+)
+from cloudpmc_proto_redis_loader import settings
 
 ERROR_NO_DOC = 1
 ERROR_QUERY = 2
@@ -20,6 +36,12 @@ ERROR_LOAD = 3
 ERROR_GET = 5
 ERROR_LOAD_ENCOUNTERED = 6
 ERROR_DELETE = 7
+ERROR_COUNT = 8
+ERROR_REBUILD = 9
+
+
+# the client library is imported by the first command using the database
+redis = lazy_import("cloudpmc_proto_redis_loader.redis")
 
 
 @click.group()
@@ -31,13 +53,41 @@ ERROR_DELETE = 7
     default=False,
     help="Debug this application.",
 )
+@click.option(
+    "--metrics",
+    "report_metrics",
+    is_flag=True,
+    show_default=True,
+    default=False,
+    help="Report throughput and latency percentiles of operations at the end of the run.",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False),
+    help="Write metrics into this file, in Prometheus textfile format if it ends with .prom, "
+    "as JSON otherwise.",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False),
+    help="Record spans of operations of all threads and processes into this file, in Chrome "
+    "trace format (chrome://tracing, https://ui.perfetto.dev).",
+)
 @click.pass_context
-def cli_main(click_ctx, *args, debug=None) -> None:
+def cli_main(
+    click_ctx, *args, debug=None, report_metrics=False, metrics_file=None, trace=None
+) -> None:
     click_ctx.arg_debug = debug
     if debug:
         logger.configure(**CONFIG_DEBUG)
     else:
         logger.configure(**CONFIG)
+    if report_metrics or metrics_file:
+        metrics.enable()
+        click_ctx.call_on_close(lambda: metrics.report(metrics_file))
+    if trace:
+        tracer.enable()
+        click_ctx.call_on_close(lambda: tracer.write(trace))
 
 
 @cli_main.command()
@@ -61,10 +111,49 @@ def cli_main(click_ctx, *args, debug=None) -> None:
     default=False,
     help="Report and skip individual file loading error.",
 )
+@click.option(
+    "--batch-size",
+    "-b",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=1,
+    help="Number of documents sent to RedisJSON in a single round trip.",
+)
+@click.option(
+    "--batch-bytes",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.REDIS_MAX_BATCH_BYTES,
+    help="Maximal estimated size in bytes of documents sent in a single round trip.",
+)
+@click.option(
+    "--manifest",
+    "-m",
+    type=str,
+    help='File with paths to load, one per line, "-" to read them from stdin.',
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    show_default=True,
+    default=False,
+    help="Write only new or changed documents.",
+)
+@click.option(
+    "--hash-index",
+    type=click.Path(dir_okay=False),
+    help=(
+        "Local index (SQLite database) of hashes of loaded documents, "
+        "by default hashes are kept in RedisJSON next to the documents."
+    ),
+)
+@journal_options
+@pipeline_options
+@aio_option
+@zstd_options
 @click.argument(
     "json_files",
     nargs=-1,
-    required=True,
 )
 @click.pass_context
 @cli_try_except(ERROR_LOAD)
@@ -86,6 +175,22 @@ def load(click_ctx, *args, **kwargs) -> None:
 
     Multiple files/paths are allowed in one run.
 
+    Paths may also be listed one per line in a manifest file (local or in
+    the cloud storage) given with --manifest option, or streamed into stdin
+    with "--manifest -". A directory or a cloud storage prefix
+    'gs://ncbi-research-pmc.appspot.com/dump/' is expanded into all files
+    of supported formats (see below) under it. Paths are listed lazily, loading starts right away.
+
+    Files with *.ndjson or *.jsonl suffix hold many documents, one JSON
+    document per line, each one with "_id" and "_collection" fields (unless
+    --doc-id or --collection option is given). They are read line by line,
+    however large they are.
+
+    Files compressed with gzip (*.gz) or zstd (*.zst) are decompressed on
+    the fly. Tar archives (*.tar, *.tar.gz, *.tgz, *.tar.zst, *.tzst) are
+    read as a stream, their *.json, *.ndjson and *.jsonl members are loaded
+    with no extraction on disk.
+
     By default the script picks an id of the document from a "_id" field
     of requested to be loaded json file. If it is not there, the base name
     of the document is used, if you want to force a specific document id
@@ -98,6 +203,34 @@ def load(click_ctx, *args, **kwargs) -> None:
     default, if it is not there or you want to force a document into specific
     collection you can specify one with --collection COLLECTION_VALUE option.
 
+    Files are read by --readers threads, transformed into documents by
+    --transformers threads and written into the database by --writers
+    threads concurrently. Up to --queue-size files (or documents), but no
+    more than --queue-bytes bytes of them, are waiting between these stages.
+    Parsing and transformation of files is CPU bound, use --workers option
+    to run it in a pool of processes on multiple cores.
+
+    With --incremental option only new or changed documents are written.
+    Hashes of documents (after decoding and compression) are compared with
+    the hashes recorded in a Redis hash _hashes:COLLECTION next to the
+    documents, or in a local index given with --hash-index option. The hashes
+    are updated for written documents.
+
+    With --journal option every loaded file is recorded in a local checkpoint
+    journal, as well as every file failed to load. A load interrupted for
+    whatever reason can be resumed later with --resume option, files loaded
+    already are skipped then. Files failed to load can be loaded again on
+    their own with --retry-failed option.
+
+    Documents are written one by one, unless --batch-size option is greater
+    than 1, then up to --batch-size documents (but no more than --batch-bytes
+    bytes of them) are sent with a single JSON.MSET command, if the server
+    supports it, or with a pipeline of JSON.SET commands. Errors are reported
+    for each individual document.
+
+    With --aio option batches are written with an asyncio client by a single
+    thread, up to --writers of them are in flight, e.g. --writers 200.
+
     EXAMPLES
 
     Loading from cloud storage:
@@ -114,28 +247,70 @@ def load(click_ctx, *args, **kwargs) -> None:
     $ redis-loader load --collection "collection_name" \\
         dump/13901.json dump/14901.json ...
 
+    Loading with batches of 500 documents per round trip:
+
+    \b
+    $ redis-loader load --batch-size 500 dump/*.json
+
     """
     collection = kwargs.get("collection")
+    doc_id = kwargs.get("doc_id")
     skip_errors = kwargs.get("skip_errors")
+    journal = Journal(kwargs["journal"]) if kwargs.get("journal") else None
+    json_file_paths = select_sources(
+        journal,
+        kwargs.get("json_files"),
+        kwargs.get("manifest"),
+        kwargs["resume"],
+        kwargs["retry_failed"],
+    )
+
+    backend = redis.adb if kwargs["aio"] else redis.db
+    hash_index = open_hash_index(
+        kwargs["incremental"], kwargs.get("hash_index"), default=backend.hash_index
+    )
 
     errors_encountered = 0
-    for json_file in kwargs.get("json_files"):
-        try:
-            json_file_path = AnyPath(json_file)
-            doc_id = kwargs.get("doc_id")
-            logger.info(
-                f"processing file - {json_file_path}" + f"with doc_id={doc_id}" if doc_id else ""
-            )
-            doc_dict, _ = redis.db.upload_document(collection, doc_id, json_file_path)
-            log_debug_doc_dict(click_ctx, doc_dict)
-        except Exception as e:
+    skipped = 0
+    with Timer("load"), journal or nullcontext():
+        for item in backend.upload_documents(
+            collection,
+            doc_id,
+            json_file_paths,
+            batch_size=kwargs["batch_size"],
+            batch_bytes=kwargs["batch_bytes"],
+            with_hash=journal is not None,
+            hash_index=hash_index,
+            skip=journal.skip if kwargs["resume"] or kwargs["retry_failed"] else None,
+            compression=zstd_compression(kwargs),
+            debug=click_ctx.parent.arg_debug,
+            **{k: kwargs[k] for k in PIPELINE_OPTIONS},
+        ):
+            if journal is not None:
+                journal.record(item)
+
+            if item.skipped:
+                skipped += 1
+                continue
+
+            if item.error is None:
+                log_debug_doc_dict(click_ctx, item.doc_dict)
+                continue
+
             errors_encountered += 1
+            e = item.error
             if skip_errors:
-                logger.error(f"{e.__class__.__name__}: {e}")
+                key = f"{item.collection}:{item.doc_id}" if item.doc_id else item.source
+                logger.error(f"{key} - {e.__class__.__name__}: {e}")
                 continue
             else:
                 raise e
 
+    if hash_index is not None:
+        logger.info(f"{skipped} unchanged document(s) skipped, their writes avoided.")
+    if journal is not None:
+        journal.log_summary()
+
     if errors_encountered:
         logger.error(f"Total {errors_encountered} error(s) had been occured.")
         click_ctx.exit(ERROR_LOAD_ENCOUNTERED)
@@ -149,18 +324,38 @@ def load(click_ctx, *args, **kwargs) -> None:
     help="RedisJSON collection name.",
     required=True,
 )
+@sink_options
+@click.option(
+    "--ids-file",
+    type=str,
+    help='File with document ids, one per line, "-" to read them from stdin.',
+)
+@click.option(
+    "--batch-size",
+    "-b",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.REDIS_GET_BATCH_SIZE,
+    help="Number of documents requested with a single JSON.MGET command.",
+)
 @click.option(
-    "--dst",
-    "-t",
-    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
-    help="Destination folder for json files",
-    default="/tmp",
+    "--concurrency",
+    type=click.IntRange(min=1),
     show_default=True,
+    default=1,
+    help="Number of JSON.MGET commands run in parallel.",
 )
+@click.option(
+    "--threads",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.REDIS_GET_THREADS,
+    help="Number of threads decompressing documents.",
+)
+@aio_option
 @click.argument(
     "doc_ids",
     nargs=-1,
-    required=True,
 )
 @click.pass_context
 @cli_try_except(ERROR_GET)
@@ -172,30 +367,72 @@ def get(click_ctx, *args, **kwargs) -> None:
 
     Get document from RedisJSON and store it locally.
 
+    Document ids may be listed one per line in a file given with --ids-file
+    option (or streamed into stdin with "--ids-file -") as well. Documents
+    are requested with JSON.MGET in batches of --batch-size ids, with up to
+    --concurrency commands in parallel, and decompressed in --threads threads.
+    With --aio option up to --concurrency commands are in flight of an asyncio
+    client and documents are decompressed by its thread. Every missing
+    document is reported, the command exits with an error after all the
+    documents are retrieved.
+
+    Documents are saved with --format option (the same for query command):
+    a json file per document in --dst folder (files), NDJSON into --output
+    file or stdout (ndjson), NDJSON files of --shard-docs documents in --dst
+    folder (shards) or a tar archive into --output file or stdout (tar).
+    Documents are written in background threads, so fetching does not wait
+    for the disk, --zstd option compresses ndjson, shards and tar output.
+
     EXAMPLES
 
     \b
     $ redis-loader get --collection "collection_name"  13901 14901 ...
+    $ redis-loader get --collection "collection_name" --ids-file ids.txt \\
+        --batch-size 1000 --concurrency 4
+    $ redis-loader get --collection "collection_name" --ids-file ids.txt \\
+        --format ndjson --zstd --output docs.ndjson.zst
+    $ redis-loader get --collection "collection_name" --ids-file ids.txt \\
+        --aio --concurrency 100 --format ndjson --output docs.ndjson
     """
     collection = kwargs.get("collection")
-    dst: Path = kwargs.get("dst")
-
-    for doc_id in kwargs.get("doc_ids"):
-        info = f"retrieving  document from collection={collection} with doc_id={doc_id}"
-        logger.info(info)
+    doc_ids = kwargs.get("doc_ids")
+    if kwargs.get("ids_file"):
+        doc_ids = chain(doc_ids, iter_manifest(kwargs["ids_file"]))
+    elif not doc_ids:
+        raise ValueError("DOC_IDS argument(s) or --ids-file option is required.")
+
+    logger.info(f"retrieving documents from collection={collection}")
+    missing = 0
+    if kwargs["aio"]:
+        docs = iter_async(
+            redis.adb.get_documents(
+                collection, doc_ids, kwargs["batch_size"], kwargs["concurrency"]
+            )
+        )
+    else:
+        docs = redis.db.get_documents(
+            collection,
+            doc_ids,
+            kwargs["batch_size"],
+            kwargs["concurrency"],
+            kwargs["threads"],
+        )
+    with Timer("get"), open_sink(collection, **{k: kwargs[k] for k in SINK_OPTIONS}) as sink:
+        for doc_id, doc_dict in docs:
+            if doc_dict is not None:
+                # log_debug_doc_dict(click_ctx, doc_dict)
+                sink.write(doc_id, doc_dict)
 
-        doc_dict = redis.db.get_document(collection, doc_id)
-        if doc_dict is not None:
-            # log_debug_doc_dict(click_ctx, doc_dict)
-            save_json_doc_dict(click_ctx, doc_dict, doc_id, dst)
-            pass
+            else:
+                missing += 1
+                logger.error(
+                    f"No document with doc_id={doc_id} in collection={collection}, "
+                    f"check the collection name or doc_ids argument."
+                )
 
-        else:
-            logger.error(
-                f"No document with doc_id={doc_id} in collection={collection}, "
-                f"check the collection name or doc_ids argument."
-            )
-            click_ctx.exit(ERROR_NO_DOC)
+    if missing:
+        logger.error(f"Total {missing} document(s) had not been found.")
+        click_ctx.exit(ERROR_NO_DOC)
 
 
 @cli_main.command()
@@ -220,14 +457,23 @@ def get(click_ctx, *args, **kwargs) -> None:
     show_default=True,
     default=0,
 )
+@sink_options
+@click.option(
+    "--all",
+    "all_",
+    is_flag=True,
+    show_default=True,
+    default=False,
+    help="Stream all matching documents with an aggregation cursor, ignoring --limit & --offset.",
+)
 @click.option(
-    "--dst",
-    "-t",
-    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
-    help="Destination folder for json files",
-    default="/tmp",
+    "--page-size",
+    type=click.IntRange(min=1),
     show_default=True,
+    default=settings.REDIS_QUERY_PAGE_SIZE,
+    help="Number of documents read from the aggregation cursor at once with --all.",
 )
+@aio_option
 @click.argument("conditions", nargs=-1, required=True)
 @click.pass_context
 @cli_try_except(ERROR_QUERY)
@@ -256,6 +502,7 @@ def query(click_ctx, *args, **kwargs) -> None:
     $ redis-loader query --index "idx:ai" '(@pmcid:{PMC13901})|(@pmcid:{PMC14901})'
     $ redis-loader -d query --index "idx:ai" '@is_oa:{true}'
     $ redis-loader -d query --index "idx:ai" '*' # all records from index with limit & offset
+    $ redis-loader query --index "idx:ai" --all '@is_oa:{true}' # all matching records
 
     $ redis-loader -d query --index "idx:jl" '@domain_id:{2492}'
     $ redis-loader -d query --index "idx:jl" '@jtitle:(ANN MED)' # search for docs with ANN and MED
@@ -271,6 +518,11 @@ def query(click_ctx, *args, **kwargs) -> None:
     on Fuzzy search queries conslt with
     # consult with https://redis.io/docs/stack/search/reference/query_syntax/#fuzzy-matching
 
+    With --all option all matching documents are streamed with FT.AGGREGATE
+    WITHCURSOR in pages of --page-size documents instead of a single FT.SEARCH
+    with --limit & --offset (deep offsets are costly on the server). With --aio
+    option the next page is read while documents of the current one are saved.
+
 
     EXPECTED SCHEMAS
 
@@ -282,18 +534,29 @@ def query(click_ctx, *args, **kwargs) -> None:
     limit: int = kwargs["limit"]
     offset: int = kwargs["offset"]
     conditions: List[str] = list(kwargs["conditions"])
-    dst: Path = kwargs["dst"]
 
-    with Timer("query()"):
+    backend = redis.adb if kwargs["aio"] else redis.db
+    if kwargs["all_"]:
+        docs = backend.query_all(index, conditions, kwargs["page_size"])
+    else:
+        docs = backend.query(index, limit, offset, conditions)
+    if kwargs["aio"]:
+        docs = iter_async(docs)
+
+    with Timer("query()"), open_sink(index, **{k: kwargs[k] for k in SINK_OPTIONS}) as sink:
         found = 0
-        for doc_id, doc_dict in redis.db.query(index, limit, offset, conditions):
+        for doc_id, doc_dict in docs:
             found += 1
             # log_debug_doc_dict(click_ctx, doc_dict)
-            save_json_doc_dict(click_ctx, doc_dict, doc_id, dst)
+            sink.write(doc_id, doc_dict)
+
+        if kwargs["all_"]:
+            logger.info(f"Found {found} document(s) in index={index}")
+        else:
+            logger.info(
+                f"Found {found} document(s) in index={index} with limit={limit} offset={offset}"
+            )
 
-        logger.info(
-            f"Found {found} document(s) in index={index} with limit={limit} offset={offset}"
-        )
 
 @cli_main.command()
 @click.option(
@@ -317,13 +580,14 @@ def query(click_ctx, *args, **kwargs) -> None:
     show_default=True,
     default=0,
 )
+@sink_options
 @click.option(
-    "--dst",
-    "-t",
-    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
-    help="Destination folder for json files",
-    default="/tmp",
+    "--batch-size",
+    "-b",
+    type=click.IntRange(min=1),
     show_default=True,
+    default=settings.REDIS_MQUERY_BATCH_SIZE,
+    help="Number of conditions searched in a single round trip.",
 )
 @click.argument("conditions", nargs=-1, required=True)
 @click.pass_context
@@ -348,6 +612,11 @@ def mquery(click_ctx, *args, **kwargs) -> None:
 
     Notes:
 
+    Searches of --batch-size conditions are sent in a single pipeline round
+    trip. A document matching several conditions is saved once. The number
+    of matches of every condition is reported, as well as conditions with
+    no matches.
+
     Check the syntax of the queries you can make. Mapping of SQL to Redis commands,
     could help you to prepare your queries
     https://redis.io/docs/stack/search/reference/query_syntax/#mapping-common-sql-predicates-to-redisearch
@@ -366,20 +635,39 @@ def mquery(click_ctx, *args, **kwargs) -> None:
     limit: int = kwargs["limit"]
     offset: int = kwargs["offset"]
     conditions: List[str] = list(kwargs["conditions"])
-    dst: Path = kwargs["dst"]
 
-    with Timer("mquery()"):
-        found = 0
-        for condition in conditions:
-            for doc_id, doc_dict in redis.db.query(index, limit, offset, [condition]):
+    with Timer("mquery()"), open_sink(index, **{k: kwargs[k] for k in SINK_OPTIONS}) as sink:
+        found = hit = missed = errors = 0
+        for result in redis.db.mquery(index, limit, offset, conditions, kwargs["batch_size"]):
+            if result.error is not None:
+                errors += 1
+                logger.error(
+                    f"{result.condition}: {result.error.__class__.__name__}: {result.error}"
+                )
+                continue
+
+            if result.hits:
+                hit += 1
+                logger.info(f"{result.condition}: {result.hits} hit(s)")
+            else:
+                missed += 1
+                logger.warning(f"{result.condition}: no hits")
+
+            for doc_id, doc_dict in result.docs:
                 found += 1
                 # log_debug_doc_dict(click_ctx, doc_dict)
-                save_json_doc_dict(click_ctx, doc_dict, doc_id, dst)
+                sink.write(doc_id, doc_dict)
 
         logger.info(
-            f"Found {found} document(s) in index={index} with limit={limit} offset={offset}"
+            f"Found {found} unique document(s) in index={index} with limit={limit} "
+            f"offset={offset}, {hit} condition(s) hit, {missed} missed."
         )
 
+    if errors:
+        logger.error(f"Total {errors} condition(s) had failed.")
+        click_ctx.exit(ERROR_QUERY)
+
+
 @cli_main.command()
 @click.option(
     "--collection",
@@ -396,6 +684,42 @@ def mquery(click_ctx, *args, **kwargs) -> None:
     default=False,
     help="Report and skip individual deletion error.",
 )
+@click.option(
+    "--batch-size",
+    "-b",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.REDIS_DELETE_BATCH_SIZE,
+    help='Number of keys deleted with a single command on "*".',
+)
+@click.option(
+    "--pipeline-chunks",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.REDIS_DELETE_PIPELINE_CHUNKS,
+    help='Number of delete commands sent in a single round trip on "*".',
+)
+@click.option(
+    "--scan-count",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=settings.REDIS_SCAN_COUNT,
+    help='COUNT hint of SCAN/SSCAN commands listing keys to delete on "*".',
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=1,
+    help='Number of round trips run in parallel on "*" (deletes with --aio).',
+)
+@click.option(
+    "--unlink/--no-unlink",
+    show_default=True,
+    default=True,
+    help='Delete keys with UNLINK (memory is reclaimed in background) or DEL on "*".',
+)
+@aio_option
 @click.argument("doc_ids", nargs=-1, required=True)
 @click.pass_context
 @cli_try_except(ERROR_DELETE)
@@ -423,7 +747,13 @@ def delete(click_ctx, *args, **kwargs) -> None:
     NOTES
 
     To delete all documents from a collection you should specify "*" as
-    `doc_id` argument. Use quotes to avoid shell expansion.
+    `doc_id` argument. Use quotes to avoid shell expansion. Documents are
+    found with the membership set of the collection (see rebuild-members
+    command) or by scanning the keyspace if the collection has none, and
+    deleted with UNLINK commands of --batch-size keys, --pipeline-chunks
+    commands per round trip, --concurrency round trips in parallel. The
+    progress is logged periodically in keys/s. With --aio option listed
+    documents are deleted with --concurrency round trips in flight as well.
 
     """
     errors_encountered = 0
@@ -433,20 +763,127 @@ def delete(click_ctx, *args, **kwargs) -> None:
     skip_errors = kwargs.get("skip_errors")
 
     with Timer("delete"):
-        for doc_id in doc_ids:
-            if doc_id == "*":
-                redis.db.delete_all_docs(collection)
+        if kwargs["aio"]:
+            failed = iter_async(_adelete_docs(collection, doc_ids, kwargs))
+        else:
+            failed = _delete_docs(collection, doc_ids, kwargs)
+        for doc_id, e in failed:
+            errors_encountered += 1
+            if skip_errors:
+                logger.error(f"{e.__class__.__name__}: {e}")
+                continue
             else:
-                try:
-                    redis.db.delete_doc(collection, doc_id)
-                except Exception as e:
-                    errors_encountered += 1
-                    if skip_errors:
-                        logger.error(f"{e.__class__.__name__}: {e}")
-                        continue
-                    else:
-                        raise e
+                raise e
 
     if errors_encountered:
         logger.error(f"Total {errors_encountered} error(s) had been occured.")
         click_ctx.exit(ERROR_LOAD_ENCOUNTERED)
+
+
+def _delete_docs(collection: str, doc_ids: List[str], kwargs) -> Iterator[Tuple[str, Exception]]:
+    # yields documents failed to be deleted
+    for doc_id in doc_ids:
+        if doc_id == "*":
+            redis.db.delete_all_docs(
+                collection,
+                kwargs["batch_size"],
+                kwargs["scan_count"],
+                kwargs["pipeline_chunks"],
+                kwargs["concurrency"],
+                kwargs["unlink"],
+            )
+        else:
+            try:
+                redis.db.delete_doc(collection, doc_id)
+            except Exception as e:
+                yield doc_id, e
+
+
+async def _adelete_docs(
+    collection: str, doc_ids: List[str], kwargs
+) -> AsyncIterator[Tuple[str, Exception]]:
+    # _delete_docs() with requests of the asyncio client
+    if "*" in doc_ids:
+        await redis.adb.delete_all_docs(
+            collection,
+            kwargs["batch_size"],
+            kwargs["scan_count"],
+            kwargs["pipeline_chunks"],
+            kwargs["concurrency"],
+            kwargs["unlink"],
+        )
+    listed = [doc_id for doc_id in doc_ids if doc_id != "*"]
+    async for doc_id, e in redis.adb.delete_docs(collection, listed, kwargs["concurrency"]):
+        if e is not None:
+            yield doc_id, e
+
+
+@cli_main.command()
+@click.option(
+    "--collection",
+    "-c",
+    type=str,
+    help="RedisJSON collection name.",
+    required=True,
+)
+@click.pass_context
+@cli_try_except(ERROR_COUNT)
+def count(click_ctx, *args, **kwargs) -> None:
+    """
+    count documents of a collection.
+
+    SYNOPSIS
+
+    Count documents of a collection in RedisJSON using its membership
+    set, collections loaded before it was introduced need to have it
+    built with rebuild-members command first.
+
+    EXAMPLES
+
+    \b
+    $ redis-loader count --collection "collection_name"
+    """
+    collection: str = kwargs["collection"]
+    logger.info(f"collection '{collection}' has {redis.db.count_docs(collection)} document(s).")
+
+
+@cli_main.command()
+@click.option(
+    "--collection",
+    "-c",
+    type=str,
+    help="RedisJSON collection name.",
+    required=True,
+)
+@click.option(
+    "--batch-size",
+    "-b",
+    type=click.IntRange(min=1),
+    show_default=True,
+    default=1000,
+    help="Number of keys scanned and added to the membership set at once.",
+)
+@click.pass_context
+@cli_try_except(ERROR_REBUILD)
+def rebuild_members(click_ctx, *args, **kwargs) -> None:
+    """
+    rebuild membership set of a collection.
+
+    SYNOPSIS
+
+    Rebuild the set of document ids of a collection in RedisJSON by
+    scanning the keyspace. The set is maintained by load and delete
+    commands, it is needed to be rebuilt only for collections loaded
+    before it was introduced or modified by other means. Documents
+    written while the set is being rebuilt may be left out of it.
+
+    EXAMPLES
+
+    \b
+    $ redis-loader rebuild-members --collection "collection_name"
+    """
+    with Timer("rebuild members"):
+        redis.db.rebuild_members(kwargs["collection"], kwargs["batch_size"])
+
+
+cli_main.add_command(train_dict)
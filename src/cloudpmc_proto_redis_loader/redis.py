@@ -1,25 +1,130 @@
+import asyncio
 import base64
+import inspect
 import json
 import os
-from typing import Any, Dict, Generator, List, Optional, Tuple
+from collections import defaultdict
+from functools import partial
+from itertools import chain
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import redis
+import redis.asyncio
 from cloudpathlib import AnyPath
+from redis.commands.search.aggregation import AggregateRequest
 from redis.commands.search.query import Query
 
-from cloudpmc_proto_firestore_loader.helpers import (
+from cloudpmc_proto_loader_core import zstd
+from cloudpmc_proto_loader_core.aio import achunks, at_loop_close, bounded_map
+from cloudpmc_proto_loader_core.hash_index import awrite_changed, write_changed
+from cloudpmc_proto_loader_core.helpers import (
+    LoadItem,
     b64_decode_zcompress_fields,
     b64_decode_zdecompress_fields,
     chunks,
     decode_b64_fields,
+    doc_hash,
+    doc_size,
+    parallel_map,
+    split_failed,
+)
+from cloudpmc_proto_loader_core.logger import logger
+from cloudpmc_proto_loader_core.pipeline import Pipeline
+from cloudpmc_proto_loader_core.sources import read_source, source_stem
+from cloudpmc_proto_loader_core.timing import Progress, Timer
+from cloudpmc_proto_loader_core.tracing import traced
+
+from .settings import (
+    REDIS_DELETE_BATCH_SIZE,
+    REDIS_DELETE_PIPELINE_CHUNKS,
+    REDIS_GET_BATCH_SIZE,
+    REDIS_GET_THREADS,
+    REDIS_HASHES_KEY,
+    REDIS_HOST,
+    REDIS_MAX_BATCH_BYTES,
+    REDIS_MEMBERS_KEY,
+    REDIS_MQUERY_BATCH_SIZE,
+    REDIS_PASS,
+    REDIS_PORT,
+    REDIS_QUERY_PAGE_SIZE,
+    REDIS_SCAN_COUNT,
+    REDIS_USER,
 )
-from cloudpmc_proto_firestore_loader.logger import logger
-from cloudpmc_proto_firestore_loader.timing import Timer
 
-REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
-REDIS_PORT = os.environ.get("REDIS_PORT", str(6370))
-REDIS_USER = os.environ.get("REDIS_USER", None)
-REDIS_PASS = os.environ.get("REDIS_PASS", None)
+
+class MQueryResult(NamedTuple):
+    """
+    Result of a condition of mquery(): the number of documents matching
+    the condition and the ones of them not found by previous conditions.
+    """
+
+    condition: str
+    hits: int = 0
+    # an immutable default, a list would be shared by all the results
+    docs: Sequence[Tuple[str, Dict[str, Any]]] = ()
+    error: Optional[Exception] = None
+
+
+class _RedisHashIndex:
+    """
+    Index of content hashes of documents kept in Redis itself,
+    next to the documents, see REDIS_HASHES_KEY.
+    """
+
+    def __init__(self, redis_db: "_RedisJsonDB"):
+        self._redis_db = redis_db
+
+    def get_hashes(self, items: List[LoadItem]) -> List[Optional[str]]:
+        pipe = self._get_pipeline(self._redis_db.db.pipeline(transaction=False), items)
+        return self._decoded(pipe.execute())
+
+    def set_hashes(self, items: List[LoadItem]) -> None:
+        self._set_pipeline(self._redis_db.db.pipeline(transaction=False), items).execute()
+
+    @staticmethod
+    def _get_pipeline(pipe, items: List[LoadItem]):
+        for item in items:
+            pipe.hget(REDIS_HASHES_KEY.format(collection=item.collection), item.doc_id)
+        return pipe
+
+    @staticmethod
+    def _set_pipeline(pipe, items: List[LoadItem]):
+        for item in items:
+            pipe.hset(REDIS_HASHES_KEY.format(collection=item.collection), item.doc_id, item.hash)
+        return pipe
+
+    @staticmethod
+    def _decoded(hashes: List[Optional[bytes]]) -> List[Optional[str]]:
+        return [h.decode() if h is not None else None for h in hashes]
+
+
+class _AsyncRedisHashIndex:
+    """
+    _RedisHashIndex read and written with redis.asyncio client.
+    """
+
+    def __init__(self, redis_db: "_AsyncRedisJsonDB"):
+        self._redis_db = redis_db
+
+    async def get_hashes(self, items: List[LoadItem]) -> List[Optional[str]]:
+        pipe = _RedisHashIndex._get_pipeline(self._redis_db.db.pipeline(transaction=False), items)
+        return _RedisHashIndex._decoded(await pipe.execute())
+
+    async def set_hashes(self, items: List[LoadItem]) -> None:
+        pipe = _RedisHashIndex._set_pipeline(self._redis_db.db.pipeline(transaction=False), items)
+        await pipe.execute()
 
 
 class _RedisJsonDB:
@@ -29,6 +134,7 @@ class _RedisJsonDB:
         self._port = int(port)
         self._user = username
         self._passwd = password
+        self._supports_json_mset = None
 
     @property
     def host(self):
@@ -46,6 +152,18 @@ class _RedisJsonDB:
     def passwd(self):
         return self._passwd
 
+    def __reduce__(self):
+        # pickled as a reference to the module level `db` singleton, so that
+        # every process (e.g. a pipeline worker) uses a client of its own
+        return "db"
+
+    def reset(self) -> None:
+        """
+        Forget the client, a new one is created on the next use.
+        """
+        self._db = None
+        self._supports_json_mset = None
+
     @property
     def db(self):
         if self._db is None:
@@ -65,52 +183,236 @@ class _RedisJsonDB:
 
         return self._db
 
+    @traced
+    def prepare_document(
+        self,
+        collection: str,
+        doc_id: str,
+        doc_dict: Dict[str, Any],
+        json_file_path: AnyPath,
+        compression: zstd.Compression = zstd.Compression(),
+    ) -> Tuple[str, str, Dict[str, Any]]:
+        # decode fields with .b64 suffix in the name of properties
+        decode_b64_fields(doc_dict)
+
+        _doc_id = doc_id or doc_dict.get("_id") or source_stem(json_file_path)
+        if not _doc_id:
+            raise ValueError(
+                f"Document id is required. `_id` is expected in {json_file_path} "
+                "or with --doc-id option in command line."
+            )
+        elif isinstance(_doc_id, float):
+            _doc_id = int(_doc_id)
+
+        _doc_id = str(_doc_id)
+
+        _collection = collection or doc_dict.get("_collection")
+        if not _collection:
+            raise ValueError(
+                f"Collection name is required. `_collection` is expected in {json_file_path} "
+                "or with --collection option in command line."
+            )
+
+        # decode header_xml for article_instances collection
+        if _collection == "article_instances" and "header_xml" in doc_dict:
+            b64_decode_zcompress_fields(doc_dict, ["header_xml"], compression)
+            if "header_xml_zstd" in doc_dict:
+                doc_dict["header_xml_zstd"] = base64.b64encode(doc_dict["header_xml_zstd"]).decode(
+                    "ascii"
+                )
+        logger.info(
+            f"document with doc_id={_doc_id} is being loaded "
+            f"into into collection={_collection}"
+        )
+
+        # remove unwanted fields:
+        # doc_dict.pop("_id", None)
+        # doc_dict.pop("_collection", None)
+
+        return _collection, _doc_id, doc_dict
+
+    @property
+    def hash_index(self) -> _RedisHashIndex:
+        return _RedisHashIndex(self)
+
     @Timer()
     def upload_document(
         self, collection: str, doc_id: str, json_file_path: AnyPath
     ) -> Tuple[Dict[str, Any], bool]:
         with json_file_path.open() as fd:
             doc_dict = json.load(fd)
-            # decode fields with .b64 suffix in the name of properties
-            decode_b64_fields(doc_dict)
-
-            _doc_id = doc_id or doc_dict.get("_id") or json_file_path.stem
-            if not _doc_id:
-                raise ValueError(
-                    f"Document id is required. `_id` is expected in {json_file_path} "
-                    "or with --doc-id option in command line."
-                )
-            elif isinstance(_doc_id, float):
-                _doc_id = int(_doc_id)
 
-            _doc_id = str(_doc_id)
+        _collection, _doc_id, doc_dict = self.prepare_document(
+            collection, doc_id, doc_dict, json_file_path
+        )
 
-            _collection = collection or doc_dict.get("_collection")
-            if not _collection:
-                raise ValueError(
-                    f"Collection name is required. `_collection` is expected in {json_file_path} "
-                    "or with --collection option in command line."
-                )
+        pipe = self.db.pipeline(transaction=False)
+        pipe.json().set(f"{_collection}:{_doc_id}", ".", doc_dict)
+        pipe.sadd(REDIS_MEMBERS_KEY.format(collection=_collection), _doc_id)
+        write_result, _ = pipe.execute()
+        return doc_dict, write_result
+
+    def upload_documents(
+        self,
+        collection: str,
+        doc_id: str,
+        json_file_paths: Iterable[AnyPath],
+        batch_size: int = 1,
+        batch_bytes: int = REDIS_MAX_BATCH_BYTES,
+        with_hash: bool = False,
+        hash_index=None,
+        skip: Optional[Callable[[Any], bool]] = None,
+        write_batch: Optional[Callable[[List[LoadItem]], Any]] = None,
+        compression: zstd.Compression = zstd.Compression(),
+        **pipeline_kwargs,
+    ) -> Generator[LoadItem, None, None]:
+        """
+        Load documents sending up to `batch_size` documents and up to
+        `batch_bytes` bytes of them in a single round trip to the server.
+        Files are read, transformed and written concurrently by Pipeline
+        configured with `pipeline_kwargs`. Every document is yielded back
+        as LoadItem with `error` set when it could not be loaded and with
+        `hash` of the document set, if requested with `with_hash`.
+
+        With `hash_index` only new and changed documents are written,
+        see write_changed(). Records of files holding many documents are
+        not loaded when `skip` tells so, see read_source(). Batches are
+        written with `write_batch` when given (a coroutine function of
+        the asyncio client) instead of write_batch() of this class.
+        Fields are compressed according to `compression`.
+        """
+        batch_size = max(1, batch_size)
+        write_batch = write_batch or self.write_batch
+        if hash_index is not None:
+            with_hash = True
+            changed = awrite_changed if inspect.iscoroutinefunction(write_batch) else write_changed
+            write_batch = partial(changed, write_batch, hash_index)
+
+        pipeline = Pipeline(
+            partial(
+                self.transform_document,
+                collection,
+                doc_id,
+                with_hash=with_hash,
+                compression=compression,
+            ),
+            write_batch,
+            read=partial(read_source, skip=skip),
+            batch_size=batch_size,
+            batch_bytes=batch_bytes,
+            **pipeline_kwargs,
+        )
+        yield from pipeline.run(json_file_paths)
+
+    def transform_document(
+        self,
+        collection: str,
+        doc_id: str,
+        item: LoadItem,
+        with_hash: bool = False,
+        compression: zstd.Compression = zstd.Compression(),
+    ) -> LoadItem:
+        with Timer(metric="parse", nbytes=len(item.data)):
+            doc_dict = json.loads(item.data)
+        _collection, _doc_id, doc_dict = self.prepare_document(
+            collection, doc_id, doc_dict, item.source, compression
+        )
+        size = doc_size(doc_dict) + len(_collection) + len(_doc_id)
+        _hash = doc_hash(doc_dict) if with_hash else None
+        return LoadItem(item.source, _collection, _doc_id, doc_dict, size, hash=_hash)
+
+    @property
+    def supports_json_mset(self) -> bool:
+        """
+        JSON.MSET is available since RedisJSON 2.6 (and redis-py 5.0).
+        """
+        if self._supports_json_mset is None and not hasattr(self.db.json(), "mset"):
+            logger.debug("JSON.MSET is not supported by the redis client.")
+            self._supports_json_mset = False
+
+        if self._supports_json_mset is None:
+            try:
+                self._supports_json_mset = self._has_json_mset(self.db.module_list())
+            except Exception as e:
+                logger.debug(f"unable to list redis modules ({e.__class__.__name__}: {e})")
+                self._supports_json_mset = False
+            logger.debug(f"JSON.MSET is supported: {self._supports_json_mset}")
+
+        return self._supports_json_mset
+
+    @staticmethod
+    def _has_json_mset(modules: List[Dict[Any, Any]]) -> bool:
+        return any(
+            m.get(b"name", m.get("name")) in (b"ReJSON", "ReJSON")
+            and int(m.get(b"ver", m.get("ver", 0))) >= 20600
+            for m in modules
+        )
+
+    def write_batch(self, items: List[LoadItem]) -> Generator[LoadItem, None, None]:
+        """
+        Write documents of `items` with a single JSON.MSET command, when the
+        server supports it, or with JSON.SET commands otherwise, in a pipeline
+        together with their membership in collections (see REDIS_MEMBERS_KEY).
+        JSON.MSET is atomic, so in case of failure the documents are written
+        again with JSON.SET commands to find out which of them have failed.
+        """
+        failed, pending = split_failed(items)
+        yield from failed
+
+        if len(pending) > 1 and self.supports_json_mset:
+            pipe = self._write_pipeline(self.db.pipeline(transaction=False), pending, mset=True)
+            with Timer(f"JSON.MSET of {len(pending)} document(s)"):
+                replies = pipe.execute(raise_on_error=False)
+            if self._mset_written(pending, replies):
+                yield from pending
+                return
+
+        if pending:
+            pipe = self._write_pipeline(self.db.pipeline(transaction=False), pending)
+            with Timer(f"pipeline of {len(pending)} document(s)"):
+                replies = pipe.execute(raise_on_error=False)
+            yield from self._write_results(pending, replies)
 
-            # decode header_xml for article_instances collection
-            if _collection == "article_instances" and "header_xml" in doc_dict:
-                pass
-                b64_decode_zcompress_fields(doc_dict, ["header_xml"])
-                if "header_xml_zstd" in doc_dict:
-                    doc_dict["header_xml_zstd"] = base64.b64encode(
-                        doc_dict["header_xml_zstd"]
-                    ).decode("ascii")
-            logger.info(
-                f"document with doc_id={_doc_id} is being loaded "
-                f"into into collection={_collection}"
+    @classmethod
+    def _write_pipeline(cls, pipe, items: List[LoadItem], mset: bool = False):
+        """
+        Queue documents of `items` into `pipe` (of either client) with a
+        single JSON.MSET or with JSON.SET commands, together with their
+        membership in collections.
+        """
+        if mset:
+            pipe.json().mset([(f"{i.collection}:{i.doc_id}", ".", i.doc_dict) for i in items])
+        else:
+            for item in items:
+                pipe.json().set(f"{item.collection}:{item.doc_id}", ".", item.doc_dict)
+        cls._add_members(pipe, items)
+        return pipe
+
+    @staticmethod
+    def _mset_written(items: List[LoadItem], replies: List[Any]) -> bool:
+        error = replies[0]
+        if isinstance(error, Exception):
+            logger.warning(
+                f"JSON.MSET of {len(items)} document(s) failed "
+                f"({error.__class__.__name__}: {error}), writing documents with JSON.SET."
             )
+            return False
+        return True
 
-            # remove unwanted fields:
-            # doc_dict.pop("_id", None)
-            # doc_dict.pop("_collection", None)
+    @staticmethod
+    def _write_results(items: List[LoadItem], replies: List[Any]) -> List[LoadItem]:
+        return [
+            item._replace(error=reply) if isinstance(reply, Exception) else item
+            for item, reply in zip(items, replies)
+        ]
 
-            write_result = self.db.json().set(f"{_collection}:{_doc_id}", ".", doc_dict)
-            return doc_dict, write_result
+    @staticmethod
+    def _add_members(pipe, items: List[LoadItem]) -> None:
+        doc_ids = defaultdict(list)
+        for item in items:
+            doc_ids[item.collection].append(item.doc_id)
+        for collection, ids in doc_ids.items():
+            pipe.sadd(REDIS_MEMBERS_KEY.format(collection=collection), *ids)
 
     @Timer()
     def get_document(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
@@ -119,40 +421,486 @@ class _RedisJsonDB:
 
         return doc_dict
 
+    def get_documents(
+        self,
+        collection: str,
+        doc_ids: Iterable[str],
+        batch_size: int = REDIS_GET_BATCH_SIZE,
+        concurrency: int = 1,
+        threads: int = REDIS_GET_THREADS,
+    ) -> Generator[Tuple[str, Optional[Dict[str, Any]]], None, None]:
+        """
+        Get documents with a single JSON.MGET command for every `batch_size`
+        of `doc_ids`, up to `concurrency` commands are run in parallel and
+        documents are decompressed in `threads` threads. Yields (doc_id,
+        doc_dict) in the order of `doc_ids` as soon as they are decoded,
+        doc_dict is None for a missing document.
+        """
+
+        def get_batch(batch_ids: List[str]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+            keys = [f"{collection}:{doc_id}" for doc_id in batch_ids]
+            with Timer(f"JSON.MGET of {len(keys)} document(s)", metric="get", items=len(keys)):
+                return list(zip(batch_ids, self.db.json().mget(keys, ".")))
+
+        batches = (list(batch) for batch in chunks(doc_ids, max(1, batch_size)))
+        fetched = chain.from_iterable(parallel_map(get_batch, batches, concurrency))
+        yield from parallel_map(self._decoded, fetched, threads)
+
+    @staticmethod
+    def _decoded(
+        result: Tuple[str, Optional[Dict[str, Any]]],
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        doc_id, doc_dict = result
+        if doc_dict is not None:
+            b64_decode_zdecompress_fields(doc_dict, ["header_xml_zstd"])
+        return doc_id, doc_dict
+
     def delete_doc(self, collection: str, doc_id: str) -> bool:
-        self.db.json().delete(f"{collection}:{doc_id}")
+        self._delete_pipeline(self.db.pipeline(transaction=False), collection, doc_id).execute()
         logger.info(f"{doc_id} was requested to be deleted")
 
-    def delete_all_docs(self, collection: str, batch_size: int = 100) -> int:
-        deleted = 0
+    @staticmethod
+    def _delete_pipeline(pipe, collection: str, doc_id: str):
+        pipe.json().delete(f"{collection}:{doc_id}")
+        pipe.hdel(REDIS_HASHES_KEY.format(collection=collection), doc_id)
+        pipe.srem(REDIS_MEMBERS_KEY.format(collection=collection), doc_id)
+        return pipe
 
-        for keys_chunk in chunks(self.db.scan_iter(f"{collection}:*"), batch_size):
-            keys_list = list(keys_chunk)
-            self.db.delete(*keys_list)
-            deleted += len(keys_list)
+    def delete_all_docs(
+        self,
+        collection: str,
+        batch_size: int = REDIS_DELETE_BATCH_SIZE,
+        scan_count: int = REDIS_SCAN_COUNT,
+        pipeline_chunks: int = REDIS_DELETE_PIPELINE_CHUNKS,
+        concurrency: int = 1,
+        unlink: bool = True,
+    ) -> int:
+        """
+        Delete documents of `collection` listed in its membership set (see
+        REDIS_MEMBERS_KEY), or found by scanning the keyspace when there is
+        no such set (collections loaded before it was introduced).
 
-        if deleted == 1:
-            logger.info(f"{deleted} document was deleted.")
-        elif deleted > 1:
-            logger.info(f"{deleted} documents were deleted.")
-        else:
+        Keys are deleted with UNLINK (memory is reclaimed in the background)
+        or DEL commands of `batch_size` keys, `pipeline_chunks` commands are
+        sent in a single round trip and up to `concurrency` round trips run
+        in parallel. Keys are listed with SSCAN/SCAN with `scan_count` hint.
+        """
+        prefix, members = self._collection_members(
+            self.db,
+            collection,
+            self.db.exists(REDIS_MEMBERS_KEY.format(collection=collection)),
+            scan_count,
+        )
+
+        def delete_chunks(members_chunks: List[List[bytes]]) -> int:
+            pipe = self.db.pipeline(transaction=False)
+            return sum(self._unlink_pipeline(pipe, prefix, members_chunks, unlink).execute())
+
+        progress = Progress(f"collection '{collection}': deleted", unit="keys")
+        members_chunks = (list(chunk) for chunk in chunks(members, max(1, batch_size)))
+        rounds = (list(group) for group in chunks(members_chunks, max(1, pipeline_chunks)))
+        for deleted in parallel_map(delete_chunks, rounds, concurrency):
+            progress.add(deleted)
+        self.db.delete(*self._index_keys(collection))
+
+        return self._deleted(progress)
+
+    @staticmethod
+    def _collection_members(db, collection: str, has_members: bool, scan_count: int):
+        """
+        Return the prefix of keys and the members of `collection` to delete
+        with db (either client, the members are iterated asynchronously with
+        the asyncio one): ids of documents listed in its membership set (see
+        REDIS_MEMBERS_KEY), or keys found by scanning the keyspace when there
+        is no such set (collections loaded before it was introduced).
+        """
+        if has_members:
+            members_key = REDIS_MEMBERS_KEY.format(collection=collection)
+            return f"{collection}:".encode(), db.sscan_iter(members_key, count=scan_count)
+
+        logger.warning(
+            f"collection '{collection}' has no membership set, scanning the keyspace, "
+            f"consider to run rebuild-members command."
+        )
+        return b"", db.scan_iter(f"{collection}:*", count=scan_count)
+
+    @staticmethod
+    def _unlink_pipeline(pipe, prefix: bytes, members_chunks: List[List[bytes]], unlink: bool):
+        for members in members_chunks:
+            keys = [prefix + member for member in members]
+            if unlink:
+                pipe.unlink(*keys)
+            else:
+                pipe.delete(*keys)
+        return pipe
+
+    @staticmethod
+    def _index_keys(collection: str) -> List[str]:
+        return [
+            REDIS_MEMBERS_KEY.format(collection=collection),
+            REDIS_HASHES_KEY.format(collection=collection),
+        ]
+
+    @staticmethod
+    def _deleted(progress: Progress) -> int:
+        if not progress.count:
             logger.warning("No documents were deleted, check if your collection has any.")
+            return 0
+
+        return progress.done()
+
+    def count_docs(self, collection: str) -> int:
+        return self.db.scard(REDIS_MEMBERS_KEY.format(collection=collection))
+
+    def rebuild_members(self, collection: str, batch_size: int = 1000) -> int:
+        """
+        Rebuild the membership set of `collection` (see REDIS_MEMBERS_KEY)
+        by scanning the keyspace for its documents. The new set is built
+        aside and replaces the old one atomically.
+        """
+        members_key = REDIS_MEMBERS_KEY.format(collection=collection)
+        building_key = f"{members_key}:rebuilding"
+        prefix = f"{collection}:"
 
-        return deleted
+        self.db.delete(building_key)
+        members = 0
+        keys = self.db.scan_iter(f"{prefix}*", count=batch_size)
+        for keys_chunk in chunks(keys, batch_size):
+            keys_list = [key.decode() for key in keys_chunk]
+            doc_ids = [key.removeprefix(prefix) for key in keys_list]
+            if doc_ids:
+                members += self.db.sadd(building_key, *doc_ids)
+
+        if members:
+            self.db.rename(building_key, members_key)
+        else:
+            self.db.delete(members_key)
+        logger.info(f"collection '{collection}' has {members} document(s).")
+
+        return members
 
     def query(
         self, index: str, limit: int, offset: int, conditions: List[str]
     ) -> Generator[Tuple[str, Dict[str, Any]], None, None]:
+        query = self._search_query(limit, offset, conditions)
+        for doc in self.db.ft(index).search(query).docs:
+            yield self._parse_doc(doc)
+
+    def mquery(
+        self,
+        index: str,
+        limit: int,
+        offset: int,
+        conditions: Iterable[str],
+        batch_size: int = REDIS_MQUERY_BATCH_SIZE,
+    ) -> Generator[MQueryResult, None, None]:
+        """
+        Search documents matching every one of `conditions` individually,
+        FT.SEARCH commands of `batch_size` conditions are sent in a single
+        pipeline round trip. Yields MQueryResult of every condition with
+        the number of its matches and the documents not yielded already
+        for a previous condition (documents are deduplicated by key).
+        """
+        seen = set()
+        for batch in chunks(conditions, max(1, batch_size)):
+            batch = list(batch)
+            pipe = self.db.pipeline(transaction=False)
+            for condition in batch:
+                query = Query(condition).paging(offset, limit)
+                pipe.execute_command("FT.SEARCH", index, *query.get_args())
+            with Timer(f"pipeline of {len(batch)} FT.SEARCH command(s)"):
+                replies = pipe.execute(raise_on_error=False)
+
+            for condition, reply in zip(batch, replies):
+                if isinstance(reply, Exception):
+                    yield MQueryResult(condition, error=reply)
+                    continue
+
+                docs = []
+                for key, fields in zip(reply[1::2], reply[2::2]):
+                    if key not in seen:
+                        seen.add(key)
+                        docs.append(self._parse_row([b"__key", key] + list(fields)))
+                yield MQueryResult(condition, reply[0], docs)
+
+    def query_all(
+        self, index: str, conditions: List[str], page_size: int = REDIS_QUERY_PAGE_SIZE
+    ) -> Generator[Tuple[str, Dict[str, Any]], None, None]:
+        """
+        Stream all documents matching `conditions` with FT.AGGREGATE ...
+        WITHCURSOR (documents loaded with LOAD) read in pages of `page_size`
+        documents with FT.CURSOR READ, so that deep result sets are walked
+        without the cost of growing offsets of FT.SEARCH.
+        """
+        ft = self.db.ft(index)
+        result = ft.aggregate(self._aggregate_request(conditions, page_size))
+        while True:
+            for row in result.rows:
+                yield self._parse_row(row)
+
+            cursor = self._next_cursor(result, page_size)
+            if cursor is None:
+                break
+            result = ft.aggregate(cursor)
+
+    @staticmethod
+    def _aggregate_request(conditions: List[str], page_size: int) -> AggregateRequest:
+        request = AggregateRequest(" ".join(conditions)).load("@__key", "$")
+        return request.cursor(count=page_size)
+
+    @staticmethod
+    def _next_cursor(result, page_size: int):
+        """
+        Cursor to read the page following `result` of FT.AGGREGATE or
+        FT.CURSOR READ, None when it was the last one.
+        """
+        if result.cursor is None or not int(result.cursor.cid):
+            return None
+        result.cursor.count = page_size
+        return result.cursor
+
+    @staticmethod
+    def _search_query(limit: int, offset: int, conditions: List[str]) -> Query:
         query = Query(" ".join(conditions))
         if limit is not None and offset is not None:
             query = query.paging(offset, limit)
+        return query
 
-        for doc in self.db.ft(index).search(query).docs:
-            doc_dict = json.loads(doc.json)
-            b64_decode_zdecompress_fields(doc_dict, ["header_xml_zstd"])
-            yield doc.id.split(":", 1)[1], doc_dict
+    @staticmethod
+    def _parse_doc(doc) -> Tuple[str, Dict[str, Any]]:
+        doc_dict = json.loads(doc.json)
+        b64_decode_zdecompress_fields(doc_dict, ["header_xml_zstd"])
+        return doc.id.split(":", 1)[1], doc_dict
+
+    @staticmethod
+    def _parse_row(row: List[Any]) -> Tuple[str, Dict[str, Any]]:
+        fields = {
+            (k.decode() if isinstance(k, bytes) else k): v for k, v in zip(row[::2], row[1::2])
+        }
+        key = fields["__key"].decode() if isinstance(fields["__key"], bytes) else fields["__key"]
+        doc_dict = json.loads(fields["$"])
+        b64_decode_zdecompress_fields(doc_dict, ["header_xml_zstd"])
+        return key.split(":", 1)[1], doc_dict
+
+
+class _AsyncRedisJsonDB:
+    """
+    Load, get, query and delete documents with redis.asyncio client, all
+    the requests are sent from a single thread running an event loop, up
+    to `concurrency` (or `writers` of the load pipeline) of them in flight.
+    Connection settings are the ones of `redis_db` and documents are
+    prepared and decoded by it.
+    """
+
+    def __init__(self, redis_db: _RedisJsonDB):
+        self._redis_db = redis_db
+        self._db = None
+        self._loop = None
+        self._supports_json_mset = None
+
+    def __reduce__(self):
+        return "adb"
+
+    def reset(self) -> None:
+        self._db = None
+        self._loop = None
+        self._supports_json_mset = None
+
+    @property
+    def db(self):
+        # a client is bound to the event loop it is created in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._db = redis.asyncio.Redis(
+                host=self._redis_db.host,
+                port=self._redis_db.port,
+                username=self._redis_db.user,
+                password=self._redis_db.passwd,
+            )
+            self._loop = loop
+            at_loop_close(self._close)
+        return self._db
+
+    async def _close(self) -> None:
+        client, self._db, self._loop = self._db, None, None
+        # aclose() is available since redis-py 5.0.1
+        await client.aclose()
+
+    @property
+    def hash_index(self) -> _AsyncRedisHashIndex:
+        return _AsyncRedisHashIndex(self)
+
+    def upload_documents(
+        self, collection: str, doc_id: str, json_file_paths: Iterable[AnyPath], **kwargs
+    ) -> Generator[LoadItem, None, None]:
+        """
+        upload_documents() of _RedisJsonDB writing batches with write_batch()
+        of the asyncio client.
+        """
+        return self._redis_db.upload_documents(
+            collection, doc_id, json_file_paths, write_batch=self.write_batch, **kwargs
+        )
+
+    async def _json_mset(self) -> bool:
+        if self._supports_json_mset is None:
+            try:
+                modules = await self.db.module_list()
+                self._supports_json_mset = _RedisJsonDB._has_json_mset(modules)
+            except Exception as e:
+                logger.debug(f"unable to list redis modules ({e.__class__.__name__}: {e})")
+                self._supports_json_mset = False
+            logger.debug(f"JSON.MSET is supported: {self._supports_json_mset}")
+
+        return self._supports_json_mset
+
+    async def write_batch(self, items: List[LoadItem]) -> List[LoadItem]:
+        """
+        write_batch() of _RedisJsonDB awaiting the pipelines.
+        """
+        failed, pending = split_failed(items)
+
+        if len(pending) > 1 and await self._json_mset():
+            pipe = _RedisJsonDB._write_pipeline(
+                self.db.pipeline(transaction=False), pending, mset=True
+            )
+            with Timer(f"JSON.MSET of {len(pending)} document(s)"):
+                replies = await pipe.execute(raise_on_error=False)
+            if _RedisJsonDB._mset_written(pending, replies):
+                return failed + pending
+
+        if pending:
+            pipe = _RedisJsonDB._write_pipeline(self.db.pipeline(transaction=False), pending)
+            with Timer(f"pipeline of {len(pending)} document(s)"):
+                replies = await pipe.execute(raise_on_error=False)
+            return failed + _RedisJsonDB._write_results(pending, replies)
+        return failed
+
+    async def get_documents(
+        self,
+        collection: str,
+        doc_ids: Iterable[str],
+        batch_size: int = REDIS_GET_BATCH_SIZE,
+        concurrency: int = 1,
+    ) -> AsyncGenerator[Tuple[str, Optional[Dict[str, Any]]], None]:
+        """
+        get_documents() of _RedisJsonDB with up to `concurrency` JSON.MGET
+        commands in flight, documents are decoded in the event loop thread.
+        """
+
+        async def get_batch(batch_ids: List[str]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+            keys = [f"{collection}:{doc_id}" for doc_id in batch_ids]
+            with Timer(f"JSON.MGET of {len(keys)} document(s)", metric="get", items=len(keys)):
+                return list(zip(batch_ids, await self.db.json().mget(keys, ".")))
+
+        batches = (list(batch) for batch in chunks(doc_ids, max(1, batch_size)))
+        async for results in bounded_map(get_batch, batches, concurrency):
+            for result in results:
+                yield _RedisJsonDB._decoded(result)
+
+    async def query(
+        self, index: str, limit: int, offset: int, conditions: List[str]
+    ) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        query = _RedisJsonDB._search_query(limit, offset, conditions)
+        for doc in (await self.db.ft(index).search(query)).docs:
+            yield _RedisJsonDB._parse_doc(doc)
+
+    async def query_all(
+        self, index: str, conditions: List[str], page_size: int = REDIS_QUERY_PAGE_SIZE
+    ) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        """
+        query_all() of _RedisJsonDB, the next page is requested while
+        the documents of the current one are consumed.
+        """
+        ft = self.db.ft(index)
+        result = await ft.aggregate(_RedisJsonDB._aggregate_request(conditions, page_size))
+        while True:
+            cursor = _RedisJsonDB._next_cursor(result, page_size)
+            next_page = asyncio.ensure_future(ft.aggregate(cursor)) if cursor else None
+
+            try:
+                for row in result.rows:
+                    yield _RedisJsonDB._parse_row(row)
+            except BaseException:
+                if next_page is not None:
+                    next_page.cancel()
+                raise
+
+            if next_page is None:
+                break
+            result = await next_page
+
+    async def delete_docs(
+        self, collection: str, doc_ids: Iterable[str], concurrency: int = 1
+    ) -> AsyncGenerator[Tuple[str, Optional[Exception]], None]:
+        """
+        Delete documents of `doc_ids` with up to `concurrency` pipelines in
+        flight, yields (doc_id, error) in the order of `doc_ids`, error is
+        None for a deleted document.
+        """
+
+        async def delete(doc_id: str) -> Tuple[str, Optional[Exception]]:
+            pipe = self.db.pipeline(transaction=False)
+            try:
+                await _RedisJsonDB._delete_pipeline(pipe, collection, doc_id).execute()
+            except Exception as e:
+                return doc_id, e
+            logger.info(f"{doc_id} was requested to be deleted")
+            return doc_id, None
+
+        async for result in bounded_map(delete, doc_ids, concurrency):
+            yield result
+
+    async def delete_all_docs(
+        self,
+        collection: str,
+        batch_size: int = REDIS_DELETE_BATCH_SIZE,
+        scan_count: int = REDIS_SCAN_COUNT,
+        pipeline_chunks: int = REDIS_DELETE_PIPELINE_CHUNKS,
+        concurrency: int = 1,
+        unlink: bool = True,
+    ) -> int:
+        """
+        delete_all_docs() of _RedisJsonDB with up to `concurrency` round
+        trips in flight.
+        """
+        has_members = await self.db.exists(REDIS_MEMBERS_KEY.format(collection=collection))
+        prefix, members = _RedisJsonDB._collection_members(
+            self.db, collection, has_members, scan_count
+        )
+
+        async def delete_chunks(members_chunks: List[List[bytes]]) -> int:
+            pipe = self.db.pipeline(transaction=False)
+            pipe = _RedisJsonDB._unlink_pipeline(pipe, prefix, members_chunks, unlink)
+            return sum(await pipe.execute())
+
+        progress = Progress(f"collection '{collection}': deleted", unit="keys")
+        rounds = achunks(achunks(members, max(1, batch_size)), max(1, pipeline_chunks))
+        async for deleted in bounded_map(delete_chunks, rounds, concurrency):
+            progress.add(deleted)
+        await self.db.delete(*_RedisJsonDB._index_keys(collection))
+
+        return _RedisJsonDB._deleted(progress)
 
 
 db = _RedisJsonDB()
+adb = _AsyncRedisJsonDB(db)
+
+# a client created before fork is not usable in the child process
+os.register_at_fork(after_in_child=db.reset)
+os.register_at_fork(after_in_child=adb.reset)
 
-__all__ = ["db"]
+__all__ = [
+    "adb",
+    "db",
+    "MQueryResult",
+    "REDIS_DELETE_BATCH_SIZE",
+    "REDIS_DELETE_PIPELINE_CHUNKS",
+    "REDIS_GET_BATCH_SIZE",
+    "REDIS_GET_THREADS",
+    "REDIS_HASHES_KEY",
+    "REDIS_MEMBERS_KEY",
+    "REDIS_MQUERY_BATCH_SIZE",
+    "REDIS_QUERY_PAGE_SIZE",
+    "REDIS_SCAN_COUNT",
+    "REDIS_MAX_BATCH_BYTES",
+]
@@ -0,0 +1,57 @@
+import os
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = os.environ.get("REDIS_PORT", str(6370))
+REDIS_USER = os.environ.get("REDIS_USER", None)
+REDIS_PASS = os.environ.get("REDIS_PASS", None)
+
+# Upper limit of the payload sent to the server in a single round trip
+# (pipeline or JSON.MSET) when documents are loaded in batches.
+REDIS_MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+# number of documents requested with a single JSON.MGET command
+REDIS_GET_BATCH_SIZE = 500
+
+# number of threads decompressing fetched documents (zstandard releases the GIL)
+REDIS_GET_THREADS = min(4, os.cpu_count() or 1)
+
+# number of documents read with a single FT.CURSOR READ command
+REDIS_QUERY_PAGE_SIZE = 1000
+
+# number of FT.SEARCH commands of mquery() sent in a single round trip
+REDIS_MQUERY_BATCH_SIZE = 100
+
+# bulk delete of a collection: number of keys of a single UNLINK (DEL) command,
+# number of such commands pipelined in a single round trip and COUNT hint
+# of SCAN/SSCAN commands listing the keys
+REDIS_DELETE_BATCH_SIZE = 1000
+REDIS_DELETE_PIPELINE_CHUNKS = 10
+REDIS_SCAN_COUNT = 1000
+
+# Redis hash with content hashes of documents of a collection (by doc_id),
+# it is deleted together with the collection. Keys of the collection itself
+# are "{collection}:{doc_id}", so that neither this key nor REDIS_MEMBERS_KEY
+# can be overwritten by a document or be taken for one by a SCAN of them
+REDIS_HASHES_KEY = "_hashes:{collection}"
+
+# Redis set with doc_ids of documents of a collection, it is updated together
+# with the documents, so that a collection is deleted or counted without
+# scanning the whole keyspace
+REDIS_MEMBERS_KEY = "_members:{collection}"
+
+__all__ = [
+    "REDIS_DELETE_BATCH_SIZE",
+    "REDIS_DELETE_PIPELINE_CHUNKS",
+    "REDIS_GET_BATCH_SIZE",
+    "REDIS_GET_THREADS",
+    "REDIS_HASHES_KEY",
+    "REDIS_HOST",
+    "REDIS_MAX_BATCH_BYTES",
+    "REDIS_MEMBERS_KEY",
+    "REDIS_MQUERY_BATCH_SIZE",
+    "REDIS_PASS",
+    "REDIS_PORT",
+    "REDIS_QUERY_PAGE_SIZE",
+    "REDIS_SCAN_COUNT",
+    "REDIS_USER",
+]
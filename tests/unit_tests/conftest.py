@@ -0,0 +1,243 @@
+import copy
+from typing import Any, Dict, List
+
+import pytest
+
+from cloudpmc_proto_firestore_loader.firestore import db as firestore_db
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocument", data: Dict[str, Any]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        return copy.deepcopy(self._data[field])
+
+
+class FakeDocument:
+    def __init__(self, client: "FakeFirestore", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "FakeCollection":
+        return FakeCollection(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+    def set(self, data: Dict[str, Any]) -> None:
+        self._client.docs[self.path] = copy.deepcopy(data)
+
+    def get(self) -> FakeSnapshot:
+        return FakeSnapshot(self, self._client.docs.get(self.path))
+
+    def delete(self) -> None:
+        self._client.docs.pop(self.path, None)
+
+
+class FakeCollection:
+    def __init__(self, client: "FakeFirestore", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: str) -> FakeDocument:
+        return FakeDocument(self._client, f"{self.path}/{doc_id}")
+
+    def select(self, fields: List[str]) -> "FakeCollection":
+        return self
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        return FakeQuery(self).where(field, op, value)
+
+    def order_by(self, field: str) -> "FakeQuery":
+        return FakeQuery(self).order_by(field)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self).limit(count)
+
+    def stream(self):
+        for path in sorted(self._client.docs):
+            doc = FakeDocument(self._client, path)
+            if doc.parent.path == self.path:
+                yield doc.get()
+
+
+class FakeQuery:
+    """
+    Query of a FakeCollection, conditions are limited to "==", documents
+    are ordered by `order_by` fields ("__name__" is the document id).
+    """
+
+    def __init__(self, collection: FakeCollection):
+        self._collection = collection
+        self._conditions = []
+        self._orders = []
+        self._limit = None
+        self._start_after = None
+
+    def _copy(self, **attrs) -> "FakeQuery":
+        query = copy.copy(self)
+        query._conditions = list(self._conditions)
+        query._orders = list(self._orders)
+        for name, value in attrs.items():
+            setattr(query, f"_{name}", value)
+        return query
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        assert op == "==", f"{op} is not supported"
+        query = self._copy()
+        query._conditions.append((field, value))
+        return query
+
+    def order_by(self, field: str) -> "FakeQuery":
+        query = self._copy()
+        query._orders.append(field)
+        return query
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, cursor: List[Any]) -> "FakeQuery":
+        return self._copy(start_after=tuple(cursor))
+
+    def _key(self, snapshot: FakeSnapshot) -> tuple:
+        return tuple(snapshot.id if f == "__name__" else snapshot.get(f) for f in self._orders)
+
+    def stream(self):
+        self._collection._client.queries.append(self._limit)
+        snapshots = [
+            snapshot
+            for snapshot in self._collection.stream()
+            if all(snapshot.to_dict().get(f) == v for f, v in self._conditions)
+        ]
+        snapshots.sort(key=self._key)
+        if self._start_after is not None:
+            snapshots = [s for s in snapshots if self._key(s) > self._start_after]
+        yield from snapshots[: self._limit]
+
+
+class FakeBatch:
+    def __init__(self, client: "FakeFirestore"):
+        self._client = client
+        self._ops = []
+
+    def set(self, doc: FakeDocument, data: Dict[str, Any]) -> None:
+        self._ops.append((doc.set, data))
+
+    def delete(self, doc: FakeDocument) -> None:
+        self._ops.append((lambda _: doc.delete(), None))
+
+    def commit(self) -> None:
+        self._client.commits.append(len(self._ops))
+        for op, data in self._ops:
+            op(data)
+
+
+class FakePartition:
+    def __init__(self, snapshots: List[FakeSnapshot]):
+        self._snapshots = snapshots
+
+    def query(self) -> "FakePartition":
+        return self
+
+    def stream(self):
+        yield from self._snapshots
+
+
+class FakeCollectionGroup:
+    def __init__(self, client: "FakeFirestore", collection_id: str):
+        self._client = client
+        self._collection_id = collection_id
+
+    def get_partitions(self, partition_count: int):
+        # documents of all the collections with the id, split by their order
+        snapshots = [
+            FakeDocument(self._client, path).get()
+            for path in sorted(self._client.docs)
+            if path.rsplit("/", 2)[-2] == self._collection_id
+        ]
+        size = max(1, -(-len(snapshots) // partition_count))
+        for start in range(0, max(1, len(snapshots)), size):
+            end = start + size
+            yield FakePartition(snapshots[start:end])
+
+
+class FakeBulkWriter:
+    def __init__(self):
+        self._on_write_result = None
+
+    def on_write_result(self, callback) -> None:
+        self._on_write_result = callback
+
+    def delete(self, doc: FakeDocument) -> None:
+        doc.delete()
+        if self._on_write_result is not None:
+            self._on_write_result(doc, None, self)
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in of firestore.Client, documents are kept by their path.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.commits = []
+        # limits of streamed queries and numbers of documents of get_all() calls
+        self.queries = []
+        self.gets = []
+
+    def collection(self, path: str) -> FakeCollection:
+        return FakeCollection(self, path)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def get_all(self, refs: List[FakeDocument]):
+        self.gets.append(len(refs))
+        # documents come back in no particular order
+        return [ref.get() for ref in reversed(refs)]
+
+    def collection_group(self, collection_id: str) -> FakeCollectionGroup:
+        return FakeCollectionGroup(self, collection_id)
+
+    def bulk_writer(self, options=None) -> FakeBulkWriter:
+        return FakeBulkWriter()
+
+    def recursive_delete(self, reference: FakeCollection, bulk_writer: FakeBulkWriter) -> int:
+        paths = [path for path in sorted(self.docs) if path.startswith(reference.path + "/")]
+        for path in paths:
+            bulk_writer.delete(FakeDocument(self, path))
+        return len(paths)
+
+
+class FakeAsyncFirestore:
+    """
+    Stand-in of firestore.AsyncClient on top of FakeFirestore `client`.
+    """
+
+    def __init__(self, client: FakeFirestore):
+        self._client = client
+
+    def collection(self, path: str) -> FakeCollection:
+        return self._client.collection(path)
+
+    async def get_all(self, refs: List[FakeDocument]):
+        for snapshot in self._client.get_all(refs):
+            yield snapshot
+
+
+@pytest.fixture
+def fake_firestore(monkeypatch) -> FakeFirestore:
+    client = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_db", client)
+    return client
@@ -0,0 +1,52 @@
+import asyncio
+
+from cloudpmc_proto_loader_core.aio import bounded_map, iter_async
+from cloudpmc_proto_loader_core.pipeline import Pipeline
+
+
+def test_bounded_map_keeps_order_and_bound():
+    in_flight = []
+
+    async def square(x):
+        in_flight.append(x)
+        await asyncio.sleep(0.001 * (10 - x))
+        in_flight.remove(x)
+        return x * x
+
+    async def run():
+        results = []
+        async for result in bounded_map(square, range(10), 3):
+            assert len(in_flight) <= 3
+            results.append(result)
+        return results
+
+    assert list(iter_async(bounded_map(square, iter(range(10)), 3))) == [x * x for x in range(10)]
+    assert asyncio.run(run()) == [x * x for x in range(10)]
+
+
+def test_pipeline_async_write():
+    writing = []
+    concurrent = []
+
+    async def write_batch(batch):
+        writing.append(batch)
+        concurrent.append(len(writing))
+        await asyncio.sleep(0.01)
+        writing.remove(batch)
+        if batch[0].source == 0:
+            raise ConnectionError("unavailable")
+        return batch
+
+    pipeline = Pipeline(
+        lambda item: item._replace(doc_id=str(item.source)),
+        write_batch,
+        read=lambda item: [item._replace(data=b"{}", size=1)],
+        writers=4,
+        batch_size=2,
+    )
+    results = list(pipeline.run(range(20)))
+
+    assert sorted(r.source for r in results) == list(range(20))
+    failed = [r.source for r in results if r.error is not None]
+    assert 0 in failed and len(failed) == 2
+    assert 1 < max(concurrent) <= 4
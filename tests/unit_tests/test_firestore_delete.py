@@ -0,0 +1,48 @@
+from cloudpmc_proto_firestore_loader.firestore import (
+    _AsyncFirestoreDB,
+    _FirestoreDB,
+    db,
+)
+from cloudpmc_proto_loader_core.aio import run_async
+
+from .conftest import FakeFirestore
+
+
+def add_docs(client, collection, n):
+    for i in range(n):
+        client.collection(collection).document(f"PMC{i}").set({"pmcid": f"PMC{i}"})
+
+
+def test_delete_all_docs_in_batches(fake_firestore):
+    add_docs(fake_firestore, "ai", 7)
+    add_docs(fake_firestore, "other", 2)
+
+    assert db.delete_all_docs("ai", batch_size=3, concurrency=2) == 7
+
+    assert sorted(fake_firestore.commits) == [1, 3, 3]
+    assert sorted(fake_firestore.docs) == ["other/PMC0", "other/PMC1"]
+
+
+def test_delete_all_docs_of_empty_collection(fake_firestore):
+    assert db.delete_all_docs("ai") == 0
+    assert fake_firestore.commits == []
+
+
+def test_delete_all_docs_recursively(fake_firestore):
+    add_docs(fake_firestore, "ai", 3)
+    add_docs(fake_firestore, "ai/PMC0/versions", 2)
+    add_docs(fake_firestore, "other", 1)
+
+    assert db.delete_all_docs("ai", recursive=True) == 5
+    assert list(fake_firestore.docs) == ["other/PMC0"]
+
+
+def test_aio_delete_all_docs_recursively():
+    # the recursive delete is run by the synchronous instance of the asyncio one
+    firestore_db = _FirestoreDB()
+    firestore_db._db = FakeFirestore()
+    add_docs(firestore_db.db, "ai", 2)
+    add_docs(firestore_db.db, "ai/PMC1/versions", 2)
+
+    assert run_async(_AsyncFirestoreDB(firestore_db).delete_all_docs("ai", recursive=True)) == 4
+    assert firestore_db.db.docs == {}
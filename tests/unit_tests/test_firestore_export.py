@@ -0,0 +1,51 @@
+import json
+
+from cloudpathlib import AnyPath
+
+from cloudpmc_proto_firestore_loader.firestore import db
+from cloudpmc_proto_loader_core import zstd
+
+DOC = {
+    "pmcid": "PMC13901",
+    "pdf": b"%PDF-\x00\xff",
+    "meta": {"thumbnail": b"\x89PNG", "pages": 3},
+    "is_oa": True,
+}
+
+
+def test_export_load_round_trip(fake_firestore, tmp_path):
+    for i in range(3):
+        fake_firestore.collection("article_instances").document(str(i)).set(DOC)
+
+    assert db.export("article_instances", AnyPath(tmp_path), partitions=1) == 3
+
+    (shard,) = tmp_path.iterdir()
+    first = json.loads(shard.read_text().splitlines()[0])
+    assert first["pdf.b64"] == "JVBERi0A/w=="
+    assert first["meta"]["thumbnail.b64"] == "iVBORw=="
+
+    fake_firestore.docs.clear()
+    items = list(db.upload_documents(None, None, [AnyPath(shard)], batch_size=2))
+
+    assert [item.error for item in items] == [None] * 3
+    assert fake_firestore.docs == {f"article_instances/{i}": DOC for i in range(3)}
+
+
+def test_export_shards(fake_firestore, tmp_path):
+    for i in range(7):
+        fake_firestore.collection("article_instances").document(f"PMC{i}").set({"n": i})
+    # a subcollection of the same id belongs to the same collection group
+    fake_firestore.collection("journals/1/article_instances").document("PMC9").set({"n": 9})
+
+    exported = db.export("article_instances", AnyPath(tmp_path), partitions=3, compress=True)
+
+    shards = sorted(path.name for path in tmp_path.iterdir())
+    assert exported == 7
+    assert shards == [f"article_instances-0000{i}.ndjson.zst" for i in range(3)]
+    lines = [
+        json.loads(line)
+        for shard in shards
+        for line in zstd.decompress((tmp_path / shard).read_bytes()).splitlines()
+    ]
+    assert [doc["_id"] for doc in lines] == [f"PMC{i}" for i in range(7)]
+    assert {doc["_collection"] for doc in lines} == {"article_instances"}
@@ -0,0 +1,42 @@
+import pytest
+
+from cloudpmc_proto_firestore_loader import firestore
+from cloudpmc_proto_firestore_loader.firestore import adb, db
+from cloudpmc_proto_firestore_loader.settings import FS_GET_BATCH_SIZE
+from cloudpmc_proto_loader_core.aio import run_async
+
+from .conftest import FakeAsyncFirestore
+
+# ids asked for, every third of them missing
+IDS = [f"PMC{i}" for i in reversed(range(FS_GET_BATCH_SIZE + 50))]
+
+
+@pytest.fixture
+def articles(fake_firestore):
+    for i in range(0, FS_GET_BATCH_SIZE + 50, 3):
+        doc = fake_firestore.collection("article_instances").document(f"PMC{i}")
+        doc.set({"pmcid": f"PMC{i}"})
+    return fake_firestore
+
+
+def expected():
+    return [(doc_id, {"pmcid": doc_id} if int(doc_id[3:]) % 3 == 0 else None) for doc_id in IDS]
+
+
+def test_get_documents(articles):
+    results = list(db.get_documents("article_instances", iter(IDS), concurrency=2))
+
+    assert results == expected()
+    assert sorted(articles.gets) == [50, FS_GET_BATCH_SIZE]
+
+
+def test_aio_get_documents(articles, monkeypatch):
+    monkeypatch.setattr(
+        firestore.firestore, "AsyncClient", lambda **kwargs: FakeAsyncFirestore(articles)
+    )
+
+    async def get_documents():
+        return [r async for r in adb.get_documents("article_instances", IDS, concurrency=2)]
+
+    assert run_async(get_documents()) == expected()
+    assert sorted(articles.gets) == [50, FS_GET_BATCH_SIZE]
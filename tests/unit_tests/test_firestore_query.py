@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from cloudpmc_proto_firestore_loader.firestore import _QueryPages, db
+
+
+def test_page_token_round_trip():
+    cursor = [datetime(2023, 5, 1, 12, 30, tzinfo=timezone.utc), "13901"]
+
+    assert db._decode_cursor(db._encode_cursor(cursor)) == cursor
+
+
+def fetch_pages(client, limit, order_by, page_size, start_after=None):
+    query = client.collection("article_instances")
+    if order_by:
+        query = query.order_by(order_by)
+    pages = _QueryPages(query, limit, order_by, page_size, start_after)
+    ids = []
+    page = pages.next_page()
+    while page is not None:
+        ids.extend(doc_id for doc_id, _ in map(pages.fetched, page.stream()))
+        page = pages.next_page()
+    return ids
+
+
+@pytest.fixture
+def articles(fake_firestore):
+    # years in reverse order of ids, so that pages follow the order_by field
+    for i in range(7):
+        doc = fake_firestore.collection("article_instances").document(f"PMC{i}")
+        doc.set({"year": 2020 - i, "pdf": bytes([i])})
+    return fake_firestore
+
+
+@pytest.mark.parametrize(
+    "limit, queries",
+    [
+        (None, [3, 3, 3]),
+        (2, [2]),
+        (3, [3]),
+        (5, [3, 2]),
+        (6, [3, 3]),
+    ],
+)
+def test_query_pages(articles, limit, queries):
+    ids = fetch_pages(articles, limit, "year", page_size=3)
+
+    assert ids == [f"PMC{i}" for i in reversed(range(7))][:limit]
+    assert articles.queries == queries
+
+
+def test_query_pages_resumed_from_token(articles):
+    token = db._encode_cursor([2016, "PMC4"])
+
+    assert fetch_pages(articles, None, "year", 2, token) == ["PMC3", "PMC2", "PMC1", "PMC0"]
+
+
+def test_query_pages_without_token(articles):
+    # bytes can not be encoded into a token, paging goes on with the cursor
+    ids = fetch_pages(articles, None, "pdf", page_size=2)
+
+    assert ids == [f"PMC{i}" for i in range(7)]
+    assert articles.queries == [2, 2, 2, 2]
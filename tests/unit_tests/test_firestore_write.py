@@ -0,0 +1,66 @@
+import json
+
+from cloudpathlib import AnyPath
+
+from cloudpmc_proto_firestore_loader.firestore import db
+from cloudpmc_proto_firestore_loader.settings import FS_MAX_BATCH_OPS
+
+from .conftest import FakeBatch, FakeDocument
+
+
+def write_docs(tmp_path, docs, **kwargs):
+    source = tmp_path / "docs.ndjson"
+    source.write_text("".join(json.dumps(doc) + "\n" for doc in docs))
+    return list(db.upload_documents("articles", None, [AnyPath(source)], **kwargs))
+
+
+def test_write_batch_commits(fake_firestore, tmp_path):
+    docs = [{"_id": f"PMC{i}", "year": 2020} for i in range(FS_MAX_BATCH_OPS + 3)]
+
+    items = write_docs(tmp_path, docs[:7], batch_size=3)
+    assert [item.error for item in items] == [None] * 7
+    # a batch of a single document is written without a WriteBatch
+    assert fake_firestore.commits == [3, 3]
+    assert len(fake_firestore.docs) == 7
+
+    # batches are capped at FS_MAX_BATCH_OPS documents
+    fake_firestore.commits.clear()
+    items = write_docs(tmp_path, docs, batch_size=FS_MAX_BATCH_OPS * 2)
+    assert [item.error for item in items] == [None] * len(docs)
+    assert fake_firestore.commits == [FS_MAX_BATCH_OPS, 3]
+    assert len(fake_firestore.docs) == len(docs)
+
+
+def test_write_batch_split_by_bytes(fake_firestore, tmp_path):
+    # about 160 bytes a document, a batch of 400 bytes holds 2 of them
+    docs = [{"_id": f"PMC{i}", "text": "x" * 100} for i in range(6)]
+    docs.insert(2, {"_id": "PMCbig", "text": "x" * 1000})
+
+    items = write_docs(tmp_path, docs, batch_size=10, batch_bytes=400)
+
+    # the big document is written on its own, between the batches
+    assert [item.error for item in items] == [None] * 7
+    assert fake_firestore.commits == [2, 2, 2]
+    assert len(fake_firestore.docs) == 7
+
+
+def test_write_batch_failed_commit(fake_firestore, tmp_path, monkeypatch):
+    def commit(self):
+        raise RuntimeError("batch is too big")
+
+    def set_doc(self, data):
+        if self.id == "PMC2":
+            raise ValueError("invalid document")
+        fake_firestore.docs[self.path] = data
+
+    monkeypatch.setattr(FakeBatch, "commit", commit)
+    monkeypatch.setattr(FakeDocument, "set", set_doc)
+    docs = [{"_id": f"PMC{i}", "year": 2020} for i in range(4)]
+
+    items = write_docs(tmp_path, docs, batch_size=4)
+
+    # documents are written one by one, only the failed one has an error
+    errors = {item.doc_id: item.error for item in items}
+    assert isinstance(errors.pop("PMC2"), ValueError)
+    assert errors == {"PMC0": None, "PMC1": None, "PMC3": None}
+    assert sorted(fake_firestore.docs) == ["articles/PMC0", "articles/PMC1", "articles/PMC3"]
@@ -0,0 +1,20 @@
+from cloudpmc_proto_loader_core.hash_index import LocalHashIndex, write_changed
+from cloudpmc_proto_loader_core.helpers import LoadItem
+
+
+def test_write_changed(tmp_path):
+    written = []
+
+    def write_batch(batch):
+        written.extend(item.doc_id for item in batch)
+        return batch
+
+    with LocalHashIndex(str(tmp_path / "hashes.db")) as hash_index:
+        items = [LoadItem("a", "c", "a", hash="1"), LoadItem("b", "c", "b", hash="2")]
+        list(write_changed(write_batch, hash_index, items))
+
+        items = [LoadItem("a", "c", "a", hash="1"), LoadItem("b", "c", "b", hash="3")]
+        results = list(write_changed(write_batch, hash_index, items))
+
+    assert written == ["a", "b", "b"]
+    assert [item.skipped for item in results] == [True, False]
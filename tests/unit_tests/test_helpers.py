@@ -0,0 +1,31 @@
+from cloudpmc_proto_loader_core.helpers import (
+    batched,
+    decode_b64_fields,
+    doc_size,
+    encode_b64_fields,
+    parallel_map,
+)
+
+
+def test_batched_by_count_and_bytes():
+    assert list(batched(range(5), 2, 100, lambda _: 1)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([3, 3, 3, 9, 1], 10, 6, lambda x: x)) == [[3, 3], [3], [9], [1]]
+    assert list(batched([], 2, 100, lambda _: 1)) == []
+
+
+def test_doc_size():
+    assert doc_size({"a": "bc", "d": b"ef", "g": 1}) == (2 + 3) + (2 + 2) + (2 + 8) + 32
+
+
+def test_parallel_map_keeps_order():
+    assert list(parallel_map(lambda x: x * x, iter(range(10)), 3)) == [x * x for x in range(10)]
+
+
+def test_b64_fields_round_trip():
+    doc = {"a.b64": "YWI=", "b": {"c.b64": "Y2Q=", "d": 1}, "e": "f"}
+
+    decode_b64_fields(doc)
+    assert doc == {"a": b"ab", "b": {"c": b"cd", "d": 1}, "e": "f"}
+
+    encode_b64_fields(doc)
+    assert doc == {"a.b64": "YWI=", "b": {"c.b64": "Y2Q=", "d": 1}, "e": "f"}
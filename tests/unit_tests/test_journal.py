@@ -0,0 +1,40 @@
+from cloudpmc_proto_loader_core.helpers import LoadItem
+from cloudpmc_proto_loader_core.journal import Journal
+from cloudpmc_proto_loader_core.sources import SourceMember, read_source
+
+
+def test_journal_resume_and_retry(tmp_path):
+    path = str(tmp_path / "journal.db")
+    with Journal(path) as journal:
+        journal.record(LoadItem("a.json", "c", "a", hash="1"))
+        journal.record(LoadItem("b.json", error=ValueError("bad")))
+
+    with Journal(path) as journal:
+        assert list(journal.skip_loaded(["a.json", "b.json"])) == ["b.json"]
+        assert [str(p) for p in journal.failed_sources()] == ["b.json"]
+        journal.record(LoadItem("b.json", "c", "b", hash="2"))
+        assert journal.failed_sources() == []
+
+
+def test_journal_retry_file_failure(tmp_path):
+    path = str(tmp_path / "journal.db")
+    ndjson = tmp_path / "j.ndjson"
+    ndjson.write_text('{"_id": 1}\n{"_id": 2}\n')
+    with Journal(path) as journal:
+        # the whole file failed, e.g. it could not be read
+        journal.record(LoadItem(ndjson, error=OSError("unreadable")))
+        journal.record(LoadItem(SourceMember("a.tar", "1.json"), error=ValueError("bad")))
+
+    with Journal(path) as journal:
+        assert [str(p) for p in journal.failed_sources()] == [str(ndjson), "a.tar"]
+        items = list(read_source(LoadItem(ndjson), skip=journal.skip))
+        journal.record(items[0]._replace(collection="c", doc_id="1"))
+        assert [str(p) for p in journal.failed_sources()] == ["a.tar"]
+        journal.record(LoadItem(SourceMember("a.tar", "1.json"), "c", "a"))
+        assert journal.failed_sources() == []
+
+    with Journal(path) as journal:
+        # resumed, the record loaded on retry is skipped
+        items = list(read_source(LoadItem(ndjson), skip=journal.skip))
+        assert [str(i.source) for i in items] == [f"{ndjson}#2"]
+        assert journal.skipped == 1
@@ -0,0 +1,25 @@
+from cloudpmc_proto_loader_core.pipeline import Pipeline
+
+
+def test_pipeline_run():
+    def read(item):
+        if item.source == 3:
+            raise ValueError("unreadable")
+        yield item._replace(data=str(item.source).encode(), size=1)
+
+    def transform(item):
+        return item._replace(doc_id=item.data.decode(), data=None)
+
+    batches = []
+
+    def write_batch(batch):
+        batches.append(len(batch))
+        return batch
+
+    pipeline = Pipeline(transform, write_batch, read=read, readers=3, writers=2, batch_size=4)
+    results = list(pipeline.run(range(20)))
+
+    assert sorted(r.source for r in results) == list(range(20))
+    assert [r.source for r in results if r.error is not None] == [3]
+    assert all(r.doc_id == str(r.source) for r in results if r.error is None)
+    assert max(batches) <= 4
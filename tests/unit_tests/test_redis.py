@@ -0,0 +1,273 @@
+import json
+
+import fakeredis
+import pytest
+import redis.asyncio
+import redis.client
+from cloudpathlib import AnyPath
+from redis.commands.json.commands import JSONCommands
+
+from cloudpmc_proto_loader_core.aio import iter_async, run_async
+from cloudpmc_proto_loader_core.helpers import LoadItem
+from cloudpmc_proto_redis_loader.redis import adb, db
+
+ROWS = [
+    [b"__key", f"ai:PMC{i}".encode(), b"$", json.dumps({"pmcid": f"PMC{i}"}).encode()]
+    for i in range(7)
+]
+
+
+def aggregate_reply(args):
+    # FT.AGGREGATE ... WITHCURSOR COUNT n or FT.CURSOR READ index cid COUNT n,
+    # the id of a cursor is the offset of its next page
+    start = int(args[3]) if args[0] == "FT.CURSOR" else 0
+    end = start + int(args[args.index("COUNT") + 1])
+    return [[len(ROWS)] + ROWS[start:end], end if end < len(ROWS) else 0]
+
+
+class FakeSearchRedis(fakeredis.FakeRedis):
+    """
+    FakeRedis answering FT.SEARCH of conditions in `searches` with their
+    keys (or error) in pipelines and FT.AGGREGATE of ROWS read with
+    a cursor, fakeredis has no RediSearch commands.
+    """
+
+    searches = {}
+
+    def execute_command(self, *args, **options):
+        if args[0] in ("FT.AGGREGATE", "FT.CURSOR"):
+            return aggregate_reply(args)
+        if args[0] == "FT.SEARCH":
+            keys = self.searches[args[2]]
+            if isinstance(keys, Exception):
+                raise keys
+            reply = [len(keys)]
+            for key in keys:
+                reply += [key.encode(), [b"$", json.dumps({"key": key}).encode()]]
+            return reply
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return FakeSearchPipeline(self)
+
+
+class FakeAsyncSearchRedis(fakeredis.FakeAsyncRedis):
+    def __init__(self, **kwargs):
+        super().__init__(protocol=2)
+
+    async def execute_command(self, *args, **options):
+        if args[0] in ("FT.AGGREGATE", "FT.CURSOR"):
+            return aggregate_reply(args)
+        return await super().execute_command(*args, **options)
+
+
+class FakeSearchPipeline:
+    def __init__(self, client: FakeSearchRedis):
+        self._client = client
+        self._commands = []
+
+    def execute_command(self, *args):
+        self._commands.append(args)
+
+    def execute(self, raise_on_error=True):
+        replies = []
+        for args in self._commands:
+            try:
+                replies.append(self._client.execute_command(*args))
+            except Exception as e:
+                replies.append(e)
+        return replies
+
+
+@pytest.fixture
+def redis_db(monkeypatch):
+    server = fakeredis.FakeServer()
+
+    class FakeAsyncRedis(fakeredis.FakeAsyncRedis):
+        def __init__(self, **kwargs):
+            super().__init__(server=server)
+
+    monkeypatch.setattr(db, "_db", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(db, "_supports_json_mset", None)
+    monkeypatch.setattr(redis.asyncio, "Redis", FakeAsyncRedis)
+    adb.reset()
+    return db
+
+
+def make_items(n):
+    return [LoadItem(f"{i}.json", "ai", f"PMC{i}", {"pmcid": f"PMC{i}"}) for i in range(n)]
+
+
+@pytest.mark.parametrize("mset", [True, False])
+def test_write_batch(redis_db, mset):
+    redis_db._supports_json_mset = mset
+    failed = LoadItem("bad.json", error=ValueError("unparsable"))
+
+    results = list(redis_db.write_batch(make_items(3) + [failed]))
+
+    assert [r.source for r in results if r.error is None] == ["0.json", "1.json", "2.json"]
+    assert redis_db.db.json().get("ai:PMC1") == {"pmcid": "PMC1"}
+    assert redis_db.db.smembers("_members:ai") == {b"PMC0", b"PMC1", b"PMC2"}
+
+
+def test_write_batch_without_client_mset(redis_db, monkeypatch):
+    # redis-py before 5.0 has no JSON.MSET, documents are written with JSON.SET
+    monkeypatch.delattr(JSONCommands, "mset")
+
+    results = list(redis_db.write_batch(make_items(2)))
+
+    assert not redis_db.supports_json_mset
+    assert all(r.error is None for r in results)
+    assert redis_db.db.json().get("ai:PMC0") == {"pmcid": "PMC0"}
+
+
+def test_aio_load_get_delete(redis_db, tmp_path):
+    paths = []
+    for i in range(5):
+        paths.append(tmp_path / f"PMC{i}.json")
+        paths[-1].write_text(json.dumps({"_collection": "ai", "pmcid": f"PMC{i}"}))
+    sources = [AnyPath(path) for path in paths]
+
+    loaded = list(
+        adb.upload_documents(None, None, sources, batch_size=2, hash_index=adb.hash_index)
+    )
+    reloaded = list(adb.upload_documents(None, None, sources, hash_index=adb.hash_index))
+
+    assert [item.error for item in loaded] == [None] * 5
+    assert [item.skipped for item in reloaded] == [True] * 5
+    assert len(redis_db.db.hgetall("_hashes:ai")) == 5
+
+    docs = dict(iter_async(adb.get_documents("ai", ["PMC3", "PMC1"], batch_size=1)))
+    assert docs["PMC3"]["pmcid"] == "PMC3" and docs["PMC1"]["pmcid"] == "PMC1"
+
+    deleted = list(iter_async(adb.delete_docs("ai", ["PMC0"])))
+    assert deleted == [("PMC0", None)]
+    assert not redis_db.db.exists("ai:PMC0")
+    assert b"PMC0" not in redis_db.db.smembers("_members:ai")
+
+    assert run_async(adb.delete_all_docs("ai", batch_size=2)) == 4
+    assert redis_db.db.keys("ai:*") == []
+
+
+def test_delete_doc_keeps_members(redis_db):
+    list(redis_db.write_batch(make_items(3)))
+    redis_db.db.hset("_hashes:ai", "PMC1", "h1")
+
+    redis_db.delete_doc("ai", "PMC1")
+
+    assert not redis_db.db.exists("ai:PMC1")
+    assert redis_db.db.smembers("_members:ai") == {b"PMC0", b"PMC2"}
+    assert redis_db.db.hgetall("_hashes:ai") == {}
+    assert redis_db.count_docs("ai") == 2
+
+
+def test_rebuild_members(redis_db):
+    # documents loaded before membership sets and a member of a deleted document
+    for i in range(5):
+        redis_db.db.json().set(f"ai:PMC{i}", ".", {"pmcid": f"PMC{i}"})
+    redis_db.db.json().set("other:PMC9", ".", {"pmcid": "PMC9"})
+    redis_db.db.sadd("_members:ai", "PMC7")
+    redis_db.db.hset("_hashes:ai", "PMC0", "h0")
+    # ids of documents can not clash with the membership set or the hashes
+    redis_db.db.json().set("ai:_members", ".", {"pmcid": "_members"})
+
+    assert redis_db.rebuild_members("ai", batch_size=2) == 6
+    assert redis_db.db.smembers("_members:ai") == {
+        b"_members",
+        *(f"PMC{i}".encode() for i in range(5)),
+    }
+    assert redis_db.db.hgetall("_hashes:ai") == {b"PMC0": b"h0"}
+    assert not redis_db.db.exists("_members:ai:rebuilding")
+
+
+@pytest.mark.parametrize("unlink", [True, False])
+@pytest.mark.parametrize("members", [True, False])
+def test_delete_all_docs(redis_db, monkeypatch, unlink, members):
+    list(redis_db.write_batch(make_items(7)))
+    redis_db.db.json().set("other:PMC0", ".", {"pmcid": "PMC0"})
+    redis_db.db.hset("_hashes:ai", "PMC0", "h0")
+    if not members:
+        # a collection loaded before membership sets
+        redis_db.db.delete("_members:ai")
+
+    commands = []
+
+    def spy(command):
+        method = getattr(redis.client.Pipeline, command)
+
+        def queue(pipe, *keys):
+            commands.append((command, len(keys)))
+            return method(pipe, *keys)
+
+        monkeypatch.setattr(redis.client.Pipeline, command, queue)
+
+    spy("unlink")
+    spy("delete")
+    deleted = redis_db.delete_all_docs(
+        "ai", batch_size=3, scan_count=2, pipeline_chunks=2, unlink=unlink
+    )
+
+    assert deleted == 7
+    assert commands == [("unlink" if unlink else "delete", n) for n in (3, 3, 1)]
+    assert redis_db.db.keys("ai:*") == []
+    assert not redis_db.db.exists("_hashes:ai", "_members:ai")
+    assert redis_db.db.exists("other:PMC0")
+
+
+def test_get_documents(redis_db):
+    list(redis_db.write_batch(make_items(7)))
+    doc_ids = [f"PMC{i}" for i in (6, 0, 3, 5, 1)]
+
+    docs = list(redis_db.get_documents("ai", doc_ids, batch_size=2, concurrency=2, threads=2))
+
+    assert docs == [(doc_id, {"pmcid": doc_id}) for doc_id in doc_ids]
+
+
+def test_mquery_deduplicates_docs(monkeypatch):
+    client = FakeSearchRedis()
+    client.searches = {
+        "@pmcid:{PMC1}": ["ai:PMC1"],
+        "@is_oa:{true}": ["ai:PMC1", "ai:PMC2", "ai:PMC3"],
+        "@pmcid:{PMC4}": [],
+        "@bad:[": ValueError("Syntax error"),
+        "@pmcid:{PMC3}": ["ai:PMC3"],
+    }
+    monkeypatch.setattr(db, "_db", client)
+
+    results = list(db.mquery("idx", 10, 0, list(client.searches), batch_size=2))
+
+    assert [r.condition for r in results] == list(client.searches)
+    assert [r.hits for r in results] == [1, 3, 0, 0, 1]
+    assert [[doc_id for doc_id, _ in r.docs] for r in results] == [
+        ["PMC1"],
+        ["PMC2", "PMC3"],
+        [],
+        [],
+        [],
+    ]
+    assert results[1].docs[0] == ("PMC2", {"key": "ai:PMC2"})
+    assert isinstance(results[3].error, ValueError)
+    assert results[3].docs == ()
+
+
+def test_query_all_reads_pages(monkeypatch):
+    monkeypatch.setattr(db, "_db", FakeSearchRedis(protocol=2))
+
+    docs = list(db.query_all("idx", ["@is_oa:{true}"], page_size=3))
+
+    assert docs == [(f"PMC{i}", {"pmcid": f"PMC{i}"}) for i in range(7)]
+
+
+def test_aio_query_all_reads_pages(monkeypatch):
+    monkeypatch.setattr(redis.asyncio, "Redis", FakeAsyncSearchRedis)
+    adb.reset()
+
+    docs = list(iter_async(adb.query_all("idx", ["*"], page_size=2)))
+
+    assert docs == [(f"PMC{i}", {"pmcid": f"PMC{i}"}) for i in range(7)]
+
+
+def test_parse_row():
+    row = [b"__key", b"ai:PMC1:v2", "$", '{"pmcid": "PMC1"}']
+
+    assert db._parse_row(row) == ("PMC1:v2", {"pmcid": "PMC1"})
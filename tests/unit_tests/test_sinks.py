@@ -0,0 +1,72 @@
+import json
+import tarfile
+
+import pytest
+
+from cloudpmc_proto_loader_core import zstd
+from cloudpmc_proto_loader_core.sinks import Sink, open_sink
+
+DOCS = [(f"PMC{i}", {"pmcid": f"PMC{i}", "header_xml_zstd": b"<front/>"}) for i in range(5)]
+
+
+def write_docs(**options):
+    with open_sink("article_instances", **options) as sink:
+        for doc_id, doc_dict in DOCS:
+            sink.write(doc_id, doc_dict)
+    return sink
+
+
+def test_files_sink(tmp_path):
+    sink = write_docs(fmt="files", dst=str(tmp_path), writers=3)
+
+    assert sink.progress.count == len(DOCS)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{i}.json" for i, _ in DOCS]
+    assert json.loads((tmp_path / "PMC1.json").read_text()) == {
+        "header_xml_zstd": "PGZyb250Lz4=",
+        "pmcid": "PMC1",
+    }
+
+
+def test_ndjson_sink_stdout(capsysbinary):
+    write_docs(fmt="ndjson")
+
+    lines = capsysbinary.readouterr().out.splitlines()
+    assert [json.loads(line)["_id"] for line in lines] == [i for i, _ in DOCS]
+    assert lines[0] == b'{"_id":"PMC0","pmcid":"PMC0","header_xml_zstd":"PGZyb250Lz4="}'
+
+
+def test_sharded_sink(tmp_path):
+    write_docs(fmt="shards", dst=str(tmp_path), shard_docs=2, compress=True, level=1)
+
+    shards = sorted(tmp_path.iterdir())
+    assert [p.name for p in shards] == [f"article_instances-{i:05d}.ndjson.zst" for i in range(3)]
+    ids = [
+        json.loads(line)["_id"]
+        for p in shards
+        for line in zstd.decompress(p.read_bytes()).splitlines()
+    ]
+    assert ids == [i for i, _ in DOCS]
+
+
+def test_tar_sink(tmp_path):
+    path = tmp_path / "docs.tar"
+    write_docs(fmt="tar", output=str(path))
+
+    with tarfile.open(path) as tar:
+        assert tar.getnames() == [f"{i}.json" for i, _ in DOCS]
+        assert json.load(tar.extractfile("PMC0.json"))["pmcid"] == "PMC0"
+
+
+def test_sink_raises_writer_error(tmp_path):
+    (tmp_path / "PMC0.json").mkdir()
+
+    with pytest.raises(IsADirectoryError):
+        write_docs(fmt="files", dst=str(tmp_path))
+
+
+def test_sink_without_write():
+    class PartialSink(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        PartialSink("article_instances")
@@ -0,0 +1,103 @@
+import io
+import tarfile
+
+import zstandard
+from cloudpathlib import AnyPath
+
+from cloudpmc_proto_loader_core import sources
+from cloudpmc_proto_loader_core.helpers import LoadItem
+from cloudpmc_proto_loader_core.sources import (
+    expand_source,
+    iter_sources,
+    read_source,
+    source_stem,
+)
+
+
+def test_iter_sources(tmp_path):
+    (tmp_path / "dump" / "sub").mkdir(parents=True)
+    for name in ["dump/1.json", "dump/sub/2.json", "dump/readme.txt", "3.json"]:
+        (tmp_path / name).write_text("{}")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(f"# comment\n\n{tmp_path / '3.json'}\n")
+
+    sources = iter_sources([str(tmp_path / "dump")], str(manifest))
+
+    assert sorted(p.name for p in sources) == ["1.json", "2.json", "3.json"]
+
+
+def test_read_source_records(tmp_path):
+    path = tmp_path / "docs.ndjson"
+    path.write_text('{"_id": 1}\n\n{"_id": 2}\n{"_id": 3}\n')
+
+    items = read_source(LoadItem(path), skip=lambda source: source.line == 3)
+
+    assert [(str(i.source), i.data) for i in items] == [
+        (f"{path}#1", b'{"_id": 1}\n'),
+        (f"{path}#4", b'{"_id": 3}\n'),
+    ]
+
+
+def test_read_source_archive(tmp_path):
+    member = tmp_path / "13901.json"
+    member.write_text('{"pmcid": "PMC13901"}')
+    with tarfile.open(tmp_path / "dump.tar", "w") as tar:
+        tar.add(member, arcname="dump/13901.json")
+    path = tmp_path / "dump.tar.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress((tmp_path / "dump.tar").read_bytes()))
+
+    items = list(read_source(LoadItem(path)))
+
+    assert [(str(i.source), i.data) for i in items] == [
+        (f"{path}/dump/13901.json", b'{"pmcid": "PMC13901"}')
+    ]
+    assert source_stem(items[0].source) == "13901"
+
+
+class FakeBlob:
+    def __init__(self, name, data=b""):
+        self.name = name
+        self._data = data
+
+    def open(self, mode):
+        return io.BytesIO(self._data)
+
+
+class FakeStorageClient:
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def list_blobs(self, bucket, prefix=None):
+        for name in sorted(self.blobs):
+            if prefix is None or name.startswith(prefix):
+                yield FakeBlob(name)
+
+    def bucket(self, name):
+        return self
+
+    def blob(self, name):
+        return FakeBlob(name, self.blobs[name])
+
+
+def test_gs_sources(monkeypatch):
+    blobs = {
+        "dump/": b"",
+        "dump/1.json": b'{"_id": 1}',
+        "dump/sub/2.ndjson.zst": zstandard.compress(b'{"_id": 2}\n{"_id": 3}\n'),
+        "dump/readme.txt": b"",
+        "dumpster/4.json": b"{}",
+    }
+    monkeypatch.setattr(sources, "_STORAGE_CLIENT", FakeStorageClient(blobs))
+
+    paths = list(expand_source("gs://bucket/dump/"))
+    assert [str(path) for path in paths] == [
+        "gs://bucket/dump/1.json",
+        "gs://bucket/dump/sub/2.ndjson.zst",
+    ]
+
+    items = list(read_source(LoadItem(AnyPath("gs://bucket/dump/sub/2.ndjson.zst"))))
+    assert [item.data for item in items] == [b'{"_id": 2}\n', b'{"_id": 3}\n']
+
+    # streamed from the bucket as well, not downloaded by cloudpathlib
+    path = AnyPath("gs://bucket/dump/1.json")
+    assert [item.data for item in read_source(LoadItem(path))] == [b'{"_id": 1}']
@@ -0,0 +1,55 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+CLI_MODULES = ["cloudpmc_proto_firestore_loader", "cloudpmc_proto_redis_loader"]
+
+# client libraries of databases and cloud storages
+HEAVY_MODULES = ["grpc", "google.cloud.firestore", "google.cloud.storage", "redis"]
+
+# import time of a cli in seconds, it is about 0.15 s with no client library imported
+IMPORT_TIME_THRESHOLD = 0.5
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    # the interpreter finds the packages where the tests found them (see `pythonpath` of pytest)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, check=True, env=env
+    )
+
+
+@pytest.mark.parametrize("module", CLI_MODULES)
+def test_cli_does_not_import_clients(module):
+    # client libraries are imported by the first command using the database
+    script = (
+        f"import sys, {module}; " f"print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+
+    assert run_python("-c", script).stdout.split() == []
+
+
+@pytest.mark.parametrize("module", CLI_MODULES)
+def test_cli_import_time(module):
+    # the last line of -X importtime report is the cumulative time of `module` in us
+    report = run_python("-X", "importtime", "-c", f"import {module}").stderr
+    cumulative = re.search(rf"\|\s*(\d+) \| {module}\s*$", report)
+
+    assert cumulative is not None
+    assert int(cumulative.group(1)) / 1e6 < IMPORT_TIME_THRESHOLD
+
+
+def test_backend_import_keeps_environment():
+    # the environment of the client is set up when the client is created
+    script = (
+        "import os; "
+        "[os.environ.pop(k, None) for k in ['GOOGLE_APPLICATION_CREDENTIALS', 'no_proxy']]; "
+        "env = dict(os.environ); "
+        "from cloudpmc_proto_firestore_loader.firestore import db; "
+        "print(sorted(k for k in {*env, *os.environ} if env.get(k) != os.environ.get(k)))"
+    )
+
+    assert run_python("-c", script).stdout.strip() == "[]"
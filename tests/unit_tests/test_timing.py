@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from cloudpmc_proto_loader_core.timing import Metrics, Timer, metrics, timed_iter
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.enable()
+    yield metrics
+    metrics.enabled = False
+
+
+def test_metrics_percentiles():
+    registry = Metrics()
+    for ms in range(1, 101):
+        registry.observe("write", ms / 1000, items=10, nbytes=100)
+
+    ops = registry.snapshot()["ops"]
+
+    assert ops["write"]["calls"] == 100
+    assert ops["write"]["items"] == 1000
+    assert ops["write"]["bytes"] == 10000
+    assert 0.050 <= ops["write"]["p50"] < 0.050 * 1.19
+    assert 0.095 <= ops["write"]["p95"] < 0.095 * 1.19
+    assert 0.099 <= ops["write"]["p99"] < 0.099 * 1.19
+
+
+def test_metrics_write(tmp_path):
+    registry = Metrics()
+    registry.observe("read", 0.003, nbytes=2048)
+
+    registry.write(str(tmp_path / "metrics.json"))
+    registry.write(str(tmp_path / "metrics.prom"))
+
+    assert json.loads((tmp_path / "metrics.json").read_text())["ops"]["read"]["bytes"] == 2048
+    prom = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert 'cloudpmc_loader_op_seconds_bucket{op="read",le="0.002048"} 0' in prom
+    assert 'cloudpmc_loader_op_seconds_bucket{op="read",le="0.004096"} 1' in prom
+    assert 'cloudpmc_loader_op_seconds_count{op="read"} 1' in prom
+    assert 'cloudpmc_loader_op_bytes_total{op="read"} 2048' in prom
+
+
+def test_timer_records_metrics(enabled_metrics):
+    @Timer(metric="get")
+    def get(doc_id):
+        return doc_id
+
+    with Timer(metric="compress", nbytes=10) as timer:
+        timer.nbytes += 5
+    get("PMC13901")
+    assert list(timed_iter([b"a", b"bc"], "read", size=len)) == [b"a", b"bc"]
+
+    ops = enabled_metrics.snapshot()["ops"]
+    assert ops["compress"]["bytes"] == 15
+    assert ops["get"]["calls"] == 1
+    assert (ops["read"]["calls"], ops["read"]["bytes"]) == (2, 3)
+
+
+def test_timer_without_metrics():
+    metrics.enable()
+    metrics.enabled = False
+
+    with Timer(metric="compress"):
+        pass
+
+    assert metrics.snapshot()["ops"] == {}
@@ -0,0 +1,73 @@
+import json
+import threading
+
+import pytest
+
+from cloudpmc_proto_loader_core.helpers import doc_hash
+from cloudpmc_proto_loader_core.timing import Timer
+from cloudpmc_proto_loader_core.tracing import call_traced, tracer
+
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.enable()
+    yield tracer
+    tracer.enabled = False
+    tracer.drain()
+
+
+def test_trace_spans(enabled_tracer, tmp_path):
+    def write_batch():
+        with Timer("commit batch", metric="write", items=2, nbytes=10):
+            doc_hash({"pmcid": "PMC13901"})
+
+    thread = threading.Thread(target=write_batch, name="write-0")
+    thread.start()
+    thread.join()
+    path = tmp_path / "trace.json"
+    enabled_tracer.write(str(path))
+
+    events = json.loads(path.read_text())["traceEvents"]
+    names = {e["args"]["name"] for e in events if e["ph"] == "M"}
+    spans = {e["name"]: e for e in events if e["ph"] == "X"}
+    assert names == {"main", "write-0"}
+    assert spans["commit batch"]["cat"] == "write"
+    assert spans["commit batch"]["args"] == {"items": 2, "bytes": 10}
+    # doc_hash() is nested in the batch
+    outer, inner = spans["commit batch"], spans["doc_hash"]
+    assert outer["tid"] == inner["tid"]
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"] + 0.001
+
+
+def test_trace_file_format(enabled_tracer, tmp_path):
+    with Timer(metric="get", items=1):
+        doc_hash({"pmcid": "PMC13901"})
+    path = tmp_path / "trace.json"
+    enabled_tracer.write(str(path))
+
+    trace = json.loads(path.read_text())
+    assert trace["displayTimeUnit"] == "ms"
+    assert {e["ph"] for e in trace["traceEvents"]} == {"M", "X"}
+    for event in trace["traceEvents"]:
+        assert isinstance(event["pid"], int) and isinstance(event["tid"], int)
+        if event["ph"] == "X":
+            # complete events with start and duration in microseconds
+            assert event["ts"] >= 0 and event["dur"] >= 0
+            assert isinstance(event["name"], str) and isinstance(event["cat"], str)
+    assert [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"] == ["doc_hash", "get"]
+
+
+def test_call_traced(enabled_tracer):
+    # events recorded by a worker process come back with the result
+    result, events = call_traced(doc_hash, {"pmcid": "PMC13901"})
+
+    assert result == doc_hash({"pmcid": "PMC13901"})
+    assert [e["name"] for e in events if e["ph"] == "X"] == ["doc_hash"]
+
+
+def test_tracing_disabled():
+    with Timer(metric="write"):
+        doc_hash({})
+
+    assert tracer.drain() == []
@@ -0,0 +1,64 @@
+import base64
+import json
+
+import zstandard
+from cloudpathlib import AnyPath
+
+from cloudpmc_proto_firestore_loader.firestore import db
+from cloudpmc_proto_loader_core import zstd
+from cloudpmc_proto_loader_core.helpers import (
+    b64_decode_zcompress_fields,
+    zdecompress_b64_encode_fields,
+)
+
+
+def test_fields_compressed_with_dictionary(tmp_path):
+    headers = [f"<front><article-id>PMC{i}</article-id></front>".encode() for i in range(500)]
+    dictionary = zstd.train_dictionary(headers, dict_size=1024, dict_id=7)
+    path = zstd.save_dictionary(dictionary, tmp_path / "7.zdict")
+    doc = {"header_xml": base64.b64encode(headers[0]).decode()}
+    b64_decode_zcompress_fields(doc, ["header_xml"], zstd.Compression(3, str(path)))
+    assert doc["header_xml_zstd_dict"] == 7
+
+    zdecompress_b64_encode_fields(doc, ["header_xml_zstd"])
+    assert doc == {"header_xml": base64.b64encode(headers[0]).decode()}
+
+
+def test_decompress_stream_frames_and_batches():
+    data = [b"<front>%d</front>" % i * 100 for i in range(10)]
+    # frames written by stream writers do not record the size of content
+    compressobj = zstandard.ZstdCompressor().compressobj()
+    frame = compressobj.compress(data[0]) + compressobj.flush()
+
+    assert zstd.decompress(frame) == data[0]
+    assert zstd.decompress(zstd.compress(data[0])) == data[0]
+    assert zstd.decompress_many(zstd.compress_many(data, threads=3), threads=3) == data
+
+
+def test_load_with_dictionary_in_workers(fake_firestore, tmp_path):
+    headers = [f"<front><article-id>PMC{i}</article-id></front>".encode() for i in range(500)]
+    path = zstd.save_dictionary(
+        zstd.train_dictionary(headers, dict_size=1024, dict_id=9), tmp_path / "9.zdict"
+    )
+    source = tmp_path / "docs.ndjson"
+    source.write_text(
+        "".join(
+            json.dumps({"_id": i, "header_xml": h.decode()}) + "\n"
+            for i, h in enumerate(headers[:3], 1)
+        )
+    )
+
+    items = db.upload_documents(
+        "article_instances",
+        None,
+        [AnyPath(source)],
+        compression=zstd.Compression(3, str(path)),
+        workers=1,
+    )
+
+    assert [item.error for item in items] == [None] * 3
+    doc = fake_firestore.docs["article_instances/3"]
+    assert doc["header_xml_zstd_dict"] == 9
+    # the dictionary was loaded by the worker process only
+    zstd.load_dictionary(path)
+    assert zstd.decompress(doc["header_xml_zstd"]) == headers[2]